@@ -1,14 +1,19 @@
 import streamlit as st
 import os
+import uuid
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 
 from src.models.llm import get_llm
 from src.services.vector_store import VectorStoreService
 from src.utils.document_loader import DocumentLoader
 from src.agents.router_graph import AgentRouterGraph  # ← Thay đổi import
+from src.orchestrator import MedicalOrchestrator
+from src.services.answer_chains import AnswerChainCache
+from src.services.history_window import HistoryWindow, RollingSummarizer
+from src.services.session_backend import create_session_backend
+from src.services.session_manager import cap_messages
+from src.services.warmup import warm_up
 
 load_dotenv()
 
@@ -82,50 +87,25 @@ def init_chatbot():
         llm = get_llm(streaming=True)
         vector_service = VectorStoreService()
         document_loader = DocumentLoader(use_unstructured=use_unstructured)
-        router = AgentRouterGraph(vector_service=vector_service)  # ← LangGraph Router
+        # LangGraph Router, câu hỏi nhiều intent được orchestrator tách và chạy đồng thời
+        router = MedicalOrchestrator(AgentRouterGraph(vector_service=vector_service))
         
-        chat_history = ChatMessageHistory()
+        # State hội thoại ở session backend (SESSION_BACKEND) - dùng chung giữa các phiên / process
+        sessions = create_session_backend()
+        # Chain trả lời dựng sẵn theo system prompt của từng nhánh (dùng chung mọi phiên)
+        chains = AnswerChainCache(llm)
+        # Lịch sử gửi cho model có giới hạn token, lượt cũ được tóm tắt nền
+        window = HistoryWindow()
+        summarizer = RollingSummarizer(get_llm(streaming=False), window)
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "Bạn là trợ lý y tế AI thông minh, thân thiện và hữu ích."),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{input}")
-        ])
-        
-        chain = prompt | llm
-        conversation = RunnableWithMessageHistory(
-            chain,
-            lambda session_id: chat_history,
-            input_messages_key="input",
-            history_messages_key="history"
-        )
-        
-        try:
-            vector_service.load_vector_store()
-        except:
-            folder_path = "./data/documents"
-            if os.path.exists(folder_path):
-                documents = document_loader.load_documents_from_folder(folder_path)
-                if documents:
-                    vector_service.create_vector_store(documents)
+        # Warm-up một lần mỗi process: index, embedding, search, LLM, router (python warm_up.py lúc deploy
+        # đã build sẵn index → không rebuild ở người dùng đầu tiên)
+        warmup = warm_up(vector_service, router, llm)
             
-        return llm, vector_service, document_loader, router, chat_history, conversation
+        return llm, vector_service, document_loader, router, sessions, window, summarizer, chains, warmup
     except Exception as e:
         st.error(f"❌ Lỗi khởi tạo: {str(e)}")
-        return None, None, None, None, None, None
-
-def build_conversation_context(chat_history) -> str:
-    """Tạo context từ lịch sử hội thoại"""
-    if not chat_history or not chat_history.messages:
-        return ""
-    
-    recent_messages = chat_history.messages[-6:]
-    context_parts = []
-    for msg in recent_messages:
-        role = "Bệnh nhân" if msg.type == "human" else "Bác sĩ"
-        context_parts.append(f"{role}: {msg.content}")
-    
-    return "\n".join(context_parts)
+        return None, None, None, None, None, None, None, None, None
 
 def load_documents():
     """Tải tài liệu từ thư mục"""
@@ -187,19 +167,23 @@ def main():
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
-    if "user_messages_only" not in st.session_state:
-        st.session_state.user_messages_only = []
+    # Lịch sử chat + hồ sơ triệu chứng nằm ở session backend theo session_id của phiên trình duyệt
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     
     if "chatbot_initialized" not in st.session_state:
         with st.spinner("🚀 Đang khởi tạo AI Medical Assistant..."):
-            llm, vector_service, document_loader, router, chat_history, conversation = init_chatbot()
+            llm, vector_service, document_loader, router, sessions, window, summarizer, chains, warmup = init_chatbot()
             if llm:
                 st.session_state.llm = llm
                 st.session_state.vector_service = vector_service
                 st.session_state.document_loader = document_loader
                 st.session_state.router = router
-                st.session_state.chat_history = chat_history
-                st.session_state.conversation = conversation
+                st.session_state.sessions = sessions
+                st.session_state.window = window
+                st.session_state.summarizer = summarizer
+                st.session_state.chains = chains
+                st.session_state.warmup = warmup
                 st.session_state.chatbot_initialized = True
             else:
                 st.stop()
@@ -208,8 +192,7 @@ def main():
     with st.sidebar:
         if st.button("🗑️ Xóa lịch sử chat", use_container_width=True, type="primary"):
             st.session_state.messages = []
-            st.session_state.chat_history.clear()
-            st.session_state.user_messages_only = []
+            st.session_state.sessions.clear(st.session_state.session_id)
             st.rerun()
         
         st.markdown("---")
@@ -220,6 +203,7 @@ def main():
             st.info(f"📋 Loader: **{loader_mode}**")
             st.info(f"🤖 Model: **{os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME', 'N/A')}**")
             st.info(f"💬 Tin nhắn: **{len(st.session_state.messages)}**")
+            st.info(f"🔥 Warm-up: **{st.session_state.warmup.total_ms:.0f} ms**")
             
             st.markdown("---")
             
@@ -270,19 +254,21 @@ def main():
         with st.chat_message("assistant"):
             with st.spinner("🤔 Đang trả lời..."):
                 try:
-                    conversation_context = build_conversation_context(st.session_state.chat_history)
+                    # Nạp state mới nhất của phiên (lượt trước có thể do process khác xử lý)
+                    sessions = st.session_state.sessions
+                    session = sessions.load(st.session_state.session_id)
+                    window = st.session_state.window
+                    conversation_context = window.conversation_context(session.chat_history.messages)
                     
                     # QUAN TRỌNG: Chỉ lấy lịch sử TRƯỚC câu hỏi hiện tại
                     # Không bao gồm prompt hiện tại khi check symptoms
-                    user_only_context = " ".join(st.session_state.user_messages_only[-6:])
-                    
-                    # Append sau khi đã lấy context
-                    st.session_state.user_messages_only.append(prompt)
+                    user_only_context = " ".join(session.user_messages_only[-6:])
                     
                     routing_result = st.session_state.router.route(
                         prompt, 
                         conversation_context,
-                        user_only_context
+                        user_only_context,
+                        patient_state=session.patient_state
                     )
                     
                     icon, box_class, intent_name = get_intent_icon_and_color(routing_result["intent"])
@@ -305,35 +291,34 @@ def main():
                         </div>
                         """, unsafe_allow_html=True)
                     
-                    prompt_template = ChatPromptTemplate.from_messages([
-                        ("system", routing_result.get("system_prompt", "Bạn là trợ lý AI.")),
-                        MessagesPlaceholder(variable_name="history"),
-                        ("human", "{input}")
-                    ])
-                    
-                    chain = prompt_template | st.session_state.llm
-                    conversation = RunnableWithMessageHistory(
-                        chain,
-                        lambda session_id: st.session_state.chat_history,
-                        input_messages_key="input",
-                        history_messages_key="history"
-                    )
-                    
-                    full_input = routing_result["prompt"]
-                    
                     response_placeholder = st.empty()
-                    full_response = ""
+                    full_response = routing_result.get("direct_response") or ""
                     
-                    for chunk in conversation.stream(
-                        {"input": full_input},
-                        config={"configurable": {"session_id": "default"}}
-                    ):
-                        if hasattr(chunk, 'content'):
-                            full_response += chunk.content
-                            response_placeholder.markdown(full_response + "▌")
+                    # Câu trả lời soạn sẵn (chưa có triệu chứng / không tìm thấy) → hiển thị thẳng, không gọi LLM
+                    if not full_response:
+                        chain = st.session_state.chains.get(
+                            routing_result.get("response_key"),
+                            routing_result.get("system_prompt", "Bạn là trợ lý AI.")
+                        )
+                        
+                        full_input = routing_result["prompt"]
+                        
+                        history = window.for_prompt(session, full_input, conversation_context)
+                        for chunk in chain.stream(
+                            {"input": full_input, "history": history}
+                        ):
+                            if hasattr(chunk, 'content'):
+                                full_response += chunk.content
+                                response_placeholder.markdown(full_response + "▌")
                     
                     response_placeholder.markdown(full_response)
                     
+                    # Ghi cả lượt một lần (nguyên tử) vào backend - lịch sử giữ câu hỏi gốc, không phải prompt đã chèn context
+                    sessions.append_turn(
+                        session, prompt, [HumanMessage(content=prompt), AIMessage(content=full_response)]
+                    )
+                    st.session_state.summarizer.schedule(sessions, session)
+                    
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": full_response,
@@ -343,6 +328,9 @@ def main():
                         }
                     })
                     
+                    # Giữ SESSION_MAX_MESSAGES tin nhắn hiển thị mới nhất (backend tự cắt lịch sử)
+                    cap_messages(st.session_state.messages)
+                    
                 except Exception as e:
                     error_msg = f"❌ Lỗi: {str(e)}"
                     st.error(error_msg)
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark: chi phí dựng chain trả lời mỗi lượt chat
+- Cũ: mỗi tin nhắn dựng ChatPromptTemplate + prompt | llm + RunnableWithMessageHistory
+- AnswerChainCache (src/services/answer_chains.py): chain dựng sẵn theo khóa "<intent>.<nhánh>", mỗi lượt chỉ tra dict
+
+Không gọi LLM: dùng FakeListChatModel, chỉ đo phần dựng (và format prompt để kiểm tra kết quả giống nhau).
+
+Usage:
+    python benchmark_answer_chains.py
+    python benchmark_answer_chains.py --turns 5000 --repeat 5
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from src.agents.system_prompts import SYSTEM_PROMPTS
+from src.services.answer_chains import AnswerChainCache
+
+
+def legacy_setup(llm, chat_history, response_key, system_prompt):
+    """Như main.py / app.py cũ: dựng lại prompt, chain và RunnableWithMessageHistory mỗi tin nhắn"""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ])
+    chain = prompt | llm
+    return RunnableWithMessageHistory(
+        chain,
+        lambda session_id: chat_history,
+        input_messages_key="input",
+        history_messages_key="history"
+    )
+
+
+def timed(setup, turns, repeat):
+    """Median µs / lượt và KB cấp phát đỉnh / lượt"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for response_key, system_prompt in turns:
+            setup(response_key, system_prompt)
+        durations.append((time.perf_counter() - start) * 1e6 / len(turns))
+
+    peaks = []
+    tracemalloc.start()
+    for response_key, system_prompt in turns[:200]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        setup(response_key, system_prompt)
+        peaks.append((tracemalloc.get_traced_memory()[1] - base) / 1024)
+    tracemalloc.stop()
+    return float(np.median(durations)), float(np.median(peaks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer chain setup micro-benchmark")
+    parser.add_argument("--turns", type=int, default=2000, help="Số lượt chat giả (system prompt ngẫu nhiên theo nhánh)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    # RunnableWithMessageHistory (cách cũ) đã deprecated
+    warnings.filterwarnings("ignore", message=".*RunnableWithMessageHistory.*")
+
+    rng = random.Random(42)
+    keys = list(SYSTEM_PROMPTS)
+    turns = [(key, SYSTEM_PROMPTS[key]) for key in (rng.choice(keys) for _ in range(args.turns))]
+
+    llm = FakeListChatModel(responses=["ok"])
+    chat_history = ChatMessageHistory()
+    chat_history.add_user_message("tôi bị sốt")
+    chat_history.add_ai_message("Bạn sốt bao lâu rồi?")
+
+    start = time.perf_counter()
+    chains = AnswerChainCache(llm)
+    prebuild_ms = (time.perf_counter() - start) * 1000
+
+    print("=" * 60)
+    print(f"🧪 ANSWER CHAIN SETUP - {args.turns} lượt, {len(keys)} system prompt cố định")
+    print("=" * 60)
+
+    legacy_us, legacy_kb = timed(lambda key, sp: legacy_setup(llm, chat_history, key, sp), turns, args.repeat)
+    cached_us, cached_kb = timed(chains.get, turns, args.repeat)
+
+    # Prompt gửi cho model phải giống hệt nhau
+    inputs = {"input": "Câu hỏi: thuốc hạ sốt?", "history": chat_history.messages}
+    same = all(
+        ChatPromptTemplate.from_messages([
+            ("system", system_prompt), MessagesPlaceholder(variable_name="history"), ("human", "{input}")
+        ]).invoke(inputs).to_messages() == chains.get(key, system_prompt).first.invoke(inputs).to_messages()
+        for key, system_prompt in SYSTEM_PROMPTS.items()
+    )
+
+    print(f"   Dựng sẵn lúc khởi động: {prebuild_ms:8.2f} ms ({len(keys)} chain)")
+    print(f"   Cũ (dựng mỗi lượt):     {legacy_us:8.1f} µs/lượt, {legacy_kb:6.1f} KB cấp phát")
+    print(f"   AnswerChainCache:       {cached_us:8.1f} µs/lượt, {cached_kb:6.1f} KB cấp phát")
+    print(f"   Speedup:                {legacy_us / cached_us:8.0f}x")
+    print(f"   Prompt giống nhau:      {'✅' if same else '❌'}")
+    print(f"   {chains.stats()}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
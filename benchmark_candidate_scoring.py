@@ -0,0 +1,118 @@
+"""
+Micro-benchmark: tính điểm + gộp + top-n candidates thuốc
+- Vòng lặp cũ: lowercase page_content / metadata cho từng kết quả × keyword, max-score bằng dict
+- CandidateBatch (src/utils/candidate_scoring.py): lowercase mỗi document một lần, bonus / gộp / top-n bằng NumPy
+
+Không gọi LLM / embedding: kết quả search được sinh ngẫu nhiên (cố định seed) từ corpus giả.
+
+Usage:
+    python benchmark_candidate_scoring.py
+    python benchmark_candidate_scoring.py --candidates 10000 --k 50 --repeat 20
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from langchain.schema import Document
+
+from src.utils.candidate_scoring import CandidateBatch
+
+
+KEYWORDS = ["đau đầu", "sốt", "ho", "tiêu chảy", "buồn nôn", "đau bụng", "ngứa", "mất ngủ", "ợ nóng", "khó thở"]
+
+
+def make_corpus(size, rng):
+    """Document giả giống medicines.json (page_content dài, metadata indications_text)"""
+    corpus = []
+    for i in range(size):
+        indications = rng.sample(KEYWORDS, 3)
+        content = (f"Medicine Name:\nThuốc {i}\n\nIndications:\n" + "\n".join(f"• {s.capitalize()}" for s in indications)
+                   + "\n\nDosage:\n  adult: 500mg mỗi lần, 4-6 giờ/lần\n\nWarnings:\n" + "Thận trọng khi dùng. " * 40)
+        corpus.append(Document(page_content=content, metadata={
+            'item_name': f"Nhóm thuốc {i}",
+            'indications_text': ", ".join(indications)
+        }))
+    return corpus
+
+
+def make_results(corpus, candidates, k, rng):
+    """[(keyword, [(doc, score)])]: candidates // k search, mỗi search k kết quả"""
+    keyword_results = []
+    for q in range(max(1, candidates // k)):
+        keyword = KEYWORDS[q % len(KEYWORDS)]
+        docs = rng.sample(corpus, k)
+        keyword_results.append((keyword, [(doc, rng.random()) for doc in docs]))
+    return keyword_results
+
+
+def legacy_score(keyword_results, top_n=5):
+    """Vòng lặp cũ của MedicineAgent._score_candidates + _top_candidates"""
+    medicine_scores = {}
+    for keyword, results in keyword_results:
+        for doc, score in results:
+            medicine_name = doc.metadata.get('item_name')
+            if not medicine_name:
+                continue
+            total_score = score
+            indications_text = doc.metadata.get('indications_text', '').lower()
+            if keyword.lower() in indications_text:
+                total_score += 0.5
+            if keyword.lower() in doc.page_content.lower():
+                total_score += 0.2
+            if medicine_name not in medicine_scores or medicine_scores[medicine_name]['score'] < total_score:
+                medicine_scores[medicine_name] = {'doc': doc, 'score': total_score}
+    sorted_medicines = sorted(medicine_scores.items(), key=lambda x: x[1]['score'], reverse=True)
+    return [(item[1]['doc'], item[1]['score']) for item in sorted_medicines[:top_n]]
+
+
+def batch_score(keyword_results, top_n=5):
+    """Cùng công thức với MedicineAgent._score_candidates"""
+    batch = CandidateBatch.from_results(keyword_results, lambda doc: doc.metadata.get('item_name'))
+    totals = (batch.scores
+              + batch.query_bonus(lambda doc: doc.metadata.get('indications_text', ''), 0.5)
+              + batch.query_bonus(lambda doc: doc.page_content, 0.2))
+    return batch.top(totals, top_n)
+
+
+def timed(func, keyword_results, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(keyword_results)
+        durations.append((time.perf_counter() - start) * 1000)
+    return result, float(np.median(durations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Candidate scoring micro-benchmark")
+    parser.add_argument("--candidates", type=int, default=10000, help="Tổng số kết quả search cần tính điểm")
+    parser.add_argument("--k", type=int, default=50, help="Số kết quả mỗi search")
+    parser.add_argument("--corpus", type=int, default=2000, help="Số document khác nhau trong corpus giả")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpus = make_corpus(args.corpus, rng)
+    keyword_results = make_results(corpus, args.candidates, args.k, rng)
+    total = sum(len(results) for _, results in keyword_results)
+
+    print("=" * 60)
+    print(f"🧪 CANDIDATE SCORING - {len(keyword_results)} search × k={args.k} = {total} kết quả, "
+          f"corpus {args.corpus} document")
+    print("=" * 60)
+
+    legacy, legacy_ms = timed(legacy_score, keyword_results, args.repeat)
+    vectorized, batch_ms = timed(batch_score, keyword_results, args.repeat)
+
+    same = [doc.metadata['item_name'] for doc, _ in legacy] == [doc.metadata['item_name'] for doc, _ in vectorized] \
+        and np.allclose([s for _, s in legacy], [s for _, s in vectorized])
+    print(f"   Vòng lặp cũ:     {legacy_ms:8.2f} ms (median)")
+    print(f"   CandidateBatch:  {batch_ms:8.2f} ms (median)")
+    print(f"   Speedup:         {legacy_ms / batch_ms:8.1f}x")
+    print(f"   Top-5 giống nhau: {'✅' if same else '❌'}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
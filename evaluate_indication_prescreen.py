@@ -0,0 +1,129 @@
+"""
+Báo cáo offline cho pre-screen validation thuốc bằng embedding chỉ định:
+so sánh quyết định local (accept / reject / borderline) với verdict LLM hiện tại
+trên mọi cặp (triệu chứng trong symptoms.json, thuốc trong medicines.json).
+
+Verdict LLM lấy từ verdict cache (chạy prewarm_verdict_cache.py trước), cặp nào thiếu thì hỏi LLM.
+
+Usage:
+    python evaluate_indication_prescreen.py
+    python evaluate_indication_prescreen.py --accept 0.8 --reject 0.35 --no-llm
+"""
+import argparse
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from prewarm_verdict_cache import load_symptoms
+from src.agents.medicine_agent import MedicineAgent
+from src.knowledge.indication_index import DEFAULT_INDEX_PATH, IndicationIndex
+from src.models.llm import get_embeddings
+from src.services.verdict_cache import MEDICINES_PATH, get_verdict_cache
+from src.utils.document_loader import DocumentLoader
+
+
+def decide(score, accept, reject):
+    if score is None:
+        return None
+    if score >= accept:
+        return True
+    if score <= reject:
+        return False
+    return None
+
+
+def print_report(pairs, accept, reject):
+    """pairs: [(symptom, medicine, llm_fit, score)]"""
+    decided = [(s, m, truth, decide(score, accept, reject), score) for s, m, truth, score in pairs]
+    local = [(s, m, truth, pred, score) for s, m, truth, pred, score in decided if pred is not None]
+    correct = sum(1 for _, _, truth, pred, _ in local if truth == pred)
+
+    print(f"\n📊 accept={accept:.2f} reject={reject:.2f} - {len(pairs)} cặp")
+    print(f"   Coverage (quyết định local, bỏ LLM call): {len(local)}/{len(pairs)} = {len(local) / len(pairs):.1%}")
+    if local:
+        print(f"   Accuracy trên phần local:                 {correct}/{len(local)} = {correct / len(local):.1%}")
+
+    print("\n   Confusion matrix (hàng = LLM, cột = pre-screen):")
+    print(f"   {'':16}{'accept':>10}{'reject':>10}{'borderline':>12}")
+    for truth, label in ((True, "PHÙ HỢP"), (False, "KHÔNG PHÙ HỢP")):
+        row = [sum(1 for _, _, t, p, _ in decided if t == truth and p == pred) for pred in (True, False, None)]
+        print(f"   {label:16}{row[0]:>10}{row[1]:>10}{row[2]:>12}")
+
+    errors = [(s, m, truth, score) for s, m, truth, pred, score in local if truth != pred]
+    if errors:
+        print("\n   ❌ Khác LLM:")
+        for symptom, medicine, truth, score in errors:
+            print(f"      '{symptom}' + {medicine}: LLM={'PHÙ HỢP' if truth else 'KHÔNG'} score={score:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indication pre-screen offline report")
+    documents_path = os.getenv('DOCUMENTS_PATH', './data/documents')
+    parser.add_argument("--symptoms", default=os.path.join(documents_path, 'symptoms.json'))
+    parser.add_argument("--accept", type=float, default=float(os.getenv('INDICATION_ACCEPT_THRESHOLD', '0.75')))
+    parser.add_argument("--reject", type=float, default=float(os.getenv('INDICATION_REJECT_THRESHOLD', '0.3')))
+    parser.add_argument("--no-llm", action="store_true", help="Bỏ qua cặp chưa có verdict trong cache")
+    args = parser.parse_args()
+
+    cache = get_verdict_cache()
+    if cache is None:
+        print("❌ Cần verdict cache (VERDICT_CACHE=true) làm nhãn LLM")
+        return
+
+    embeddings = get_embeddings()
+    index = IndicationIndex.build(embeddings, index_path=os.getenv('INDICATION_INDEX_PATH', DEFAULT_INDEX_PATH),
+                                  accept=args.accept, reject=args.reject)
+    medicine_docs = DocumentLoader().load_document(MEDICINES_PATH) or []
+    symptoms = load_symptoms(args.symptoms)
+    agent = MedicineAgent()
+
+    print("=" * 60)
+    print("🧪 INDICATION PRE-SCREEN REPORT")
+    print("=" * 60)
+
+    # Nhãn LLM: verdict cache, thiếu thì validate (không pre-screen)
+    if not args.no_llm:
+        for symptom in symptoms:
+            pending = [(doc, 0.0) for doc in medicine_docs if cache.get([symptom], agent.medicine_key(doc)) is None]
+            for i in range(0, len(pending), 5):
+                agent.validate_candidates(symptom, pending[i:i + 5], prescreen=False)
+
+    medicines = [agent.medicine_key(doc) for doc in medicine_docs]
+    symptom_vectors = embeddings.embed_documents(symptoms)
+
+    pairs, no_indications = [], set()
+    for symptom, vector in zip(symptoms, symptom_vectors):
+        for medicine, score in zip(medicines, index.scores([symptom], [vector], medicines)):
+            verdict = cache.get([symptom], medicine)
+            if verdict is None:
+                continue
+            if score is None:
+                no_indications.add(medicine)
+            # Khớp một phần cụm chỉ định (score[3]) luôn chuyển LLM, với mọi ngưỡng
+            pairs.append((symptom, medicine, verdict[0], score[0] if score and not score[3] else None))
+
+    if not pairs:
+        print("❌ Không có cặp nào có verdict LLM")
+        return
+    if no_indications:
+        print(f"ℹ️ Thuốc không có chỉ định (luôn chuyển LLM): {', '.join(sorted(no_indications))}")
+
+    print_report(pairs, args.accept, args.reject)
+
+    print("\n📈 Sweep ngưỡng (accuracy trên phần local / coverage):")
+    for accept in np.arange(0.6, 0.95, 0.1):
+        for reject in np.arange(0.2, 0.5, 0.05):
+            if reject >= accept:
+                continue
+            decided = [(truth, decide(score, accept, reject)) for _, _, truth, score in pairs]
+            local = [(t, p) for t, p in decided if p is not None]
+            accuracy = sum(1 for t, p in local if t == p) / len(local) if local else 0.0
+            print(f"   accept={accept:.2f} reject={reject:.2f}  coverage={len(local) / len(pairs):6.1%}  accuracy={accuracy:6.1%}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Báo cáo offline cho intent classifier local (accuracy / coverage / latency)
+
+Usage:
+    python evaluate_intent_classifier.py
+    python evaluate_intent_classifier.py --test-file data/intents/my_test_set.json
+"""
+import argparse
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.agents.intent_classifier import DEFAULT_EXAMPLES_PATH, EmbeddingIntentClassifier
+from src.models.llm import get_embeddings
+
+load_dotenv()
+
+
+def leave_one_out(examples, vectors):
+    """Mỗi câu mẫu được dự đoán bởi classifier train trên các câu còn lại"""
+    results = []
+    for intent, intent_vectors in vectors.items():
+        for i, vector in enumerate(intent_vectors):
+            train = {label: list(vs) for label, vs in vectors.items()}
+            train[intent] = intent_vectors[:i] + intent_vectors[i + 1:]
+            classifier = EmbeddingIntentClassifier(None).fit_vectors(train)
+            results.append((examples[intent][i], intent, classifier.scores(vector)))
+    return results
+
+
+def decide(scores, threshold, margin):
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    best_intent, best_score = ranked[0]
+    second_score = ranked[1][1] if len(ranked) > 1 else 0.0
+    if best_score >= threshold and best_score - second_score >= margin:
+        return best_intent
+    return None
+
+
+def print_report(results, labels, threshold, margin):
+    total = len(results)
+    confident = [(text, truth, decide(scores, threshold, margin)) for text, truth, scores in results]
+    covered = [(text, truth, pred) for text, truth, pred in confident if pred]
+    correct = sum(1 for _, truth, pred in covered if truth == pred)
+    top1 = sum(1 for _, truth, scores in results if max(scores, key=scores.get) == truth)
+
+    print(f"\n📊 threshold={threshold:.2f} margin={margin:.2f}")
+    print(f"   Top-1 accuracy (không ngưỡng): {top1}/{total} = {top1 / total:.1%}")
+    print(f"   Coverage (quyết định local):   {len(covered)}/{total} = {len(covered) / total:.1%}")
+    if covered:
+        print(f"   Accuracy trên phần local:      {correct}/{len(covered)} = {correct / len(covered):.1%}")
+
+    print("\n   Confusion matrix (hàng = thật, cột = dự đoán, '-' = chuyển LLM):")
+    header = "".join(f"{label[:12]:>14}" for label in labels) + f"{'-':>6}"
+    print(f"   {'':22}{header}")
+    for truth in labels:
+        row = [sum(1 for _, t, p in confident if t == truth and p == label) for label in labels]
+        fallthrough = sum(1 for _, t, p in confident if t == truth and p is None)
+        print(f"   {truth:22}" + "".join(f"{n:>14}" for n in row) + f"{fallthrough:>6}")
+
+    errors = [(text, truth, pred) for text, truth, pred in covered if truth != pred]
+    if errors:
+        print("\n   ❌ Sai:")
+        for text, truth, pred in errors:
+            print(f"      '{text}': {truth} → {pred}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent classifier offline report")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES_PATH)
+    parser.add_argument("--test-file", default=None, help="Tập test riêng (cùng format), mặc định leave-one-out")
+    parser.add_argument("--threshold", type=float, default=0.55)
+    parser.add_argument("--margin", type=float, default=0.08)
+    args = parser.parse_args()
+
+    embeddings = get_embeddings()
+    examples = EmbeddingIntentClassifier.load_examples(args.examples)
+    labels = list(examples.keys())
+
+    print("=" * 60)
+    print("🧪 INTENT CLASSIFIER REPORT")
+    print("=" * 60)
+
+    # Embed câu mẫu (1 batch call)
+    texts = [text for intent_texts in examples.values() for text in intent_texts]
+    start = time.perf_counter()
+    flat_vectors = embeddings.embed_documents(texts)
+    print(f"📚 {len(texts)} câu mẫu, {len(labels)} intents, embed: {time.perf_counter() - start:.2f}s")
+
+    vectors, offset = {}, 0
+    for intent, intent_texts in examples.items():
+        vectors[intent] = flat_vectors[offset:offset + len(intent_texts)]
+        offset += len(intent_texts)
+
+    if args.test_file:
+        test_examples = EmbeddingIntentClassifier.load_examples(args.test_file)
+        classifier = EmbeddingIntentClassifier(None).fit_vectors(vectors)
+        results = []
+        for intent, intent_texts in test_examples.items():
+            for text, vector in zip(intent_texts, embeddings.embed_documents(intent_texts)):
+                results.append((text, intent, classifier.scores(vector)))
+        print(f"🎯 Đánh giá trên {args.test_file}: {len(results)} câu")
+    else:
+        results = leave_one_out(examples, vectors)
+        print(f"🎯 Đánh giá leave-one-out: {len(results)} câu")
+
+    print_report(results, labels, args.threshold, args.margin)
+
+    print("\n📈 Sweep threshold (margin cố định):")
+    for threshold in np.arange(0.35, 0.80, 0.05):
+        decided = [(truth, decide(scores, threshold, args.margin)) for _, truth, scores in results]
+        covered = [(t, p) for t, p in decided if p]
+        accuracy = sum(1 for t, p in covered if t == p) / len(covered) if covered else 0.0
+        print(f"   threshold={threshold:.2f}  coverage={len(covered) / len(decided):6.1%}  accuracy={accuracy:6.1%}")
+
+    # Latency
+    classifier = EmbeddingIntentClassifier(embeddings, threshold=args.threshold, margin=args.margin)
+    classifier.fit_vectors(vectors)
+    query = texts[0]
+
+    start = time.perf_counter()
+    classifier.predict(query + " ")
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    runs = 1000
+    start = time.perf_counter()
+    for _ in range(runs):
+        classifier.predict(query + " ")
+    cached_ms = (time.perf_counter() - start) * 1000 / runs
+
+    print("\n⏱️ Latency:")
+    print(f"   predict (embedding chưa cache, 1 API call): {cold_ms:.1f} ms")
+    print(f"   predict (embedding đã cache):               {cached_ms:.3f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,16 @@ import sys
 from typing import List
 from langchain.schema import Document
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 from src.models.llm import get_llm, get_embeddings
 from src.services.vector_store import VectorStoreService
 from src.utils.document_loader import DocumentLoader
 from src.agents.router_graph import AgentRouterGraph  # ← Thay đổi import
+from src.orchestrator import MedicalOrchestrator
+from src.services.answer_chains import AnswerChainCache
+from src.services.history_window import HistoryWindow, RollingSummarizer
+from src.services.session_backend import create_session_backend
+from src.services.session_manager import cap_messages
 
 
 load_dotenv()
@@ -36,27 +39,18 @@ class AIWorkshopChatbot:
             self.llm = get_llm(streaming=True)
             self.vector_service = VectorStoreService()
             self.document_loader = DocumentLoader(use_unstructured=use_unstructured)
-            self.router = AgentRouterGraph(vector_service=self.vector_service)  # ← LangGraph Router
-            self.user_messages_only = []
+            # LangGraph Router, câu hỏi nhiều intent được orchestrator tách và chạy đồng thời
+            self.router = MedicalOrchestrator(AgentRouterGraph(vector_service=self.vector_service))
+            # State hội thoại nằm ở session backend (SESSION_BACKEND), nạp lại mỗi lượt
+            self.sessions = create_session_backend()
+            self.session_id = os.getenv('CHAT_SESSION_ID', 'cli')
+            # Lịch sử gửi cho model có giới hạn token, lượt cũ được tóm tắt nền
+            self.window = HistoryWindow()
+            self.summarizer = RollingSummarizer(get_llm(streaming=False), self.window)
+            self._load_session()
             
-            # Sử dụng approach mới của LangChain
-            self.chat_history = ChatMessageHistory()
-            
-            # Tạo prompt template với history
-            self.prompt = ChatPromptTemplate.from_messages([
-                ("system", "Bạn là trợ lý AI thông minh, thân thiện và hữu ích."),
-                MessagesPlaceholder(variable_name="history"),
-                ("human", "{input}")
-            ])
-            
-            # Tạo chain với message history
-            self.chain = self.prompt | self.llm
-            self.conversation = RunnableWithMessageHistory(
-                self.chain,
-                lambda session_id: self.chat_history,
-                input_messages_key="input",
-                history_messages_key="history"
-            )
+            # Chain trả lời dựng sẵn theo system prompt của từng nhánh, lịch sử truyền vào theo lượt
+            self.chains = AnswerChainCache(self.llm)
             
             self.conversation_history = []
             
@@ -124,19 +118,8 @@ class AIWorkshopChatbot:
             return ""
 
     def _build_conversation_context(self) -> str:
-        """Tạo context từ lịch sử hội thoại"""
-        if not self.chat_history.messages:
-            return ""
-        
-        # Lấy 6 tin nhắn gần nhất (3 cặp hỏi-đáp)
-        recent_messages = self.chat_history.messages[-6:]
-        
-        context_parts = []
-        for msg in recent_messages:
-            role = "Bệnh nhân" if msg.type == "human" else "Bác sĩ"
-            context_parts.append(f"{role}: {msg.content}")
-        
-        return "\n".join(context_parts)
+        """Tạo context từ lịch sử hội thoại (các lượt gần nhất, có giới hạn token)"""
+        return self.window.conversation_context(self.chat_history.messages)
 
     def _build_user_messages_only(self) -> str:
         """Tạo context CHỈ từ tin nhắn của USER"""
@@ -152,45 +135,64 @@ class AIWorkshopChatbot:
         
         return " ".join(user_messages)
 
+    def _load_session(self):
+        """Nạp state mới nhất của session từ backend (có thể đã được worker / tiến trình khác ghi)"""
+        self.session = self.sessions.load(self.session_id)
+        self.chat_history = self.session.chat_history
+        self.user_messages_only = self.session.user_messages_only
+        self.patient_state = self.session.patient_state  # Hồ sơ triệu chứng, cập nhật dần mỗi lượt
+
+    def _cap_history(self):
+        """Giữ SESSION_MAX_MESSAGES lượt mới nhất - bộ nhớ không tăng theo độ dài phiên"""
+        cap_messages(self.conversation_history)
+
     def chat(self, user_input: str) -> str:
         """Xử lý chat với RAG và streaming"""
         try:
-            # Lưu tin nhắn user gốc
-            self.user_messages_only.append(user_input)
+            self._load_session()
             
             conversation_context = self._build_conversation_context()
-            user_only_context = " ".join(self.user_messages_only[-6:])  # 6 tin nhắn gần nhất
+            user_only_context = " ".join(self.user_messages_only[-5:] + [user_input])  # 6 tin nhắn gần nhất
             
             print(f"🔍 USER ONLY CONTEXT: '{user_only_context}'")
             
             routing_result = self.router.route(
                 user_input, 
                 conversation_context,
-                user_only_context
+                user_only_context,
+                patient_state=self.patient_state
             )
             
-            # Cập nhật system prompt
-            self.prompt = ChatPromptTemplate.from_messages([
-                ("system", routing_result.get("system_prompt", "Bạn là trợ lý AI thông minh, thân thiện và hữu ích.")),
-                MessagesPlaceholder(variable_name="history"),
-                ("human", "{input}")
-            ])
+            # Câu trả lời soạn sẵn (chưa có triệu chứng / không tìm thấy) → in thẳng, không gọi LLM
+            direct_response = routing_result.get("direct_response")
+            if direct_response:
+                print(direct_response)
+                self.sessions.append_turn(
+                    self.session, user_input,
+                    [HumanMessage(content=user_input), AIMessage(content=direct_response)]
+                )
+                self.summarizer.schedule(self.sessions, self.session)
+                self.conversation_history.append({
+                    "user": user_input,
+                    "assistant": direct_response,
+                    "intent": routing_result["intent"]
+                })
+                self._cap_history()
+                return direct_response
             
-            self.chain = self.prompt | self.llm
-            self.conversation = RunnableWithMessageHistory(
-                self.chain,
-                lambda session_id: self.chat_history,
-                input_messages_key="input",
-                history_messages_key="history"
+            # Chain dựng sẵn theo system prompt của nhánh
+            chain = self.chains.get(
+                routing_result.get("response_key"),
+                routing_result.get("system_prompt", "Bạn là trợ lý AI thông minh, thân thiện và hữu ích.")
             )
             
             full_input = routing_result["prompt"]
             
             # Stream response
             full_response = ""
-            for chunk in self.conversation.stream(
-                {"input": full_input},
-                config={"configurable": {"session_id": "default"}}
+            history = self.window.for_prompt(self.session, full_input, conversation_context)
+            for chunk in chain.stream(
+                {"input": full_input, "history": history}
             ):
                 if hasattr(chunk, 'content'):
                     content = chunk.content
@@ -200,11 +202,18 @@ class AIWorkshopChatbot:
             
             print()  # Xuống dòng sau khi stream xong
             
+            # Ghi cả lượt một lần (nguyên tử) vào backend - lịch sử giữ câu hỏi gốc, không phải prompt đã chèn context
+            self.sessions.append_turn(
+                self.session, user_input,
+                [HumanMessage(content=user_input), AIMessage(content=full_response)]
+            )
+            self.summarizer.schedule(self.sessions, self.session)
             self.conversation_history.append({
                 "user": user_input,
                 "assistant": full_response,
                 "intent": routing_result["intent"]
             })
+            self._cap_history()
             
             return full_response
             
@@ -213,11 +222,16 @@ class AIWorkshopChatbot:
 
     def clear_memory(self):
         """Xóa lịch sử hội thoại"""
-        self.chat_history.clear()
+        self.sessions.clear(self.session_id)
         self.conversation_history = []
-        self.user_messages_only = []  # ← Xóa cả user_messages_only
+        self._load_session()
         print("✅ Đã xóa lịch sử hội thoại")
 
+    def close(self):
+        """Chờ tóm tắt nền xong rồi đóng session backend"""
+        self.summarizer.close()
+        self.sessions.close()
+
     def get_stats(self) -> str:
         doc_count = 0
         if self.vector_service.vector_store:
@@ -253,6 +267,7 @@ def main():
 
                 if user_input.lower() in ['/exit', '/quit', 'exit', 'quit']:
                     print("👋 Tạm biệt!")
+                    chatbot.close()
                     break
                 elif user_input.lower() in ['/clear', 'clear']:
                     os.system('cls' if os.name == 'nt' else 'clear')
@@ -276,6 +291,7 @@ def main():
 
             except KeyboardInterrupt:
                 print("\n👋 Tạm biệt!")
+                chatbot.close()
                 break
             except Exception as e:
                 print(f"❌ Lỗi: {str(e)}")
@@ -0,0 +1,79 @@
+"""
+Prewarm verdict cache: validate mọi cặp (triệu chứng trong symptoms.json, thuốc trong medicines.json)
+để các câu hỏi thuốc phổ biến không phải gọi LLM validation lúc online.
+
+Mỗi triệu chứng: các thuốc được validate theo nhóm (1 LLM call gộp / nhóm), cặp đã có verdict thì bỏ qua.
+
+Usage:
+    python prewarm_verdict_cache.py
+    python prewarm_verdict_cache.py --chunk-size 5 --symptom "đau đầu"
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.agents.medicine_agent import MedicineAgent
+from src.services.verdict_cache import MEDICINES_PATH, get_verdict_cache
+from src.utils.document_loader import DocumentLoader
+
+
+def load_symptoms(path):
+    """Tên triệu chứng trong symptoms.json, tách "Sổ mũi, nghẹt mũi" / "Buồn nôn và nôn" thành từng triệu chứng"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    symptoms = []
+    for item in data.get('symptoms', []):
+        for part in re.split(r',| và ', item.get('symptom_name', '')):
+            part = part.strip().lower()
+            if len(part) >= 2 and part not in symptoms:
+                symptoms.append(part)
+    return symptoms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prewarm medicine verdict cache")
+    documents_path = os.getenv('DOCUMENTS_PATH', './data/documents')
+    parser.add_argument("--symptoms", default=os.path.join(documents_path, 'symptoms.json'))
+    parser.add_argument("--chunk-size", type=int, default=5, help="Số thuốc mỗi LLM call gộp")
+    parser.add_argument("--symptom", action="append", help="Chỉ prewarm triệu chứng này (có thể lặp lại)")
+    args = parser.parse_args()
+
+    cache = get_verdict_cache()
+    if cache is None:
+        print("❌ Verdict cache đang tắt (VERDICT_CACHE=false)")
+        return
+
+    medicine_docs = DocumentLoader().load_document(MEDICINES_PATH) or []
+    symptoms = args.symptom or load_symptoms(args.symptoms)
+    agent = MedicineAgent()
+
+    print("=" * 60)
+    print(f"🔥 PREWARM VERDICT CACHE - {len(symptoms)} triệu chứng × {len(medicine_docs)} thuốc "
+          f"(corpus {cache.version})")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    before = len(cache)
+    for symptom in symptoms:
+        pending = [(doc, 0.0) for doc in medicine_docs
+                   if cache.get([symptom], agent.medicine_key(doc)) is None]
+        if not pending:
+            continue
+        print(f"\n💊 {symptom}: {len(pending)} thuốc chưa có verdict")
+        for i in range(0, len(pending), args.chunk_size):
+            agent.validate_candidates(symptom, pending[i:i + args.chunk_size], prescreen=False)
+
+    print("\n" + "=" * 60)
+    print(f"✅ Thêm {len(cache) - before} verdicts (tổng {len(cache)}) trong {time.perf_counter() - start:.1f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
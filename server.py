@@ -0,0 +1,25 @@
+"""
+ASGI chat server: /chat trả lời dạng Server-Sent Events, state hội thoại riêng theo session
+
+Mỗi worker một router / vector store / LLM dùng chung cho mọi session,
+tối đa MAX_CONCURRENT_CHATS lượt chạy đồng thời (xem src/api).
+
+Usage:
+    python server.py
+    uvicorn server:app --host 0.0.0.0 --port 8000 --workers 4
+
+    curl -N -X POST localhost:8000/chat -H "Content-Type: application/json" \
+         -d '{"session_id": "abc", "message": "tôi bị sốt, nên uống thuốc gì?"}'
+"""
+from dotenv import load_dotenv
+
+from src.api import create_app
+from src.api.asgi import run
+
+load_dotenv()
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    run("server:app")
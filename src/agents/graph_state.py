@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Optional, Literal
+from typing import TypedDict, Any, List, Optional, Literal
 
 
 class GraphState(TypedDict):
@@ -15,12 +15,30 @@ class GraphState(TypedDict):
     # Symptom checking
     has_symptoms: Optional[bool]
     
+    # Structured analysis (1 LLM call): False → fallback classify_intent + check_symptoms
+    analyzed: bool
+    extracted_symptoms: Optional[List[str]]
+    specialty: Optional[str]
+    
+    # Hồ sơ triệu chứng của phiên (PatientState), cập nhật từ tin nhắn mới nhất
+    patient: Optional[Any]
+    
+    # Speculative retrieval: search chạy song song với bước phân loại (SpeculativeRetrieval)
+    retrieval: Optional[Any]
+    
     # Context retrieval
     medical_context: Optional[str]
     doctor_context: Optional[str]
     medicine_context: Optional[str]
     
+    # Tracing: span của node / LLM call / vector search trong lượt chat (src/utils/tracing.Trace)
+    trace: Optional[Any]
+    
     # Output
     system_prompt: str
+    # Khóa system prompt "<intent>.<nhánh>" (src/agents/system_prompts.py) → chain trả lời dựng sẵn
+    response_key: Optional[str]
     prompt: str
+    # Câu trả lời soạn sẵn (src/agents/response_templates.py): có thì hiển thị thẳng, không gọi LLM
+    direct_response: Optional[str]
     use_context: bool
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_EXAMPLES_PATH = "./data/intents/intent_examples.json"
+DEFAULT_CENTROIDS_PATH = "./data/cache/intent_centroids.json"
+
+
+class EmbeddingIntentClassifier:
+    """
+    Phân loại intent local (nearest-centroid trên embedding của câu mẫu).
+
+    Chỉ trả về intent khi đủ tự tin (score >= threshold và cách intent thứ hai >= margin),
+    các câu mơ hồ trả về None để router hỏi LLM.
+    """
+
+    def __init__(self, embeddings, examples_path: str = DEFAULT_EXAMPLES_PATH,
+                 threshold: float = 0.55, margin: float = 0.08,
+                 centroids_path: str = DEFAULT_CENTROIDS_PATH):
+        self.embeddings = embeddings
+        self.examples_path = examples_path
+        self.threshold = threshold
+        self.margin = margin
+        self.centroids_path = centroids_path
+
+        self.labels: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+
+    @staticmethod
+    def load_examples(path: str) -> Dict[str, List[str]]:
+        """Load file câu mẫu: {"intent": ["câu 1", "câu 2", ...]}"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _model_name(self) -> str:
+        underlying = getattr(self.embeddings, 'underlying', self.embeddings)
+        return str(getattr(underlying, 'model', '') or type(underlying).__name__)
+
+    def _fingerprint(self, examples: Dict[str, List[str]]) -> str:
+        payload = json.dumps(examples, ensure_ascii=False, sort_keys=True) + self._model_name()
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def fit_vectors(self, labeled_vectors: Dict[str, List[List[float]]]):
+        """Tính centroid (đã chuẩn hóa) cho từng intent"""
+        self.labels = list(labeled_vectors.keys())
+        centroids = [
+            np.mean(self._normalize(np.asarray(vectors, dtype=np.float32)), axis=0)
+            for vectors in labeled_vectors.values()
+        ]
+        self.centroids = self._normalize(np.vstack(centroids))
+        return self
+
+    def fit(self):
+        """Train từ file câu mẫu (centroid được cache ra file, chỉ embed lại khi dữ liệu đổi)"""
+        examples = self.load_examples(self.examples_path)
+        fingerprint = self._fingerprint(examples)
+
+        if os.path.exists(self.centroids_path):
+            try:
+                with open(self.centroids_path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get('fingerprint') == fingerprint:
+                    self.labels = cached['labels']
+                    self.centroids = np.asarray(cached['centroids'], dtype=np.float32)
+                    print(f"✅ Intent classifier: load {len(self.labels)} centroids từ cache")
+                    return self
+            except (json.JSONDecodeError, KeyError) as e:
+                print(f"⚠️ Centroid cache lỗi, train lại: {str(e)}")
+
+        texts = [text for texts in examples.values() for text in texts]
+        vectors = self.embeddings.embed_documents(texts)
+
+        labeled_vectors, start = {}, 0
+        for intent, intent_texts in examples.items():
+            labeled_vectors[intent] = vectors[start:start + len(intent_texts)]
+            start += len(intent_texts)
+        self.fit_vectors(labeled_vectors)
+
+        directory = os.path.dirname(self.centroids_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.centroids_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fingerprint': fingerprint,
+                'labels': self.labels,
+                'centroids': self.centroids.tolist()
+            }, f)
+
+        print(f"✅ Intent classifier: train từ {len(texts)} câu mẫu, {len(self.labels)} intents")
+        return self
+
+    def scores(self, vector: List[float]) -> Dict[str, float]:
+        """Cosine similarity giữa query và centroid từng intent"""
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        return dict(zip(self.labels, (self.centroids @ query).tolist()))
+
+    def predict_vector(self, vector: List[float]) -> Tuple[Optional[str], float]:
+        """
+        Returns:
+            (intent, score) - intent là None nếu không đủ tự tin
+        """
+        if self.centroids is None:
+            return None, 0.0
+
+        ranked = sorted(self.scores(vector).items(), key=lambda x: x[1], reverse=True)
+        best_intent, best_score = ranked[0]
+        second_score = ranked[1][1] if len(ranked) > 1 else 0.0
+
+        if best_score >= self.threshold and best_score - second_score >= self.margin:
+            return best_intent, best_score
+        return None, best_score
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        return self.predict_vector(self.embeddings.embed_query(text))
+
+    async def apredict(self, text: str) -> Tuple[Optional[str], float]:
+        return self.predict_vector(await self.embeddings.aembed_query(text))
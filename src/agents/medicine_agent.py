@@ -1,18 +1,38 @@
+import asyncio
+import json
+import os
 from typing import Dict, Any, Optional, List
 from src.models.llm import get_llm
+from src.knowledge import get_entity_matcher, get_indication_index, get_interaction_index, get_medicine_index
+from src.services.verdict_cache import get_verdict_cache
+from src.utils.candidate_scoring import CandidateBatch
 
 
 class MedicineAgent:
     """Agent chuyên tư vấn về thuốc - Hybrid with tools"""
     
     def __init__(self, vector_service=None):
-        self.llm = get_llm(streaming=False)
+        self.llm = get_llm(streaming=False, temperature=0)
+        # LLM cho bước validate gộp: một JSON verdict ngắn cho tất cả thuốc candidates
+        self.validation_llm = self.llm.bind(
+            max_tokens=int(os.getenv('VALIDATION_MAX_TOKENS', '200')),
+            response_format={"type": "json_object"}
+        )
         self.vector_service = vector_service
+        self.entity_matcher = get_entity_matcher()
+        # ⚡ Inverted index triệu chứng → thuốc (vector search chỉ cho triệu chứng không khớp)
+        self.medicine_index = get_medicine_index()
+        # ⚡ Verdict validation đã có (giữ qua restart, prewarm bằng prewarm_verdict_cache.py)
+        self.verdict_cache = get_verdict_cache()
+        # ⚡ Pre-screen bằng embedding chỉ định: chỉ ca borderline mới cần LLM
+        self.indication_index = get_indication_index()
+        # ⚡ Bảng tương tác thuốc theo hoạt chất: kiểm tra N thuốc bằng tra dict, không LLM
+        self.interaction_index = get_interaction_index()
         
         # ✅ Initialize tools if available
         if vector_service:
             from src.tools.medical_tools import MedicalTools
-            self.medical_tools = MedicalTools(vector_service)
+            self.medical_tools = MedicalTools(vector_service, medicine_index=self.medicine_index)
         else:
             self.medical_tools = None
     
@@ -50,15 +70,11 @@ class MedicineAgent:
         
         return result
     
-    def search_medicine_by_symptoms(self, symptoms: str, conversation_context: str = "") -> Optional[str]:
-        """Tìm thuốc - Với LLM validation cải tiến"""
-        if not self.vector_service or not self.vector_service.vector_store:
-            return None
-        
-        try:
-            # Trích xuất triệu chứng
-            if conversation_context:
-                extract_prompt = f"""Từ lịch sử, CHỈ liệt kê triệu chứng người dùng ĐÃ NÓI:
+    # ==================== SEARCH BY SYMPTOMS - STEPS ====================
+    
+    def _build_extract_prompt(self, conversation_context: str) -> str:
+        """Prompt trích xuất triệu chứng từ lịch sử"""
+        return f"""Từ lịch sử, CHỈ liệt kê triệu chứng người dùng ĐÃ NÓI:
 {conversation_context}
 
 QUY TẮC:
@@ -67,101 +83,93 @@ QUY TẮC:
 - Format ngắn: "triệu chứng1, triệu chứng2"
 
 Triệu chứng:"""
-                
-                response = self.llm.invoke(extract_prompt)
-                extracted_symptoms = response.content.strip()
-                
-                # Validation
-                context_lower = conversation_context.lower()
-                symptom_keywords = [s.strip() for s in extracted_symptoms.split(',')]
-                
-                validated_keywords = []
-                for keyword in symptom_keywords:
-                    if len(keyword) < 2:
-                        continue
-                    if keyword.lower() in context_lower:
-                        validated_keywords.append(keyword)
-                    else:
-                        print(f"⚠️ Loại bỏ triệu chứng không có trong lịch sử: '{keyword}'")
-                
-                extracted_symptoms = ", ".join(validated_keywords)
-                print(f"✅ Triệu chứng sau validation: {extracted_symptoms}")
+    
+    def _validate_extracted_symptoms(self, extracted_symptoms: str, conversation_context: str) -> str:
+        """Loại bỏ triệu chứng LLM tự thêm (không có trong lịch sử)"""
+        context_lower = conversation_context.lower()
+        symptom_keywords = [s.strip() for s in extracted_symptoms.split(',')]
+        
+        validated_keywords = []
+        for keyword in symptom_keywords:
+            if len(keyword) < 2:
+                continue
+            if keyword.lower() in context_lower:
+                validated_keywords.append(keyword)
             else:
-                extracted_symptoms = symptoms
-            
-            if not extracted_symptoms or len(extracted_symptoms) < 2:
-                print("❌ Không có triệu chứng hợp lệ")
-                return None
-            
-            print(f"💊 Tìm thuốc cho triệu chứng: {extracted_symptoms}")
-            
-            # ✅ Check if user asks for specific medicine by name
-            if self.medical_tools:
-                medicine_keywords = ["paracetamol", "ibuprofen", "omeprazole", "cetirizine", "loperamide"]
-                query_lower = extracted_symptoms.lower()
-                
-                for med_name in medicine_keywords:
-                    if med_name in query_lower:
-                        print(f"🔧 Detected medicine name query: {med_name}")
-                        tool_result = self.medical_tools.search_medicine_by_name(med_name)
-                        
-                        if tool_result and "Lỗi" not in tool_result:
-                            return f"THÔNG TIN THUỐC:\n\n{tool_result}\n\n{'='*60}\n"
-            
-            # Original symptom-based search
-            symptom_keywords = [s.strip() for s in extracted_symptoms.split(',')]
-            medicine_scores = {}
-            
-            for keyword in symptom_keywords:
-                if len(keyword) < 2:
-                    continue
-                
-                queries = [keyword, f"thuốc {keyword}", f"điều trị {keyword}", f"giảm {keyword}"]
-                
-                for query in queries:
-                    results = self.vector_service.similarity_search_with_filter_and_scores(
-                        query=query,
-                        k=5,
-                        filter_dict={"filename": "medicines.json"}
-                    )
-                    
-                    for doc, score in results:
-                        medicine_name = doc.metadata.get('item_name')
-                        if not medicine_name:
-                            continue
-                        
-                        total_score = score
-                        
-                        indications_text = doc.metadata.get('indications_text', '').lower()
-                        if keyword.lower() in indications_text:
-                            total_score += 0.5
-                        
-                        if keyword.lower() in doc.page_content.lower():
-                            total_score += 0.2
-                        
-                        if medicine_name not in medicine_scores or medicine_scores[medicine_name]['score'] < total_score:
-                            medicine_scores[medicine_name] = {
-                                'doc': doc,
-                                'score': total_score,
-                                'cosine_score': score
-                            }
-            
-            sorted_medicines = sorted(medicine_scores.items(), key=lambda x: x[1]['score'], reverse=True)
-            medicine_candidates = [(item[1]['doc'], item[1]['score']) for item in sorted_medicines[:5]]
-            
-            print(f"📊 Tìm thấy {len(medicine_candidates)} loại thuốc candidates")
-            
-            # ✅ LLM VALIDATION với prompt cải tiến
-            if medicine_candidates:
-                validated_medicines = []
-                
-                for doc, score in medicine_candidates:
-                    medicine_name = doc.metadata.get('item_name', 'Unknown')
-                    category = doc.metadata.get('category', '')
-                    indications_text = doc.metadata.get('indications_text', '')
-                    
-                    # ✅ Prompt chi tiết hơn với strict rules
-                    validation_prompt = f"""Bạn là dược sĩ chuyên nghiệp. Phân tích xem thuốc có TRỰC TIẾP điều trị triệu chứng không.
+                print(f"⚠️ Loại bỏ triệu chứng không có trong lịch sử: '{keyword}'")
+        
+        extracted_symptoms = ", ".join(validated_keywords)
+        print(f"✅ Triệu chứng sau validation: {extracted_symptoms}")
+        return extracted_symptoms
+    
+    def _detect_medicine_names(self, extracted_symptoms: str) -> List[str]:
+        # Tên chuẩn / hoạt chất / biệt dược trong medicines.json (không phân biệt dấu),
+        # rồi tới tên gõ dở ("paracet") qua prefix trie của medicine index
+        return self.entity_matcher.medicines(extracted_symptoms) or \
+            self.medicine_index.find_names(extracted_symptoms)
+    
+    def _detect_medicine_name(self, extracted_symptoms: str) -> Optional[str]:
+        """Phát hiện người dùng hỏi thuốc cụ thể theo tên"""
+        medicines = self._detect_medicine_names(extracted_symptoms)
+        if medicines:
+            print(f"🔧 Detected medicine name query: {medicines[0]}")
+            return medicines[0]
+        return None
+    
+    def _split_keywords(self, extracted_symptoms: str) -> List[str]:
+        return [s.strip() for s in extracted_symptoms.split(',') if len(s.strip()) >= 2]
+    
+    def _index_results(self, extracted_symptoms: str) -> List[tuple]:
+        """(keyword, [(doc, score)]) từ medicine index cho các triệu chứng khớp chỉ định"""
+        keyword_results = []
+        for keyword in self._split_keywords(extracted_symptoms):
+            results = []
+            for medicine, weight, indication in self.medicine_index.lookup(keyword):
+                doc = self.medicine_index.document(medicine)
+                if doc is not None:
+                    # Khớp nguyên văn chỉ định: score trong [0.5, 1]
+                    results.append((doc, 0.5 + 0.5 * weight))
+            if results:
+                print(f"📇 Medicine index: '{keyword}' → {', '.join(self.medicine_key(doc) for doc, _ in results)}")
+                keyword_results.append((keyword, results))
+        return keyword_results
+    
+    def build_search_queries(self, extracted_symptoms: str) -> List[tuple]:
+        """Danh sách (keyword, query) cần vector search - chỉ triệu chứng không có trong medicine index (router dùng để prefetch)"""
+        queries = []
+        for keyword in self._split_keywords(extracted_symptoms):
+            if self.medicine_index.lookup(keyword):
+                continue
+            for query in [keyword, f"thuốc {keyword}", f"điều trị {keyword}", f"giảm {keyword}"]:
+                queries.append((keyword, query))
+        return queries
+    
+    def _score_candidates(self, keyword_results: List[tuple], top_n: int = 5) -> List[tuple]:
+        """
+        Tính điểm (search + bonus keyword có trong chỉ định / nội dung), gộp theo tên thuốc, lấy top_n
+        
+        Returns:
+            [(doc, score)] giảm dần
+        """
+        batch = CandidateBatch.from_results(keyword_results, lambda doc: doc.metadata.get('item_name'))
+        totals = (batch.scores
+                  + batch.query_bonus(lambda doc: doc.metadata.get('indications_text', ''), 0.5)
+                  + batch.query_bonus(lambda doc: doc.page_content, 0.2))
+        return batch.top(totals, top_n)
+    
+    def _top_candidates(self, keyword_results: List[tuple]) -> List[tuple]:
+        medicine_candidates = self._score_candidates(keyword_results)
+        print(f"📊 Tìm thấy {len(medicine_candidates)} loại thuốc candidates")
+        return medicine_candidates
+    
+    def _build_validation_prompt(self, extracted_symptoms: str, doc) -> str:
+        """Prompt LLM validation cho một thuốc"""
+        medicine_name = doc.metadata.get('item_name', 'Unknown')
+        category = doc.metadata.get('category', '')
+        indications_text = doc.metadata.get('indications_text', '')
+        
+        # ✅ Prompt chi tiết hơn với strict rules
+        return f"""Bạn là dược sĩ chuyên nghiệp. Phân tích xem thuốc có TRỰC TIẾP điều trị triệu chứng không.
 
 **TRIỆU CHỨNG CỦA BỆNH NHÂN:**
 {extracted_symptoms}
@@ -195,48 +203,371 @@ Với triệu chứng "{extracted_symptoms}", thuốc "{medicine_name}" (chỉ 
 - "KHÔNG PHÙ HỢP" (nếu không match)
 
 Trả lời:"""
-                    
-                    try:
-                        response = self.llm.invoke(validation_prompt)
-                        decision = response.content.strip().upper()
-                        
-                        # Stricter parsing
-                        if "PHÙ HỢP" in decision and "KHÔNG" not in decision:
-                            validated_medicines.append((doc, score))
-                            print(f"  ✅ {medicine_name} ({category}) - LLM: PHÙ HỢP")
-                        else:
-                            print(f"  ❌ {medicine_name} ({category}) - LLM: KHÔNG PHÙ HỢP")
-                            print(f"       Lý do: Chỉ định '{indications_text}' không match '{extracted_symptoms}'")
-                    
-                    except Exception as e:
-                        print(f"  ⚠️ {medicine_name} - LLM error: {str(e)}, skipping")
-                        continue
-                
-                # Lấy top 3
-                validated_medicines = validated_medicines[:3]
-                
-                print(f"✅ Sau LLM validation: {len(validated_medicines)} thuốc phù hợp")
-                
-                if validated_medicines:
-                    context_parts = []
-                    for i, (doc, score) in enumerate(validated_medicines, 1):
-                        medicine_name = doc.metadata.get('item_name', f'Thuốc {i}')
-                        cosine = medicine_scores[medicine_name]['cosine_score']
-                        print(f"  {i}. {medicine_name} (Score: {score:.3f})")
-                        
-                        # ✅ Sử dụng helper method để format bao gồm nguồn
-                        formatted_info = self._format_medicine_info(doc, score)
-                        context_parts.append(formatted_info)
-                    
-                    context = "\n\n".join(context_parts)
-                    result = f"THÔNG TIN THUỐC:\n\n{context}\n\n{'='*60}\n"
-                    
-                    print(f"✅ Returning {len(validated_medicines)} LLM-validated medicines")
-                    
-                    return result
-            
+    
+    def _parse_validation(self, decision: str, doc, extracted_symptoms: str) -> bool:
+        """Parse câu trả lời validation (stricter parsing)"""
+        medicine_name = doc.metadata.get('item_name', 'Unknown')
+        category = doc.metadata.get('category', '')
+        indications_text = doc.metadata.get('indications_text', '')
+        decision = decision.strip().upper()
+        
+        if "PHÙ HỢP" in decision and "KHÔNG" not in decision:
+            print(f"  ✅ {medicine_name} ({category}) - LLM: PHÙ HỢP")
+            return True
+        
+        print(f"  ❌ {medicine_name} ({category}) - LLM: KHÔNG PHÙ HỢP")
+        print(f"       Lý do: Chỉ định '{indications_text}' không match '{extracted_symptoms}'")
+        return False
+    
+    def _build_batch_validation_prompt(self, extracted_symptoms: str, medicine_candidates: List[tuple]) -> str:
+        """Prompt validate gộp: một lần gọi cho tất cả thuốc candidates"""
+        medicines = "\n".join(
+            f"{i}. {doc.metadata.get('medicine_name') or doc.metadata.get('item_name', 'Unknown')}"
+            f" | Chỉ định: {doc.metadata.get('indications_text', '')}"
+            for i, (doc, _) in enumerate(medicine_candidates, 1)
+        )
+        return f"""Dược sĩ: thuốc nào có chỉ định TRỰC TIẾP điều trị triệu chứng?
+Triệu chứng: {extracted_symptoms}
+Thuốc:
+{medicines}
+
+"fit": true CHỈ khi chỉ định khớp trực tiếp triệu chứng (tiêu chảy + "Tiêu chảy cấp" → true; tiêu chảy + "Loét dạ dày" → false).
+Trả về DUY NHẤT JSON: {{"results": [{{"id": 1, "fit": true, "reason": "<tối đa 8 từ>"}}, ...]}} cho MỌI thuốc."""
+    
+    def _parse_batch_validation(self, text: str, count: int) -> Optional[List[tuple]]:
+        """Parse verdict JSON → [(fit, reason)] theo thứ tự thuốc. Trả về None nếu không hợp lệ hoặc thiếu thuốc"""
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.strip("`").removeprefix("json").strip()
+        
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, ValueError):
+            return None
+        
+        results = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(results, list):
+            return None
+        
+        verdicts = {}
+        for result in results:
+            if not isinstance(result, dict):
+                continue
+            try:
+                index = int(result.get("id"))
+            except (TypeError, ValueError):
+                continue
+            fit = result.get("fit")
+            if isinstance(fit, str):
+                fit = fit.strip().lower() in ("true", "phù hợp", "yes")
+            verdicts[index] = (bool(fit), str(result.get("reason") or "").strip())
+        
+        if any(i not in verdicts for i in range(1, count + 1)):
+            return None
+        return [verdicts[i] for i in range(1, count + 1)]
+    
+    def _log_verdict(self, doc, fit: bool, reason: str, extracted_symptoms: str, source: str = "LLM"):
+        medicine_name = doc.metadata.get('item_name', 'Unknown')
+        category = doc.metadata.get('category', '')
+        if fit:
+            print(f"  ✅ {medicine_name} ({category}) - {source}: PHÙ HỢP")
+        else:
+            print(f"  ❌ {medicine_name} ({category}) - {source}: KHÔNG PHÙ HỢP")
+            print(f"       Lý do: {reason or 'chỉ định không match ' + repr(extracted_symptoms)}")
+    
+    def _collect_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple], responses) -> List[Optional[tuple]]:
+        """Verdict từ các response validate từng thuốc (None nếu LLM lỗi)"""
+        verdicts = []
+        for (doc, _), response in zip(medicine_candidates, responses):
+            if isinstance(response, Exception):
+                print(f"  ⚠️ {doc.metadata.get('item_name', 'Unknown')} - LLM error: {str(response)}, skipping")
+                verdicts.append(None)
+                continue
+            verdicts.append((self._parse_validation(response.content, doc, extracted_symptoms), ""))
+        return verdicts
+    
+    def _batch_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple], response) -> Optional[List[tuple]]:
+        verdicts = self._parse_batch_validation(response.content, len(medicine_candidates))
+        if verdicts is None:
+            print("⚠️ Batch validation JSON không hợp lệ, fallback validate từng thuốc")
+            return None
+        for (doc, _), (fit, reason) in zip(medicine_candidates, verdicts):
+            self._log_verdict(doc, fit, reason, extracted_symptoms)
+        return verdicts
+    
+    def _llm_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple]) -> List[Optional[tuple]]:
+        """
+        LLM validation: một call gộp cho tất cả candidates (JSON verdict),
+        fallback validate từng thuốc đồng thời (llm.batch) nếu JSON không hợp lệ
+        """
+        try:
+            response = self.validation_llm.invoke(
+                self._build_batch_validation_prompt(extracted_symptoms, medicine_candidates)
+            )
+            verdicts = self._batch_verdicts(extracted_symptoms, medicine_candidates, response)
+            if verdicts is not None:
+                return verdicts
+        except Exception as e:
+            print(f"⚠️ Batch validation lỗi: {str(e)}, fallback validate từng thuốc")
+        
+        responses = self.llm.batch(
+            [self._build_validation_prompt(extracted_symptoms, doc) for doc, _ in medicine_candidates],
+            return_exceptions=True
+        )
+        return self._collect_verdicts(extracted_symptoms, medicine_candidates, responses)
+    
+    async def _allm_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple]) -> List[Optional[tuple]]:
+        """Async version của _llm_verdicts"""
+        try:
+            response = await self.validation_llm.ainvoke(
+                self._build_batch_validation_prompt(extracted_symptoms, medicine_candidates)
+            )
+            verdicts = self._batch_verdicts(extracted_symptoms, medicine_candidates, response)
+            if verdicts is not None:
+                return verdicts
+        except Exception as e:
+            print(f"⚠️ Batch validation lỗi: {str(e)}, fallback validate từng thuốc")
+        
+        responses = await asyncio.gather(*[
+            self.llm.ainvoke(self._build_validation_prompt(extracted_symptoms, doc))
+            for doc, _ in medicine_candidates
+        ], return_exceptions=True)
+        return self._collect_verdicts(extracted_symptoms, medicine_candidates, responses)
+    
+    @staticmethod
+    def medicine_key(doc) -> str:
+        return doc.metadata.get('medicine_name') or doc.metadata.get('item_name', 'Unknown')
+    
+    def _cached_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple]) -> List[Optional[tuple]]:
+        """Verdict có sẵn trong verdict cache (None = chưa có)"""
+        if self.verdict_cache is None:
+            return [None] * len(medicine_candidates)
+        
+        symptoms = extracted_symptoms.split(',')
+        verdicts = []
+        for doc, _ in medicine_candidates:
+            verdict = self.verdict_cache.get(symptoms, self.medicine_key(doc))
+            if verdict is not None:
+                self._log_verdict(doc, verdict[0], verdict[1], extracted_symptoms, source="cache")
+            verdicts.append(verdict)
+        return verdicts
+    
+    def _prescreen_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple],
+                            verdicts: List[Optional[tuple]], prescreens: List[Optional[tuple]]):
+        """Điền verdict pre-screen (accept / reject rõ ràng) vào các thuốc chưa có verdict"""
+        for i, ((doc, _), prescreen) in enumerate(zip(medicine_candidates, prescreens)):
+            if verdicts[i] is None and prescreen is not None:
+                verdicts[i] = prescreen
+                self._log_verdict(doc, prescreen[0], prescreen[1], extracted_symptoms, source="embedding")
+    
+    def _merge_verdicts(self, extracted_symptoms: str, medicine_candidates: List[tuple],
+                        verdicts: List[Optional[tuple]], pending: List[int], new_verdicts: List[Optional[tuple]]) -> List[tuple]:
+        """Ghi verdict mới vào cache, trả về các thuốc PHÙ HỢP (giữ thứ tự điểm)"""
+        symptoms = extracted_symptoms.split(',')
+        for i, verdict in zip(pending, new_verdicts):
+            verdicts[i] = verdict
+            if verdict is not None and self.verdict_cache is not None:
+                self.verdict_cache.set(symptoms, self.medicine_key(medicine_candidates[i][0]), *verdict)
+        return [candidate for candidate, verdict in zip(medicine_candidates, verdicts) if verdict and verdict[0]]
+    
+    def validate_candidates(self, extracted_symptoms: str, medicine_candidates: List[tuple],
+                            prescreen: bool = True) -> List[tuple]:
+        """
+        Validate thuốc candidates: verdict cache → pre-screen embedding → LLM cho phần còn lại
+        
+        Args:
+            prescreen: False để luôn hỏi LLM các thuốc chưa có trong cache (prewarm, đánh giá)
+        
+        Returns:
+            Các (doc, score) PHÙ HỢP
+        """
+        verdicts = self._cached_verdicts(extracted_symptoms, medicine_candidates)
+        if prescreen and self.indication_index is not None and None in verdicts:
+            try:
+                self._prescreen_verdicts(extracted_symptoms, medicine_candidates, verdicts, self.indication_index.prescreen(
+                    extracted_symptoms, [self.medicine_key(doc) for doc, _ in medicine_candidates]
+                ))
+            except Exception as e:
+                print(f"⚠️ Pre-screen lỗi: {str(e)}, validate bằng LLM")
+        
+        pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        new_verdicts = []
+        if pending:
+            new_verdicts = self._llm_verdicts(extracted_symptoms, [medicine_candidates[i] for i in pending])
+        return self._merge_verdicts(extracted_symptoms, medicine_candidates, verdicts, pending, new_verdicts)
+    
+    async def avalidate_candidates(self, extracted_symptoms: str, medicine_candidates: List[tuple],
+                                   prescreen: bool = True) -> List[tuple]:
+        """Async version của validate_candidates - đọc / ghi verdict cache (SQLite) trong thread, không chặn event loop"""
+        verdicts = await asyncio.to_thread(self._cached_verdicts, extracted_symptoms, medicine_candidates)
+        if prescreen and self.indication_index is not None and None in verdicts:
+            try:
+                self._prescreen_verdicts(extracted_symptoms, medicine_candidates, verdicts, await self.indication_index.aprescreen(
+                    extracted_symptoms, [self.medicine_key(doc) for doc, _ in medicine_candidates]
+                ))
+            except Exception as e:
+                print(f"⚠️ Pre-screen lỗi: {str(e)}, validate bằng LLM")
+        
+        pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        new_verdicts = []
+        if pending:
+            new_verdicts = await self._allm_verdicts(extracted_symptoms, [medicine_candidates[i] for i in pending])
+        return await asyncio.to_thread(
+            self._merge_verdicts, extracted_symptoms, medicine_candidates, verdicts, pending, new_verdicts
+        )
+    
+    def _build_medicine_context(self, validated_medicines: List[tuple]) -> Optional[str]:
+        """Format context từ các thuốc đã validate (top 3)"""
+        validated_medicines = validated_medicines[:3]
+        
+        print(f"✅ Sau LLM validation: {len(validated_medicines)} thuốc phù hợp")
+        
+        if not validated_medicines:
             print("❌ Không tìm thấy thuốc phù hợp sau LLM validation")
             return None
+        
+        context_parts = []
+        for i, (doc, score) in enumerate(validated_medicines, 1):
+            medicine_name = doc.metadata.get('item_name', f'Thuốc {i}')
+            print(f"  {i}. {medicine_name} (Score: {score:.3f})")
+            
+            # ✅ Sử dụng helper method để format bao gồm nguồn
+            formatted_info = self._format_medicine_info(doc, score)
+            context_parts.append(formatted_info)
+        
+        context = "\n\n".join(context_parts)
+        print(f"✅ Returning {len(validated_medicines)} LLM-validated medicines")
+        return f"THÔNG TIN THUỐC:\n\n{context}\n\n{'='*60}\n"
+    
+    # ==================== SEARCH BY SYMPTOMS ====================
+    
+    def _medicine_info_context(self, tool_result: str, extracted_symptoms: str) -> str:
+        context = f"THÔNG TIN THUỐC:\n\n{tool_result}\n\n{'='*60}\n"
+        # Hỏi nhiều thuốc cùng lúc ("uống ibuprofen với diclofenac được không") → kèm cảnh báo tương tác
+        warning = self.check_drug_interactions(self._detect_medicine_names(extracted_symptoms))
+        if warning:
+            context += f"\n{warning}\n\n{'='*60}\n"
+        return context
+    
+    def search_medicine_by_symptoms(self, symptoms: str, conversation_context: str = "",
+                                    extracted_symptoms: Optional[List[str]] = None, retrieval=None) -> Optional[str]:
+        """
+        Tìm thuốc - Với LLM validation cải tiến
+        
+        Args:
+            extracted_symptoms: Triệu chứng đã trích xuất sẵn từ router (bỏ qua bước hỏi LLM)
+            retrieval: Speculative retrieval của lượt chat (search đã chạy trước), mặc định vector service
+        """
+        if not self.vector_service or not self.vector_service.vector_store:
+            return None
+        
+        try:
+            # Trích xuất triệu chứng
+            if extracted_symptoms:
+                extracted_symptoms = ", ".join(extracted_symptoms)
+            elif conversation_context:
+                response = self.llm.invoke(self._build_extract_prompt(conversation_context))
+                extracted_symptoms = self._validate_extracted_symptoms(
+                    response.content.strip(), conversation_context
+                )
+            else:
+                extracted_symptoms = symptoms
+            
+            if not extracted_symptoms or len(extracted_symptoms) < 2:
+                print("❌ Không có triệu chứng hợp lệ")
+                return None
+            
+            print(f"💊 Tìm thuốc cho triệu chứng: {extracted_symptoms}")
+            
+            # ✅ Check if user asks for specific medicine by name
+            if self.medical_tools:
+                med_name = self._detect_medicine_name(extracted_symptoms)
+                if med_name:
+                    tool_result = self.medical_tools.search_medicine_by_name(med_name)
+                    if tool_result and "Lỗi" not in tool_result:
+                        return self._medicine_info_context(tool_result, extracted_symptoms)
+            
+            # Tra medicine index, vector search cho triệu chứng còn lại
+            keyword_results = self._index_results(extracted_symptoms)
+            searcher = retrieval or self.vector_service
+            for keyword, query in self.build_search_queries(extracted_symptoms):
+                results = searcher.similarity_search_with_filter_and_scores(
+                    query=query,
+                    k=5,
+                    filter_dict={"filename": "medicines.json"}
+                )
+                keyword_results.append((keyword, results))
+            
+            medicine_candidates = self._top_candidates(keyword_results)
+            
+            # Không hit nào qua ngưỡng relevance → bỏ qua LLM validation và context thuốc
+            if not medicine_candidates:
+                print("❌ Không có thuốc nào qua ngưỡng relevance, bỏ qua LLM validation")
+                return None
+            
+            # ✅ LLM VALIDATION với prompt cải tiến
+            
+            validated_medicines = self.validate_candidates(extracted_symptoms, medicine_candidates)
+            return self._build_medicine_context(validated_medicines)
+            
+        except Exception as e:
+            print(f"⚠️ Lỗi tìm kiếm thuốc: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    async def asearch_medicine_by_symptoms(self, symptoms: str, conversation_context: str = "",
+                                           extracted_symptoms: Optional[List[str]] = None,
+                                           retrieval=None) -> Optional[str]:
+        """Async version - các vector search và LLM validation chạy đồng thời"""
+        if not self.vector_service or not self.vector_service.vector_store:
+            return None
+        
+        try:
+            if extracted_symptoms:
+                extracted_symptoms = ", ".join(extracted_symptoms)
+            elif conversation_context:
+                response = await self.llm.ainvoke(self._build_extract_prompt(conversation_context))
+                extracted_symptoms = self._validate_extracted_symptoms(
+                    response.content.strip(), conversation_context
+                )
+            else:
+                extracted_symptoms = symptoms
+            
+            if not extracted_symptoms or len(extracted_symptoms) < 2:
+                print("❌ Không có triệu chứng hợp lệ")
+                return None
+            
+            print(f"💊 Tìm thuốc cho triệu chứng: {extracted_symptoms}")
+            
+            if self.medical_tools:
+                med_name = self._detect_medicine_name(extracted_symptoms)
+                if med_name:
+                    tool_result = await self.medical_tools.asearch_medicine_by_name(med_name)
+                    if tool_result and "Lỗi" not in tool_result:
+                        return self._medicine_info_context(tool_result, extracted_symptoms)
+            
+            keyword_results = self._index_results(extracted_symptoms)
+            search_queries = self.build_search_queries(extracted_symptoms)
+            searcher = retrieval or self.vector_service
+            all_results = await asyncio.gather(*[
+                searcher.asimilarity_search_with_filter_and_scores(
+                    query=query,
+                    k=5,
+                    filter_dict={"filename": "medicines.json"}
+                )
+                for _, query in search_queries
+            ])
+            keyword_results += [(keyword, results) for (keyword, _), results in zip(search_queries, all_results)]
+            
+            medicine_candidates = self._top_candidates(keyword_results)
+            
+            if not medicine_candidates:
+                print("❌ Không có thuốc nào qua ngưỡng relevance, bỏ qua LLM validation")
+                return None
+            
+            validated_medicines = await self.avalidate_candidates(extracted_symptoms, medicine_candidates)
+            return self._build_medicine_context(validated_medicines)
             
         except Exception as e:
             print(f"⚠️ Lỗi tìm kiếm thuốc: {str(e)}")
@@ -265,25 +596,18 @@ Trả lời:"""
     
     def check_drug_interaction(self, drug1: str, drug2: str) -> Optional[str]:
         """Kiểm tra tương tác giữa hai loại thuốc"""
-        if not self.vector_service or not self.vector_service.vector_store:
+        return self.check_drug_interactions([drug1, drug2])
+    
+    def check_drug_interactions(self, drugs: List[str]) -> Optional[str]:
+        """Kiểm tra mọi cặp tương tác trong danh sách thuốc (tên thuốc, hoạt chất hoặc biệt dược)"""
+        if len(drugs) < 2:
             return None
         
-        try:
-            query = f"{drug1} {drug2} tương tác"
-            results = self.vector_service.similarity_search(query, k=3)
-            
-            interaction_docs = [doc for doc in results 
-                              if doc.metadata.get('filename') == 'drug_interactions.json']
-            
-            if interaction_docs:
-                context = "\n\n".join([doc.page_content for doc in interaction_docs])
-                return f"CẢNH BÁO TƯƠNG TÁC THUỐC:\n\n{context}"
-            
-            return None
-            
-        except Exception as e:
-            print(f"⚠️ Lỗi kiểm tra tương tác thuốc: {str(e)}")
-            return None
+        interactions = self.interaction_index.check(drugs)
+        if interactions:
+            print(f"⚠️ Phát hiện {len(interactions)} tương tác thuốc: "
+                  f"{', '.join(f'{i.drug_a} + {i.drug_b}' for i in interactions)}")
+        return self.interaction_index.format(interactions)
     
     def get_health_tips(self, category: str = "") -> Optional[str]:
         """Lấy lời khuyên sức khỏe"""
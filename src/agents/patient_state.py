@@ -0,0 +1,146 @@
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.knowledge.entity_matcher import MedicalEntityMatcher
+from src.utils.text_normalizer import fold_text, nfc_lower
+
+
+# "từ hôm qua", "3 ngày nay", "cách đây 2 tuần", "sáng nay"... (so khớp trên text không dấu)
+ONSET_PATTERN = re.compile(
+    r"(?<!\w)(?:(?:tu|cach day|duoc|khoang|da)\s+)?"
+    r"(?:\d+|mot|hai|ba|bon|nam|vai|may)\s+(?:phut|gio|tieng|ngay|hom|tuan|thang|nam)"
+    r"(?:\s+(?:nay|roi|truoc|qua))?(?!\w)"
+    r"|(?<!\w)(?:tu\s+)?(?:hom qua|hom kia|toi qua|dem qua|sang nay|chieu nay|toi nay|tuan truoc|thang truoc|moi day)(?!\w)"
+)
+
+# Từ chỉ mức độ → mức độ chuẩn
+SEVERITY_KEYWORDS = {
+    'dữ dội': 'nặng',
+    'kinh khủng': 'nặng',
+    'không chịu nổi': 'nặng',
+    'rất nặng': 'nặng',
+    'nặng': 'nặng',
+    'khá nặng': 'vừa',
+    'vừa phải': 'vừa',
+    'âm ỉ': 'nhẹ',
+    'nhẹ': 'nhẹ',
+}
+
+_severity_matcher = MedicalEntityMatcher()
+for _keyword, _level in SEVERITY_KEYWORDS.items():
+    _severity_matcher.add("severity", _keyword, _level)
+_severity_matcher.build()
+
+
+def symptom_keys(symptom: str) -> Set[str]:
+    """Khóa so khớp không dấu của một triệu chứng và các phần của nó ("Sổ mũi, nghẹt mũi" → 3 khóa)"""
+    parts = [symptom] + re.split(r',| và ', symptom)
+    return {key for key in (fold_text(part).strip() for part in parts) if len(key) >= 2}
+
+
+@dataclass
+class PatientState:
+    """
+    Hồ sơ triệu chứng của một phiên chat, cập nhật dần từ tin nhắn MỚI NHẤT của người dùng
+    (không trích xuất lại từ toàn bộ lịch sử mỗi lượt).
+    """
+
+    symptoms: List[str] = field(default_factory=list)
+    onset: Optional[str] = None
+    severity: Optional[str] = None
+    specialty: Optional[str] = None
+
+    @property
+    def has_symptoms(self) -> bool:
+        return bool(self.symptoms)
+
+    def add_symptoms(self, symptoms: List[str]) -> List[str]:
+        """Thêm triệu chứng mới (bỏ trùng, không phân biệt dấu/hoa thường). Trả về các triệu chứng vừa thêm"""
+        known = {fold_text(s).strip() for s in self.symptoms}
+        added = []
+        for symptom in symptoms:
+            symptom = symptom.strip()
+            key = fold_text(symptom).strip()
+            if len(key) < 2 or key in known:
+                continue
+            known.add(key)
+            self.symptoms.append(symptom)
+            added.append(symptom)
+        return added
+
+    def remove_symptoms(self, symptoms: Iterable[str]) -> List[str]:
+        """
+        Bỏ triệu chứng người dùng phủ định / đã khỏi (so khớp không dấu, cả từng phần của tên chuẩn).
+        Hết triệu chứng → xóa luôn khởi phát, mức độ; chuyên khoa được xác định lại ở lượt sau.
+
+        Returns:
+            Các triệu chứng vừa bỏ
+        """
+        keys = set().union(*(symptom_keys(s) for s in symptoms))
+        removed = [s for s in self.symptoms if symptom_keys(s) & keys]
+        if not removed:
+            return []
+        self.symptoms = [s for s in self.symptoms if s not in removed]
+        self.specialty = None
+        if not self.symptoms:
+            self.onset = None
+            self.severity = None
+        return removed
+
+    def update_from_message(self, message: str, entity_matcher) -> Tuple[List[str], List[str]]:
+        """
+        Cập nhật hồ sơ từ một tin nhắn (local, không gọi LLM):
+        triệu chứng người dùng mô tả ("tôi bị ...") + thời gian khởi phát + mức độ,
+        bỏ triệu chứng người dùng phủ định hoặc đã khỏi ("không bị sốt", "hết ho")
+
+        Returns:
+            (các triệu chứng vừa thêm, các triệu chứng vừa bỏ)
+        """
+        removed = self.remove_symptoms(entity_matcher.negated_symptoms(message))
+        added = []
+        # Triệu chứng khẳng định ngoài vùng phủ định vẫn được thêm ("tôi bị đau đầu, không sốt",
+        # "hết sốt nhưng vẫn ho")
+        if entity_matcher.affirms_symptoms(message) or removed:
+            added = self.add_symptoms(entity_matcher.symptoms(message))
+        self.update_details(message)
+        return added, removed
+
+    def update_details(self, message: str):
+        """Thời gian khởi phát + mức độ từ tin nhắn (chỉ khi hồ sơ đã có triệu chứng)"""
+        if not self.has_symptoms:
+            return
+        # fold_text cùng độ dài với nfc_lower → cắt lại được đoạn gốc có dấu
+        onset = ONSET_PATTERN.search(fold_text(message))
+        if onset:
+            self.onset = nfc_lower(message)[onset.start():onset.end()].strip()
+        # Cụm dài nhất ("rất nặng" thay vì "nặng")
+        severities = sorted(_severity_matcher.find(message), key=lambda m: m.start - m.end)
+        if severities:
+            self.severity = severities[0].value
+
+    def summary(self) -> str:
+        """Mô tả ngắn để đưa vào prompt"""
+        if not self.has_symptoms:
+            return "(chưa có triệu chứng)"
+        parts = [f"Triệu chứng: {', '.join(self.symptoms)}"]
+        if self.onset:
+            parts.append(f"Khởi phát: {self.onset}")
+        if self.severity:
+            parts.append(f"Mức độ: {self.severity}")
+        if self.specialty:
+            parts.append(f"Chuyên khoa: {self.specialty}")
+        return " | ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "PatientState":
+        data = data or {}
+        return cls(
+            symptoms=list(data.get('symptoms') or []),
+            onset=data.get('onset'),
+            severity=data.get('severity'),
+            specialty=data.get('specialty')
+        )
@@ -0,0 +1,54 @@
+from typing import List, Optional
+
+
+# Câu trả lời soạn sẵn cho các nhánh gần như cố định (chưa có triệu chứng / không tìm thấy):
+# app.py / main.py hiển thị thẳng, không gọi LLM sinh lại cùng một nội dung
+
+NO_SYMPTOMS_DOCTOR = """Để gợi ý bác sĩ phù hợp, tôi cần biết thêm thông tin về tình trạng sức khỏe của bạn.
+
+Vui lòng cho tôi biết:
+- Bạn đang gặp triệu chứng gì?
+- Triệu chứng xuất hiện từ bao lâu?
+- Mức độ nghiêm trọng như thế nào?"""
+
+NO_SYMPTOMS_MEDICINE = """Để gợi ý thuốc và liều lượng sử dụng, chế độ nghỉ ngơi phù hợp, tôi cần biết thêm thông tin về tình trạng sức khỏe của bạn.
+
+Vui lòng cho tôi biết:
+- Bạn đang gặp triệu chứng gì?
+- Triệu chứng xuất hiện từ bao lâu?
+- Mức độ nghiêm trọng như thế nào?"""
+
+# Câu hỏi nhiều việc (bác sĩ + thuốc) khi chưa có triệu chứng → hỏi lại một lần
+NO_SYMPTOMS_MULTI = """Để gợi ý bác sĩ, thuốc và chế độ nghỉ ngơi phù hợp, tôi cần biết thêm thông tin về tình trạng sức khỏe của bạn.
+
+Vui lòng cho tôi biết:
+- Bạn đang gặp triệu chứng gì?
+- Triệu chứng xuất hiện từ bao lâu?
+- Mức độ nghiêm trọng như thế nào?"""
+
+DOCTOR_NOT_FOUND = """Xin lỗi, hiện tại tôi chưa tìm thấy bác sĩ phù hợp {symptoms} trong cơ sở dữ liệu của mình.
+
+Bạn có thể:
+
+1. **Mô tả rõ hơn triệu chứng** (vị trí, thời gian xuất hiện, mức độ) để tôi tìm lại chuyên khoa phù hợp
+2. **Gọi tổng đài tư vấn y tế**:
+   - Tổng đài 115 (cấp cứu)
+   - Hotline tư vấn y tế: 19003115"""
+
+MEDICINE_NOT_FOUND = """Xin lỗi, hiện tại tôi chưa có thông tin chi tiết về thuốc phù hợp {symptoms} trong cơ sở dữ liệu của mình.
+
+Để được tư vấn chính xác về thuốc và liều lượng phù hợp, tôi khuyên bạn:
+
+1. **Đến phòng khám hoặc bệnh viện gần nhất** để được bác sĩ khám và kê đơn thuốc phù hợp
+2. **Tham khảo dược sĩ tại nhà thuốc** để được tư vấn trực tiếp về thuốc không kê đơn
+3. **Gọi tổng đài tư vấn y tế**:
+   - Tổng đài 115 (cấp cứu)
+   - Hotline tư vấn dược: 19003190
+
+**Lưu ý quan trọng:** Không tự ý mua và sử dụng thuốc mà chưa có chỉ định của bác sĩ hoặc dược sĩ, vì có thể gây ra tác dụng phụ không mong muốn."""
+
+
+def render_response(template: str, symptoms: Optional[List[str]] = None) -> str:
+    """Điền triệu chứng đã trích xuất vào câu trả lời soạn sẵn"""
+    symptoms_text = f"cho triệu chứng **{', '.join(symptoms)}** của bạn" if symptoms else "cho triệu chứng của bạn"
+    return template.format(symptoms=symptoms_text)
@@ -2,6 +2,7 @@ from enum import Enum
 from typing import Dict, Any, Optional
 from src.models.llm import get_llm
 from src.agents.medicine_agent import MedicineAgent
+from src.knowledge.entity_matcher import MedicalEntityMatcher
 
 
 class IntentType(Enum):
@@ -16,7 +17,7 @@ class AgentRouter:
     """Agent Router để điều hướng cuộc hội thoại"""
     
     def __init__(self, vector_service=None):
-        self.llm = get_llm(streaming=False)
+        self.llm = get_llm(streaming=False, temperature=0)
         self.vector_service = vector_service
         self.medicine_agent = MedicineAgent(vector_service)
         
@@ -38,6 +39,15 @@ class AgentRouter:
             'thuốc', 'uống thuốc gì', 'dùng thuốc', 'mua thuốc',
             'liều dùng', 'cách dùng', 'tác dụng phụ', 'chống chỉ định'
         ]
+        
+        # ⚡ Compile keywords thành một automaton (một lần duyệt, không phân biệt dấu)
+        self.keyword_matcher = MedicalEntityMatcher()
+        for intent, keywords in ((IntentType.MEDICINE_INQUIRY, self.medicine_keywords),
+                                 (IntentType.DOCTOR_RECOMMENDATION, self.doctor_keywords),
+                                 (IntentType.MEDICAL_CONSULTATION, self.medical_keywords)):
+            for keyword in keywords:
+                self.keyword_matcher.add("intent", keyword, intent)
+        self.keyword_matcher.build()
     
     def normalize_text(self, text: str) -> str:
         """Chuẩn hóa text để search tốt hơn"""
@@ -48,19 +58,13 @@ class AgentRouter:
     
     def classify_intent(self, user_message: str) -> IntentType:
         """Phân loại intent của tin nhắn"""
-        user_message_lower = user_message.lower()
-        
-        # Kiểm tra keywords thuốc
-        if any(keyword in user_message_lower for keyword in self.medicine_keywords):
-            return IntentType.MEDICINE_INQUIRY
-        
-        # Kiểm tra keywords tìm bác sĩ
-        if any(keyword in user_message_lower for keyword in self.doctor_keywords):
-            return IntentType.DOCTOR_RECOMMENDATION
+        matched = {match.value for match in self.keyword_matcher.find(user_message)}
         
-        # Kiểm tra keywords y tế
-        if any(keyword in user_message_lower for keyword in self.medical_keywords):
-            return IntentType.MEDICAL_CONSULTATION
+        # Ưu tiên: thuốc → bác sĩ → y tế
+        for intent in (IntentType.MEDICINE_INQUIRY, IntentType.DOCTOR_RECOMMENDATION,
+                       IntentType.MEDICAL_CONSULTATION):
+            if intent in matched:
+                return intent
         
         # Sử dụng LLM để phân loại
         prompt = f"""Phân loại intent của câu hỏi người dùng.
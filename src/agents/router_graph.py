@@ -1,10 +1,23 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Dict, Any, Optional, Literal
+from typing import Dict, Any, Optional, Literal, List
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-from src.models.llm import get_llm
+from src.models.llm import get_llm, get_embeddings
+from src.models.llm_cache import semantic_key
+from src.agents.intent_classifier import EmbeddingIntentClassifier
+from src.knowledge import get_department_index, get_entity_matcher
 from src.agents.medicine_agent import MedicineAgent
 from src.agents.graph_state import GraphState
+from src.agents.patient_state import PatientState, symptom_keys
+from src.agents import response_templates, system_prompts
 from src.tools.medical_tools import MedicalTools
+from src.services.speculative_retrieval import SpeculativeRetrieval
+from src.utils.candidate_scoring import CandidateBatch
+from src.utils.tracing import span, start_trace, write_trace_log
 
 
 class IntentType(Enum):
@@ -19,36 +32,105 @@ class AgentRouterGraph:
     """Agent Router sử dụng LangGraph + Tools"""
     
     def __init__(self, vector_service=None):
-        self.llm = get_llm(streaming=False)
+        self.llm = get_llm(streaming=False, temperature=0)
+        # LLM cho bước phân tích gộp: output JSON ngắn
+        self.analysis_llm = self.llm.bind(
+            max_tokens=int(os.getenv('ANALYSIS_MAX_TOKENS', '150')),
+            response_format={"type": "json_object"}
+        )
         self.vector_service = vector_service
         self.medicine_agent = MedicineAgent(vector_service)
         
+        # ⚡ Index chuyên khoa → khoa → bác sĩ (tra cứu local, không gọi mạng)
+        self.department_index = get_department_index()
+        
         # ✅ Initialize tools
         if vector_service:
-            self.medical_tools = MedicalTools(vector_service)
+            self.medical_tools = MedicalTools(vector_service, self.department_index)
             self.tools = self.medical_tools.get_all_tools()
         else:
             self.tools = []
         
+        # ⚡ Fast path: phân loại intent local trước khi hỏi LLM
+        self.intent_classifier = self._init_intent_classifier()
+        
+        # ⚡ Entity matcher (Aho–Corasick): triệu chứng / thuốc / khoa trong một lần duyệt
+        self.entity_matcher = get_entity_matcher()
+        
+        # ⚡ Speculative retrieval: vector search chạy song song với bước phân loại
+        self.speculative_retrieval = bool(vector_service) and os.getenv('SPECULATIVE_RETRIEVAL', 'true').lower() == 'true'
+        self._prefetch_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SPECULATIVE_MAX_WORKERS', '4')),
+            thread_name_prefix="prefetch"
+        ) if self.speculative_retrieval else None
+        
+        # ⚡ Nhánh chưa có triệu chứng / không tìm thấy: trả câu soạn sẵn, không gọi LLM sinh lại
+        self.template_responses = os.getenv('TEMPLATE_RESPONSES', 'true').lower() == 'true'
+        
         # Build graph
         self.graph = self._build_graph()
     
+    def _init_intent_classifier(self) -> Optional[EmbeddingIntentClassifier]:
+        """Khởi tạo intent classifier local (None nếu tắt hoặc train lỗi)"""
+        if os.getenv('INTENT_CLASSIFIER', 'true').lower() != 'true':
+            return None
+        
+        try:
+            embeddings = self.vector_service.embeddings if self.vector_service else get_embeddings()
+            return EmbeddingIntentClassifier(
+                embeddings,
+                threshold=float(os.getenv('INTENT_CLASSIFIER_THRESHOLD', '0.55')),
+                margin=float(os.getenv('INTENT_CLASSIFIER_MARGIN', '0.08'))
+            ).fit()
+        except Exception as e:
+            print(f"⚠️ Không khởi tạo được intent classifier, dùng LLM: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _node(func, afunc=None) -> RunnableLambda:
+        """Node chạy `func` với graph.invoke và `afunc` với graph.ainvoke (mỗi lần chạy là một span)"""
+        name = func.__name__
+        
+        def traced(state):
+            with span("node", name):
+                return func(state)
+        
+        async def atraced(state):
+            with span("node", name):
+                return await afunc(state) if afunc else func(state)
+        
+        return RunnableLambda(traced, afunc=atraced, name=name)
+    
     def _build_graph(self) -> StateGraph:
         """Xây dựng LangGraph workflow"""
         workflow = StateGraph(GraphState)
         
-        # Add nodes
-        workflow.add_node("classify_intent", self.classify_intent_node)
-        workflow.add_node("check_symptoms", self.check_symptoms_node)
-        workflow.add_node("get_medical_context", self.get_medical_context_node)
-        workflow.add_node("get_doctor_context", self.get_doctor_context_node)
-        workflow.add_node("get_medicine_context", self.get_medicine_context_node)
-        workflow.add_node("build_response", self.build_response_node)
+        # Add nodes - mỗi node có bản sync (route) và async (aroute)
+        workflow.add_node("analyze_message", self._node(self.analyze_message_node, self.aanalyze_message_node))
+        workflow.add_node("classify_intent", self._node(self.classify_intent_node, self.aclassify_intent_node))
+        workflow.add_node("check_symptoms", self._node(self.check_symptoms_node, self.acheck_symptoms_node))
+        workflow.add_node("get_medical_context", self._node(self.get_medical_context_node, self.aget_medical_context_node))
+        workflow.add_node("get_doctor_context", self._node(self.get_doctor_context_node, self.aget_doctor_context_node))
+        workflow.add_node("get_medicine_context", self._node(self.get_medicine_context_node, self.aget_medicine_context_node))
+        workflow.add_node("build_response", self._node(self.build_response_node))
         
         # Set entry point
-        workflow.set_entry_point("classify_intent")
+        workflow.set_entry_point("analyze_message")
         
         # Add conditional edges
+        workflow.add_conditional_edges(
+            "analyze_message",
+            self.route_by_analysis,
+            {
+                "fallback": "classify_intent",
+                "medical_consultation": "get_medical_context",
+                "general_chat": "build_response",
+                "has_symptoms_doctor": "get_doctor_context",
+                "has_symptoms_medicine": "get_medicine_context",
+                "no_symptoms": "build_response"
+            }
+        )
+        
         workflow.add_conditional_edges(
             "classify_intent",
             self.route_by_intent,
@@ -77,14 +159,302 @@ class AgentRouterGraph:
         
         return workflow.compile()
     
+    # ==================== PATIENT STATE ====================
+    
+    def _user_text(self, state: GraphState) -> str:
+        """
+        Text người dùng để dò triệu chứng local: có PatientState thì chỉ tin nhắn mới nhất
+        (triệu chứng cũ đã nằm trong hồ sơ), không thì cả lịch sử tin nhắn người dùng
+        """
+        patient = state.get("patient")
+        # Xuống dòng = ranh giới mệnh đề: phủ định trong tin nhắn không lan sang phần ghép thêm
+        if patient is not None:
+            return f"{state['user_message']}\n{', '.join(patient.symptoms)}"
+        return f"{state.get('user_only_context', '')}\n{state['user_message']}"
+    
+    def _extraction_context(self, state: GraphState) -> str:
+        """Context cho bước trích xuất triệu chứng bằng LLM (chỉ tin nhắn mới nhất nếu có hồ sơ)"""
+        return state["user_message"] if state.get("patient") is not None else state["conversation_context"]
+    
+    def _update_patient(self, state: GraphState):
+        """Cập nhật hồ sơ từ tin nhắn mới nhất (local, chi phí không tăng theo lịch sử)"""
+        patient = state.get("patient")
+        if patient is None:
+            return
+        added, removed = patient.update_from_message(state["user_message"], self.entity_matcher)
+        if added or removed:
+            print(f"🩺 Hồ sơ: +{added} -{removed} → {patient.summary()}")
+    
+    def _lookup_patient_symptoms(self, state: GraphState) -> bool:
+        """Hồ sơ đã có triệu chứng → has_symptoms là lookup, không hỏi LLM"""
+        patient = state.get("patient")
+        if patient is None or not patient.has_symptoms:
+            return False
+        state["has_symptoms"] = True
+        state["extracted_symptoms"] = list(patient.symptoms)
+        if not state.get("specialty"):
+            state["specialty"] = patient.specialty or self._guess_specialty(self._user_text(state))
+        return True
+    
+    # ==================== SPECULATIVE RETRIEVAL ====================
+    
+    def _prefetch_plan(self, state: GraphState) -> List[tuple]:
+        """
+        Các search (nhánh, method, query, k, filter) đoán trước từ tin nhắn thô,
+        giống hệt search mà node context tương ứng sẽ gọi.
+        Nhánh bác sĩ không cần prefetch: tra department index local.
+        """
+        user_message = state["user_message"]
+        user_text = self._user_text(state)
+        plan = [("medical", "similarity_search", user_message, 3, None)]
+        
+        patient = state.get("patient")
+        symptoms = patient.symptoms if patient and patient.has_symptoms else self.entity_matcher.symptoms(user_text)
+        if symptoms:
+            for _, query in self.medicine_agent.build_search_queries(", ".join(symptoms)):
+                plan.append(("medicine", "similarity_search_with_filter_and_scores", query, 5,
+                             {"filename": "medicines.json"}))
+        return plan
+    
+    def _new_retrieval(self) -> Optional[SpeculativeRetrieval]:
+        if not self.speculative_retrieval or not self.vector_service.vector_store:
+            return None
+        return SpeculativeRetrieval(self.vector_service, self._prefetch_executor)
+    
+    def _start_retrieval(self, state: GraphState):
+        """Bắt đầu các search trong thread pool (graph.invoke)"""
+        retrieval = self._new_retrieval()
+        if retrieval:
+            for branch, method, query, k, filter_dict in self._prefetch_plan(state):
+                retrieval.prefetch(branch, method, query, k, filter_dict)
+        state["retrieval"] = retrieval
+    
+    def _astart_retrieval(self, state: GraphState):
+        """Bắt đầu các search dưới dạng asyncio task (graph.ainvoke)"""
+        retrieval = self._new_retrieval()
+        if retrieval:
+            for branch, method, query, k, filter_dict in self._prefetch_plan(state):
+                retrieval.aprefetch(branch, method, query, k, filter_dict)
+        state["retrieval"] = retrieval
+    
+    def _claim_retrieval(self, state: GraphState, branch: Optional[str]) -> Optional[SpeculativeRetrieval]:
+        """Giữ search của nhánh đã chọn, hủy các nhánh còn lại"""
+        retrieval = state.get("retrieval")
+        if retrieval:
+            retrieval.discard(keep=branch)
+        return retrieval
+    
     # ==================== NODES ====================
     
-    def classify_intent_node(self, state: GraphState) -> GraphState:
-        """Node: Phân loại intent bằng LLM (không dùng keyword)"""
+    def _build_analysis_prompt(self, user_message: str, user_only_context: str,
+                               patient: Optional[PatientState] = None) -> str:
+        """Prompt phân tích gộp: intent + triệu chứng + chuyên khoa (trả về JSON)"""
+        if patient is not None:
+            # Hồ sơ đã tóm tắt các lượt trước → prompt không dài thêm theo lịch sử
+            history_line = f"Hồ sơ triệu chứng đã ghi nhận: {patient.summary()}"
+        else:
+            history_line = f'Các tin nhắn trước của người dùng: "{user_only_context or "(không có)"}"'
+        return f"""Phân tích tin nhắn của người dùng trong hệ thống tư vấn y tế. Trả về DUY NHẤT một JSON object.
+
+Tin nhắn hiện tại: "{user_message}"
+{history_line}
+
+JSON gồm các trường:
+- "intent": một trong "medical_consultation" (mô tả triệu chứng, hỏi nguyên nhân/bệnh), "doctor_recommendation" (hỏi bác sĩ, chuyên khoa, nơi khám), "medicine_inquiry" (hỏi thuốc, liều dùng), "general_chat" (chào hỏi, cảm ơn, hỏi về AI). Xác định theo TIN NHẮN HIỆN TẠI.
+- "has_symptoms": true nếu người dùng ĐÃ MÔ TẢ triệu chứng họ ĐANG gặp (VD: "tôi bị đau đầu"); false nếu chỉ HỎI (VD: "tôi nên uống thuốc gì?", "đau đầu là bệnh gì?").
+- "extracted_symptoms": danh sách triệu chứng người dùng ĐÃ NÓI trong các tin nhắn trên, giữ nguyên cách viết của người dùng, KHÔNG thêm triệu chứng khác. [] nếu không có.
+- "specialty": chuyên khoa phù hợp nhất (Tim mạch, Tiêu hóa, Nội tiết, Tai-Mũi-Họng, Mắt, Da liễu, Nội khoa) hoặc "" nếu chưa có triệu chứng.
+
+JSON:"""
+    
+    def _parse_analysis(self, text: str, user_message: str, user_only_context: str) -> Optional[Dict[str, Any]]:
+        """Parse + validate JSON phân tích. Trả về None nếu không hợp lệ"""
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.strip("`").removeprefix("json").strip()
+        
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, ValueError):
+            return None
+        
+        valid_intents = {intent.value for intent in IntentType}
+        if not isinstance(data, dict) or data.get("intent") not in valid_intents:
+            return None
+        
+        # Chỉ giữ triệu chứng thực sự có trong tin nhắn người dùng và không bị phủ định ở tin nhắn mới nhất
+        user_text = f"{user_only_context} {user_message}".lower()
+        negated = set().union(*(symptom_keys(s) for s in self.entity_matcher.negated_symptoms(user_message)))
+        symptoms = data.get("extracted_symptoms") or []
+        if isinstance(symptoms, str):
+            symptoms = [s.strip() for s in symptoms.split(',')]
+        
+        validated_symptoms = []
+        for symptom in symptoms:
+            symptom = str(symptom).strip()
+            if len(symptom) < 2:
+                continue
+            if symptom_keys(symptom) & negated:
+                print(f"⚠️ Loại bỏ triệu chứng người dùng phủ định: '{symptom}'")
+                continue
+            if symptom.lower() in user_text:
+                validated_symptoms.append(symptom)
+            else:
+                print(f"⚠️ Loại bỏ triệu chứng không có trong lịch sử: '{symptom}'")
+        
+        specialty = data.get("specialty") or ""
+        return {
+            "intent": data["intent"],
+            "has_symptoms": bool(data.get("has_symptoms")) and bool(validated_symptoms),
+            "extracted_symptoms": validated_symptoms,
+            "specialty": specialty.strip() if isinstance(specialty, str) else ""
+        }
+    
+    def _apply_analysis(self, state: GraphState, analysis: Optional[Dict[str, Any]]) -> GraphState:
+        if analysis is None:
+            print("⚠️ Structured analysis không hợp lệ, fallback sang classify_intent + check_symptoms")
+            state["analyzed"] = False
+            return state
+        
+        state["analyzed"] = True
+        state["intent"] = analysis["intent"]
+        state["has_symptoms"] = analysis["has_symptoms"]
+        state["extracted_symptoms"] = analysis["extracted_symptoms"]
+        state["specialty"] = analysis["specialty"] or None
+        
+        patient = state.get("patient")
+        if patient is not None:
+            if analysis["has_symptoms"]:
+                patient.add_symptoms(analysis["extracted_symptoms"])
+                patient.update_details(state["user_message"])
+            self._lookup_patient_symptoms(state)
+        print(f"🎯 Intent: {analysis['intent']} | Has symptoms: {analysis['has_symptoms']} | "
+              f"Symptoms: {analysis['extracted_symptoms']} | Specialty: {analysis['specialty']} (1 LLM call)")
+        return state
+    
+    def _log_local_intent(self, intent: Optional[str], score: float) -> Optional[str]:
+        if intent:
+            print(f"⚡ Intent: {intent} (local classifier, score={score:.3f})")
+        else:
+            print(f"🤔 Local classifier không chắc chắn (score={score:.3f}), hỏi LLM")
+        return intent
+    
+    def _apply_local_intent(self, state: GraphState, local_intent: Optional[str]) -> bool:
+        """Intent không cần triệu chứng → quyết định luôn, không gọi LLM"""
+        if local_intent in (IntentType.GENERAL_CHAT.value, IntentType.MEDICAL_CONSULTATION.value):
+            state["analyzed"] = True
+            state["intent"] = local_intent
+            return True
+        return self._apply_entities(state, local_intent)
+    
+    def _guess_specialty(self, user_text: str) -> Optional[str]:
+        """Khoa người dùng nhắc tới, nếu không thì chuyên khoa đầu tiên map từ triệu chứng"""
+        departments = self.entity_matcher.departments(user_text)
+        if departments:
+            return departments[0]
+        specialties = self.entity_matcher.specialties(user_text)
+        return specialties[0] if specialties else None
+    
+    def _apply_entities(self, state: GraphState, local_intent: Optional[str]) -> bool:
+        """
+        Intent cần triệu chứng + người dùng mô tả triệu chứng có trong dữ liệu
+        ("tôi bị đau bụng") → lấy triệu chứng/chuyên khoa từ entity matcher, không gọi LLM
+        """
+        if local_intent not in (IntentType.DOCTOR_RECOMMENDATION.value, IntentType.MEDICINE_INQUIRY.value):
+            return False
+        
+        # "tôi không bị sốt, nên uống thuốc gì" → để LLM phân tích, không quyết định local
+        if self.entity_matcher.has_negation(state["user_message"]):
+            print("🤔 Tin nhắn có phủ định, hỏi LLM")
+            return False
+        
+        if self._lookup_patient_symptoms(state):
+            state["analyzed"] = True
+            state["intent"] = local_intent
+            print(f"⚡ Symptoms: {state['extracted_symptoms']} | Specialty: {state['specialty']} (hồ sơ phiên, 0 LLM call)")
+            return True
+        
+        user_text = self._user_text(state)
+        if not self.entity_matcher.describes_symptoms(user_text):
+            return False
+        
+        symptoms = self.entity_matcher.symptoms(user_text)
+        
+        state["analyzed"] = True
+        state["intent"] = local_intent
+        state["has_symptoms"] = True
+        state["extracted_symptoms"] = symptoms
+        state["specialty"] = self._guess_specialty(user_text)
+        print(f"⚡ Symptoms: {symptoms} | Specialty: {state['specialty']} (entity matcher, 0 LLM call)")
+        return True
+    
+    def analyze_message_node(self, state: GraphState) -> GraphState:
+        """Node: Local classifier → (nếu cần) một LLM call (JSON) cho intent + triệu chứng + chuyên khoa"""
         user_message = state["user_message"]
+        patient = state.get("patient")
+        # Có hồ sơ → chỉ phân tích tin nhắn mới nhất
+        user_only_context = "" if patient is not None else state.get("user_only_context", "")
+        self._update_patient(state)
         
-        # Sử dụng LLM để phân loại với prompt chi tiết
-        prompt = f"""Phân tích câu hỏi của người dùng và xác định intent (mục đích).
+        local_intent = None
+        if self.intent_classifier:
+            try:
+                local_intent = self._log_local_intent(*self.intent_classifier.predict(user_message))
+            except Exception as e:
+                print(f"⚠️ Local classifier error: {str(e)}")
+        
+        if self._apply_local_intent(state, local_intent):
+            return state
+        
+        # Chỉ search đoán trước khi sắp gọi LLM phân tích (chào hỏi / câu đã quyết định local: không search)
+        self._start_retrieval(state)
+        try:
+            with semantic_key(user_message):
+                response = self.analysis_llm.invoke(self._build_analysis_prompt(user_message, user_only_context, patient))
+            analysis = self._parse_analysis(response.content, user_message, user_only_context)
+        except Exception as e:
+            print(f"⚠️ LLM analysis error: {str(e)}")
+            analysis = None
+        
+        if analysis and local_intent:
+            analysis["intent"] = local_intent
+        return self._apply_analysis(state, analysis)
+    
+    async def aanalyze_message_node(self, state: GraphState) -> GraphState:
+        """Async node: Local classifier → (nếu cần) một LLM call (JSON)"""
+        user_message = state["user_message"]
+        patient = state.get("patient")
+        # Có hồ sơ → chỉ phân tích tin nhắn mới nhất
+        user_only_context = "" if patient is not None else state.get("user_only_context", "")
+        self._update_patient(state)
+        
+        local_intent = None
+        if self.intent_classifier:
+            try:
+                local_intent = self._log_local_intent(*await self.intent_classifier.apredict(user_message))
+            except Exception as e:
+                print(f"⚠️ Local classifier error: {str(e)}")
+        
+        if self._apply_local_intent(state, local_intent):
+            return state
+        
+        # Chỉ search đoán trước khi sắp gọi LLM phân tích (chào hỏi / câu đã quyết định local: không search)
+        self._astart_retrieval(state)
+        try:
+            with semantic_key(user_message):
+                response = await self.analysis_llm.ainvoke(self._build_analysis_prompt(user_message, user_only_context, patient))
+            analysis = self._parse_analysis(response.content, user_message, user_only_context)
+        except Exception as e:
+            print(f"⚠️ LLM analysis error: {str(e)}")
+            analysis = None
+        
+        if analysis and local_intent:
+            analysis["intent"] = local_intent
+        return self._apply_analysis(state, analysis)
+    
+    def _build_intent_prompt(self, user_message: str) -> str:
+        """Prompt phân loại intent"""
+        return f"""Phân tích câu hỏi của người dùng và xác định intent (mục đích).
 
 Câu hỏi: "{user_message}"
 
@@ -113,21 +483,31 @@ Câu hỏi: "{user_message}"
 **Hãy phân tích và CHỈ trả lời TÊN intent (một trong 4 loại trên):**
 
 Intent:"""
+    
+    def _parse_intent(self, intent_text: str) -> str:
+        """Parse response phân loại intent"""
+        intent_text = intent_text.strip().upper()
+        
+        if "MEDICINE_INQUIRY" in intent_text or "MEDICINE" in intent_text:
+            return IntentType.MEDICINE_INQUIRY.value
+        elif "DOCTOR_RECOMMENDATION" in intent_text or "DOCTOR" in intent_text:
+            return IntentType.DOCTOR_RECOMMENDATION.value
+        elif "MEDICAL_CONSULTATION" in intent_text or "MEDICAL" in intent_text:
+            return IntentType.MEDICAL_CONSULTATION.value
+        return IntentType.GENERAL_CHAT.value
+    
+    def classify_intent_node(self, state: GraphState) -> GraphState:
+        """Node: Phân loại intent bằng LLM (không dùng keyword)"""
+        user_message = state["user_message"]
+        
+        # Sử dụng LLM để phân loại với prompt chi tiết
+        prompt = self._build_intent_prompt(user_message)
         
         try:
-            response = self.llm.invoke(prompt)
-            intent_text = response.content.strip().upper()
-            
-            # Parse response
-            if "MEDICINE_INQUIRY" in intent_text or "MEDICINE" in intent_text:
-                intent = IntentType.MEDICINE_INQUIRY.value
-            elif "DOCTOR_RECOMMENDATION" in intent_text or "DOCTOR" in intent_text:
-                intent = IntentType.DOCTOR_RECOMMENDATION.value
-            elif "MEDICAL_CONSULTATION" in intent_text or "MEDICAL" in intent_text:
-                intent = IntentType.MEDICAL_CONSULTATION.value
-            else:
-                intent = IntentType.GENERAL_CHAT.value
-            
+            # Cache: tin nhắn lặp lại (VD: "xin chào") không tốn LLM call
+            with semantic_key(user_message):
+                response = self.llm.invoke(prompt)
+            intent = self._parse_intent(response.content)
             print(f"🎯 Intent: {intent} (LLM classified)")
         except Exception as e:
             print(f"⚠️ LLM classification error: {str(e)}")
@@ -136,15 +516,37 @@ Intent:"""
         state["intent"] = intent
         return state
     
-    def check_symptoms_node(self, state: GraphState) -> GraphState:
-        """Node: Kiểm tra triệu chứng bằng LLM"""
-        check_context = state.get("user_only_context", "") or state.get("conversation_context", "")
+    async def aclassify_intent_node(self, state: GraphState) -> GraphState:
+        """Async node: Phân loại intent bằng LLM"""
+        user_message = state["user_message"]
+        prompt = self._build_intent_prompt(user_message)
         
-        if not check_context or len(check_context.strip()) < 5:
-            state["has_symptoms"] = False
-            return state
+        try:
+            with semantic_key(user_message):
+                response = await self.llm.ainvoke(prompt)
+            intent = self._parse_intent(response.content)
+            print(f"🎯 Intent: {intent} (LLM classified)")
+        except Exception as e:
+            print(f"⚠️ LLM classification error: {str(e)}")
+            intent = IntentType.GENERAL_CHAT.value
         
-        prompt = f"""Phân tích: Người dùng đã MÔ TẢ triệu chứng bệnh lý hay chưa?
+        state["intent"] = intent
+        return state
+    
+    def _get_check_context(self, state: GraphState) -> Optional[str]:
+        """Context dùng để kiểm tra triệu chứng (None nếu quá ngắn)"""
+        if state.get("patient") is not None:
+            check_context = state["user_message"]
+        else:
+            check_context = state.get("user_only_context", "") or state.get("conversation_context", "")
+        
+        if not check_context or len(check_context.strip()) < 5:
+            return None
+        return check_context
+    
+    def _build_symptoms_prompt(self, check_context: str) -> str:
+        """Prompt kiểm tra người dùng đã mô tả triệu chứng chưa"""
+        return f"""Phân tích: Người dùng đã MÔ TẢ triệu chứng bệnh lý hay chưa?
 
 Lịch sử tin nhắn: "{check_context}"
 
@@ -171,20 +573,67 @@ QUAN TRỌNG:
 CHỈ trả lời: "CÓ" hoặc "KHÔNG"
 
 Trả lời:"""
+    
+    def _parse_has_symptoms(self, answer: str) -> bool:
+        answer = answer.strip().upper()
+        has_symptoms = "CÓ" in answer or "CO" in answer
+        print(f"🤖 LLM判断: '{answer}' → Has symptoms: {has_symptoms}")
+        return has_symptoms
+    
+    def check_symptoms_node(self, state: GraphState) -> GraphState:
+        """Node: Kiểm tra triệu chứng bằng LLM"""
+        if self._lookup_patient_symptoms(state):
+            return state
+        
+        check_context = self._get_check_context(state)
+        
+        if not check_context:
+            state["has_symptoms"] = False
+            return state
         
         try:
-            response = self.llm.invoke(prompt)
-            answer = response.content.strip().upper()
-            has_symptoms = "CÓ" in answer or "CO" in answer
-            
-            print(f"🤖 LLM判断: '{answer}' → Has symptoms: {has_symptoms}")
-            state["has_symptoms"] = has_symptoms
+            with semantic_key(check_context):
+                response = self.llm.invoke(self._build_symptoms_prompt(check_context))
+            state["has_symptoms"] = self._parse_has_symptoms(response.content)
+        except Exception as e:
+            print(f"⚠️ LLM error: {str(e)}")
+            state["has_symptoms"] = False
+        
+        return state
+    
+    async def acheck_symptoms_node(self, state: GraphState) -> GraphState:
+        """Async node: Kiểm tra triệu chứng bằng LLM"""
+        if self._lookup_patient_symptoms(state):
+            return state
+        
+        check_context = self._get_check_context(state)
+        
+        if not check_context:
+            state["has_symptoms"] = False
+            return state
+        
+        try:
+            with semantic_key(check_context):
+                response = await self.llm.ainvoke(self._build_symptoms_prompt(check_context))
+            state["has_symptoms"] = self._parse_has_symptoms(response.content)
         except Exception as e:
             print(f"⚠️ LLM error: {str(e)}")
             state["has_symptoms"] = False
         
         return state
     
+    def _format_medical_context(self, docs) -> Optional[str]:
+        if not docs:
+            return None
+        
+        context_parts = []
+        for i, doc in enumerate(docs, 1):
+            name = doc.metadata.get('symptom_name', doc.metadata.get('item_name', f'Doc {i}'))
+            context_parts.append(f"{'='*60}\n{name.upper()}\n{'='*60}\n{doc.page_content}")
+        
+        context = "\n\n".join(context_parts)
+        return f"THÔNG TIN Y TẾ:\n\n{context}\n\n{'='*60}\n"
+    
     def get_medical_context_node(self, state: GraphState) -> GraphState:
         """Node: Lấy context y tế"""
         if not self.vector_service or not self.vector_service.vector_store:
@@ -192,18 +641,25 @@ Trả lời:"""
             return state
         
         try:
-            docs = self.vector_service.similarity_search(state["user_message"], k=3)
-            
-            if docs:
-                context_parts = []
-                for i, doc in enumerate(docs, 1):
-                    name = doc.metadata.get('symptom_name', doc.metadata.get('item_name', f'Doc {i}'))
-                    context_parts.append(f"{'='*60}\n{name.upper()}\n{'='*60}\n{doc.page_content}")
-                
-                context = "\n\n".join(context_parts)
-                state["medical_context"] = f"THÔNG TIN Y TẾ:\n\n{context}\n\n{'='*60}\n"
-            else:
-                state["medical_context"] = None
+            searcher = self._claim_retrieval(state, "medical") or self.vector_service
+            docs = searcher.similarity_search(state["user_message"], k=3)
+            state["medical_context"] = self._format_medical_context(docs)
+        except Exception as e:
+            print(f"⚠️ Error: {str(e)}")
+            state["medical_context"] = None
+        
+        return state
+    
+    async def aget_medical_context_node(self, state: GraphState) -> GraphState:
+        """Async node: Lấy context y tế"""
+        if not self.vector_service or not self.vector_service.vector_store:
+            state["medical_context"] = None
+            return state
+        
+        try:
+            searcher = self._claim_retrieval(state, "medical") or self.vector_service
+            docs = await searcher.asimilarity_search(state["user_message"], k=3)
+            state["medical_context"] = self._format_medical_context(docs)
         except Exception as e:
             print(f"⚠️ Error: {str(e)}")
             state["medical_context"] = None
@@ -217,121 +673,149 @@ Trả lời:"""
         text = ''.join([c for c in text if not unicodedata.combining(c)])
         return text.lower().strip()
     
-    def get_doctor_recommendations_logic(self, user_message: str, conversation_context: str = "") -> Optional[str]:
-        """Logic tìm bác sĩ (di chuyển từ router.py)"""
-        if not self.vector_service or not self.vector_service.vector_store:
+    def _build_doctor_extract_prompt(self, conversation_context: str) -> str:
+        return f"""Từ lịch sử, liệt kê triệu chứng:
+{conversation_context}
+
+Triệu chứng:"""
+    
+    def _map_symptoms_to_specialties(self, symptoms_text: str) -> List[str]:
+        """Map triệu chứng → chuyên khoa (entity matcher, không phân biệt dấu)"""
+        return self.entity_matcher.specialties(symptoms_text)
+    
+    def _build_specialty_prompt(self, symptoms_text: str) -> str:
+        return f"""Triệu chứng: {symptoms_text}
+Chọn khoa: Tim mạch, Tiêu hóa, Nội tiết, Tai-Mũi-Họng, Mắt, Da liễu
+Chỉ trả về TÊN KHOA:"""
+    
+    def _build_specialty_queries(self, possible_specialties: List[str]) -> List[str]:
+        queries = []
+        for specialty in possible_specialties:
+            queries.extend([
+                specialty,
+                f"khoa {specialty}",
+                f"bác sĩ {specialty}",
+                self.normalize_text(specialty)
+            ])
+        return queries
+    
+    def _rank_doctor_results(self, all_results_with_scores, possible_specialties: List[str]) -> Optional[str]:
+        """Lọc, rank theo khoa và format context bác sĩ"""
+        batch = CandidateBatch.from_results(
+            [("", all_results_with_scores)],
+            lambda doc: doc.metadata.get('department_name')
+            if doc.metadata.get('filename') == 'medical_personnel.json' else None
+        )
+        # Bonus từ text matching: mỗi chuyên khoa có trong tên khoa +0.2, trong tên chuyên khoa +0.1
+        totals = (batch.scores
+                  + batch.doc_bonus(possible_specialties, lambda doc: doc.metadata.get('department_name', ''), 0.2)
+                  + batch.doc_bonus(possible_specialties, lambda doc: doc.metadata.get('specialty_name', ''), 0.1))
+        doctor_docs = [doc for doc, _ in batch.top(totals, 3)]
+        
+        if doctor_docs:
+            context_parts = []
+            for doc in doctor_docs:
+                specialty_name = doc.metadata.get('specialty_name', 'N/A')
+                dept_name = doc.metadata.get('department_name', 'N/A')
+                context_parts.append(f"{'='*60}\n{dept_name.upper()} - {specialty_name}\n{'='*60}\n{doc.page_content}")
+            
+            context = "\n\n".join(context_parts)
+            return f"THÔNG TIN BÁC SĨ:\n\n{context}\n\n{'='*60}\n"
+        
+        return None
+    
+    def _lookup_departments(self, possible_specialties: List[str]) -> Optional[str]:
+        """Tra department index cho các chuyên khoa (giữ thứ tự, bỏ trùng) và format context bác sĩ"""
+        lookups = [self.department_index.lookup(specialty) for specialty in possible_specialties]
+        # Chuyên khoa khớp đúng một khoa ("Tim mạch") xếp trước nhóm chung ("Nội khoa")
+        lookups.sort(key=len)
+
+        departments = {}
+        for matches in lookups:
+            for department, score in matches:
+                departments.setdefault(department['department_name'], department)
+        
+        if not departments:
             return None
         
+        context_parts = []
+        for department in list(departments.values())[:3]:
+            context_parts.append(f"{'='*60}\n{department['department_name'].upper()} - {department['specialty'] or 'N/A'}\n{'='*60}\n{department['content']}")
+        
+        context = "\n\n".join(context_parts)
+        return f"THÔNG TIN BÁC SĨ:\n\n{context}\n\n{'='*60}\n"
+    
+    def get_doctor_recommendations_logic(self, user_message: str, conversation_context: str = "",
+                                         symptoms: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Logic tìm bác sĩ (di chuyển từ router.py)
+        
+        Args:
+            symptoms: Triệu chứng đã trích xuất sẵn (bỏ qua bước hỏi LLM)
+        """
         try:
             # Trích xuất triệu chứng
-            symptoms_text = ""
-            if conversation_context:
-                extract_prompt = f"""Từ lịch sử, liệt kê triệu chứng:
-{conversation_context}
-
-Triệu chứng:"""
-                response = self.llm.invoke(extract_prompt)
+            symptoms_text = ", ".join(symptoms) if symptoms else ""
+            if not symptoms_text and conversation_context:
+                response = self.llm.invoke(self._build_doctor_extract_prompt(conversation_context))
                 symptoms_text = response.content.strip()
             
-            # Map triệu chứng → chuyên khoa
-            symptom_to_specialty = {
-                'đau đầu': ['Nội khoa', 'Tim mạch', 'Nội tiết'],
-                'đau bụng': ['Tiêu hóa', 'Nội khoa'],
-                'ợ nóng': ['Tiêu hóa'],
-                'tiêu chảy': ['Tiêu hóa'],
-                'táo bón': ['Tiêu hóa'],
-                'đau ngực': ['Tim mạch', 'Nội khoa'],
-                'khó thở': ['Tim mạch', 'Hồi sức tích cực'],
-                'ho': ['Tai-Mũi-Họng'],
-                'sổ mũi': ['Tai-Mũi-Họng'],
-                'đau họng': ['Tai-Mũi-Họng'],
-                'mờ mắt': ['Mắt'],
-                'ngứa': ['Da liễu'],
-                'phát ban': ['Da liễu'],
-            }
-            
-            possible_specialties = []
-            symptoms_lower = symptoms_text.lower()
-            for symptom, specialties in symptom_to_specialty.items():
-                if symptom in symptoms_lower:
-                    possible_specialties.extend(specialties)
-            
-            possible_specialties = list(set(possible_specialties))
+            possible_specialties = self._map_symptoms_to_specialties(symptoms_text)
             
             if not possible_specialties:
-                specialty_prompt = f"""Triệu chứng: {symptoms_text}
-Chọn khoa: Tim mạch, Tiêu hóa, Nội tiết, Tai-Mũi-Họng, Mắt, Da liễu
-Chỉ trả về TÊN KHOA:"""
-                response = self.llm.invoke(specialty_prompt)
+                response = self.llm.invoke(self._build_specialty_prompt(symptoms_text))
                 possible_specialties = [response.content.strip()]
             
+            # ⚡ Tra department index trước, vector search chỉ khi không khớp khoa nào
+            doctor_context = self._lookup_departments(possible_specialties)
+            if doctor_context or not self.vector_service or not self.vector_service.vector_store:
+                return doctor_context
+            
             # Search với cosine similarity
             all_results_with_scores = []
-            for specialty in possible_specialties:
-                queries = [
-                    specialty,
-                    f"khoa {specialty}",
-                    f"bác sĩ {specialty}",
-                    self.normalize_text(specialty)
-                ]
-                
-                for query in queries:
-                    results = self.vector_service.similarity_search_with_scores(query, k=3)
-                    all_results_with_scores.extend(results)
+            for query in self._build_specialty_queries(possible_specialties):
+                results = self.vector_service.similarity_search_with_scores(query, k=3)
+                all_results_with_scores.extend(results)
             
-            # Lọc và rank
-            dept_scores = {}
-            for doc, cosine_score in all_results_with_scores:
-                if doc.metadata.get('filename') == 'medical_personnel.json':
-                    dept_name = doc.metadata.get('department_name')
-                    if dept_name:
-                        total_score = cosine_score
-                        
-                        # Bonus từ text matching
-                        dept_lower = dept_name.lower()
-                        specialty_lower = doc.metadata.get('specialty_name', '').lower()
-                        
-                        for spec in possible_specialties:
-                            if spec.lower() in dept_lower:
-                                total_score += 0.2
-                            if spec.lower() in specialty_lower:
-                                total_score += 0.1
-                        
-                        if dept_name not in dept_scores or dept_scores[dept_name]['score'] < total_score:
-                            dept_scores[dept_name] = {
-                                'doc': doc,
-                                'score': total_score,
-                                'cosine_score': cosine_score
-                            }
+            return self._rank_doctor_results(all_results_with_scores, possible_specialties)
             
-            # Sort và format
-            sorted_depts = sorted(dept_scores.items(), key=lambda x: x[1]['score'], reverse=True)
-            doctor_docs = [item[1]['doc'] for item in sorted_depts[:3]]
+        except Exception as e:
+            print(f"⚠️ Lỗi: {str(e)}")
+            return None
+    
+    async def aget_doctor_recommendations_logic(self, user_message: str, conversation_context: str = "",
+                                                symptoms: Optional[List[str]] = None) -> Optional[str]:
+        """Async version - các vector search chạy đồng thời"""
+        try:
+            symptoms_text = ", ".join(symptoms) if symptoms else ""
+            if not symptoms_text and conversation_context:
+                response = await self.llm.ainvoke(self._build_doctor_extract_prompt(conversation_context))
+                symptoms_text = response.content.strip()
             
-            if doctor_docs:
-                context_parts = []
-                for doc in doctor_docs:
-                    specialty_name = doc.metadata.get('specialty_name', 'N/A')
-                    dept_name = doc.metadata.get('department_name', 'N/A')
-                    context_parts.append(f"{'='*60}\n{dept_name.upper()} - {specialty_name}\n{'='*60}\n{doc.page_content}")
-                
-                context = "\n\n".join(context_parts)
-                return f"THÔNG TIN BÁC SĨ:\n\n{context}\n\n{'='*60}\n"
+            possible_specialties = self._map_symptoms_to_specialties(symptoms_text)
             
-            return None
+            if not possible_specialties:
+                response = await self.llm.ainvoke(self._build_specialty_prompt(symptoms_text))
+                possible_specialties = [response.content.strip()]
+            
+            doctor_context = self._lookup_departments(possible_specialties)
+            if doctor_context or not self.vector_service or not self.vector_service.vector_store:
+                return doctor_context
+            
+            all_results = await asyncio.gather(*[
+                self.vector_service.asimilarity_search_with_scores(query, k=3)
+                for query in self._build_specialty_queries(possible_specialties)
+            ])
+            all_results_with_scores = [item for results in all_results for item in results]
+            
+            return self._rank_doctor_results(all_results_with_scores, possible_specialties)
             
         except Exception as e:
             print(f"⚠️ Lỗi: {str(e)}")
             return None
     
-    def get_doctor_context_node(self, state: GraphState) -> GraphState:
-        """Node: Lấy context bác sĩ - Hybrid approach"""
-        
-        # ✅ OPTION 1: Try using tool first (fast & accurate)
-        if self.tools and state.get("user_message"):
-            try:
-                # Extract specialty from conversation
-                extract_prompt = f"""Từ câu hỏi, xác định chuyên khoa:
+    def _build_doctor_specialty_prompt(self, state: GraphState) -> str:
+        return f"""Từ câu hỏi, xác định chuyên khoa:
 {state['user_message']}
 
 Lịch sử: {state['conversation_context']}
@@ -340,19 +824,40 @@ Chỉ trả về TÊN CHUYÊN KHOA (Tim mạch, Tiêu hóa, Tai-Mũi-Họng, Da
 Nếu không rõ, trả về "Nội khoa"
 
 Chuyên khoa:"""
-                
-                response = self.llm.invoke(extract_prompt)
-                specialty = response.content.strip()
+    
+    def _resolve_patient_specialty(self, state: GraphState, specialty: str):
+        patient = state.get("patient")
+        if patient is not None:
+            patient.specialty = specialty
+    
+    def _wrap_doctor_tool_result(self, tool_result: str) -> Optional[str]:
+        if tool_result and "Không tìm thấy" not in tool_result:
+            print(f"✅ Tool returned doctor context")
+            return f"THÔNG TIN BÁC SĨ:\n\n{tool_result}\n\n{'='*60}\n"
+        return None
+    
+    def get_doctor_context_node(self, state: GraphState) -> GraphState:
+        """Node: Lấy context bác sĩ - Hybrid approach"""
+        retrieval = self._claim_retrieval(state, "doctor")
+        
+        # ✅ OPTION 1: Try using tool first (fast & accurate)
+        if self.tools and state.get("user_message"):
+            try:
+                # Chuyên khoa đã có từ bước phân tích gộp → không hỏi lại LLM
+                specialty = state.get("specialty")
+                if not specialty:
+                    response = self.llm.invoke(self._build_doctor_specialty_prompt(state))
+                    specialty = response.content.strip()
                 
                 print(f"🔧 Using tool: search_doctors_by_specialty('{specialty}')")
                 
                 # Use tool
-                tool_result = self.medical_tools.search_doctors_by_specialty(specialty)
-                
-                if tool_result and "Không tìm thấy" not in tool_result:
-                    doctor_context = f"THÔNG TIN BÁC SĨ:\n\n{tool_result}\n\n{'='*60}\n"
+                doctor_context = self._wrap_doctor_tool_result(
+                    self.medical_tools.search_doctors_by_specialty(specialty, retrieval=retrieval)
+                )
+                if doctor_context:
                     state["doctor_context"] = doctor_context
-                    print(f"✅ Tool returned doctor context")
+                    self._resolve_patient_specialty(state, specialty)
                     return state
                     
             except Exception as e:
@@ -362,43 +867,106 @@ Chuyên khoa:"""
         print(f"🔄 Fallback to original vector search")
         doctor_context = self.get_doctor_recommendations_logic(
             state["user_message"],
-            state["conversation_context"]
+            self._extraction_context(state),
+            symptoms=state.get("extracted_symptoms")
         )
         
         state["doctor_context"] = doctor_context
         return state
     
-    def get_medicine_context_node(self, state: GraphState) -> GraphState:
-        """Node: Lấy context thuốc"""
-        medicine_context = self.medicine_agent.search_medicine_by_symptoms(
+    async def aget_doctor_context_node(self, state: GraphState) -> GraphState:
+        """Async node: Lấy context bác sĩ - Hybrid approach"""
+        retrieval = self._claim_retrieval(state, "doctor")
+        if self.tools and state.get("user_message"):
+            try:
+                specialty = state.get("specialty")
+                if not specialty:
+                    response = await self.llm.ainvoke(self._build_doctor_specialty_prompt(state))
+                    specialty = response.content.strip()
+                
+                print(f"🔧 Using tool: search_doctors_by_specialty('{specialty}')")
+                
+                doctor_context = self._wrap_doctor_tool_result(
+                    await self.medical_tools.asearch_doctors_by_specialty(specialty, retrieval=retrieval)
+                )
+                if doctor_context:
+                    state["doctor_context"] = doctor_context
+                    self._resolve_patient_specialty(state, specialty)
+                    return state
+                    
+            except Exception as e:
+                print(f"⚠️ Tool failed: {str(e)}, fallback to original method")
+        
+        print(f"🔄 Fallback to original vector search")
+        state["doctor_context"] = await self.aget_doctor_recommendations_logic(
             state["user_message"],
-            state["conversation_context"]
+            self._extraction_context(state),
+            symptoms=state.get("extracted_symptoms")
         )
-        
+        return state
+    
+    def _log_medicine_context(self, medicine_context: Optional[str]):
         # ✅ DEBUG
         if medicine_context:
             print(f"✅ Medicine context received: {len(medicine_context)} chars")
         else:
             print(f"❌ Medicine context is None or empty")
+    
+    def get_medicine_context_node(self, state: GraphState) -> GraphState:
+        """Node: Lấy context thuốc"""
+        medicine_context = self.medicine_agent.search_medicine_by_symptoms(
+            state["user_message"],
+            self._extraction_context(state),
+            extracted_symptoms=state.get("extracted_symptoms"),
+            retrieval=self._claim_retrieval(state, "medicine")
+        )
+        self._log_medicine_context(medicine_context)
         
         state["medicine_context"] = medicine_context
         return state
     
+    async def aget_medicine_context_node(self, state: GraphState) -> GraphState:
+        """Async node: Lấy context thuốc"""
+        medicine_context = await self.medicine_agent.asearch_medicine_by_symptoms(
+            state["user_message"],
+            self._extraction_context(state),
+            extracted_symptoms=state.get("extracted_symptoms"),
+            retrieval=self._claim_retrieval(state, "medicine")
+        )
+        self._log_medicine_context(medicine_context)
+        
+        state["medicine_context"] = medicine_context
+        return state
+    
+    def _patient_summary_line(self, state: GraphState) -> str:
+        patient = state.get("patient")
+        return f"Hồ sơ triệu chứng: {patient.summary()}\n" if patient is not None else ""
+    
+    def _set_system_prompt(self, state: GraphState, key: str):
+        """System prompt cố định của nhánh + khóa để dùng lại chain trả lời dựng sẵn"""
+        state["response_key"] = key
+        state["system_prompt"] = system_prompts.SYSTEM_PROMPTS[key]
+    
+    def _template_response(self, state: GraphState, template: str) -> Optional[str]:
+        """Câu trả lời soạn sẵn (None nếu tắt TEMPLATE_RESPONSES → LLM sinh như trước)"""
+        if not self.template_responses:
+            return None
+        return response_templates.render_response(template, state.get("extracted_symptoms"))
+    
     def build_response_node(self, state: GraphState) -> GraphState:
         """Node: Xây dựng response cuối cùng"""
         intent = state["intent"]
+        state["direct_response"] = None
+        
+        # Search đoán trước chưa dùng tới → hủy / bỏ kết quả
+        retrieval = self._claim_retrieval(state, None)
+        if retrieval and retrieval.hits:
+            print(f"⚡ Speculative retrieval: dùng lại {retrieval.hits} search đã chạy trước")
         
         if intent == "medical_consultation":
             if state.get("medical_context"):
                 state["use_context"] = True
-                state["system_prompt"] = """Bạn là trợ lý y tế AI chuyên nghiệp. 
-Nhiệm vụ:
-1. GHI NHỚ tất cả triệu chứng
-2. Phân tích triệu chứng
-3. Chẩn đoán khả năng bệnh lý
-4. Đưa ra lời khuyên
-
-LƯU Ý: Đây chỉ là thông tin tham khảo."""
+                self._set_system_prompt(state, system_prompts.MEDICAL_CONSULTATION_CONTEXT)
                 state["prompt"] = f"""{state['medical_context']}
 
 Câu hỏi: {state['user_message']}
@@ -406,13 +974,13 @@ Câu hỏi: {state['user_message']}
 Phân tích và tư vấn:"""
             else:
                 state["use_context"] = False
-                state["system_prompt"] = "Bạn là trợ lý y tế AI."
+                self._set_system_prompt(state, system_prompts.MEDICAL_CONSULTATION_NO_CONTEXT)
                 state["prompt"] = f"{state['user_message']}\n\nKHUYẾN NGHỊ gặp bác sĩ."
         
         elif intent == "doctor_recommendation":
             if not state.get("has_symptoms"):
                 state["use_context"] = False
-                state["system_prompt"] = "Bạn là trợ lý y tế AI. KHÔNG tự bịa triệu chứng."
+                self._set_system_prompt(state, system_prompts.DOCTOR_NO_SYMPTOMS)
                 state["prompt"] = f"""Người dùng hỏi: {state['user_message']}
 
 QUAN TRỌNG: Người dùng CHƯA cung cấp triệu chứng cụ thể.
@@ -426,15 +994,12 @@ Vui lòng cho tôi biết:
 - Mức độ nghiêm trọng như thế nào?"
 
 KHÔNG tự bịa triệu chứng."""
+                state["direct_response"] = self._template_response(state, response_templates.NO_SYMPTOMS_DOCTOR)
             elif state.get("doctor_context"):
                 state["use_context"] = True
-                state["system_prompt"] = """Bạn là trợ lý tư vấn bác sĩ.
-QUY TẮC:
-- CHỈ dùng triệu chứng từ lịch sử
-- KHÔNG tự bịa
-- PHẢI đúng chuyên khoa"""
+                self._set_system_prompt(state, system_prompts.DOCTOR_CONTEXT)
                 state["prompt"] = f"""Lịch sử: {state['conversation_context']}
-
+{self._patient_summary_line(state)}
 {state['doctor_context']}
 
 Câu hỏi: {state['user_message']}
@@ -446,17 +1011,18 @@ Format:
 1. [Họ tên] - [Học vị] - [Chức vụ] - [Khoa]"""
             else:
                 state["use_context"] = False
-                state["system_prompt"] = "Bạn là trợ lý y tế."
+                self._set_system_prompt(state, system_prompts.DOCTOR_NOT_FOUND)
                 state["prompt"] = f"""Không tìm thấy bác sĩ.
 
 Hãy khuyên:
 1. Mô tả rõ triệu chứng
 2. Gọi 115 hoặc 19003115"""
+                state["direct_response"] = self._template_response(state, response_templates.DOCTOR_NOT_FOUND)
         
         elif intent == "medicine_inquiry":
             if not state.get("has_symptoms"):
                 state["use_context"] = False
-                state["system_prompt"] = "Bạn là dược sĩ AI. KHÔNG tự bịa triệu chứng."
+                self._set_system_prompt(state, system_prompts.MEDICINE_NO_SYMPTOMS)
                 state["prompt"] = f"""Người dùng hỏi: {state['user_message']}
 
 QUAN TRỌNG: Người dùng CHƯA cung cấp triệu chứng cụ thể.
@@ -470,18 +1036,15 @@ Vui lòng cho tôi biết:
 - Mức độ nghiêm trọng như thế nào?"
 
 KHÔNG tự bịa triệu chứng hoặc tư vấn thuốc."""
+                state["direct_response"] = self._template_response(state, response_templates.NO_SYMPTOMS_MEDICINE)
             elif state.get("medicine_context"):
                 # ✅ DEBUG
                 print(f"✅ Using medicine context in response")
                 
                 state["use_context"] = True
-                state["system_prompt"] = """Bạn là dược sĩ AI.
-QUY TẮC:
-- CHỈ tư vấn OTC
-- Cảnh báo tác dụng phụ
-- Khuyên tham khảo bác sĩ"""
+                self._set_system_prompt(state, system_prompts.MEDICINE_CONTEXT)
                 state["prompt"] = f"""{state['medicine_context']}
-
+{self._patient_summary_line(state)}
 Câu hỏi: {state['user_message']}
 
 Tư vấn thuốc và khuyến nghị:"""
@@ -490,7 +1053,7 @@ Tư vấn thuốc và khuyến nghị:"""
                 print(f"❌ No medicine context, using fallback response")
                 
                 state["use_context"] = False
-                state["system_prompt"] = "Bạn là dược sĩ AI thân thiện và lịch sự."
+                self._set_system_prompt(state, system_prompts.MEDICINE_NOT_FOUND)
                 state["prompt"] = f"""Người dùng hỏi: {state['user_message']}
 
 QUAN TRỌNG: Không tìm thấy thông tin thuốc phù hợp trong cơ sở dữ liệu.
@@ -509,16 +1072,26 @@ Hãy trả lời một cách lịch sự và hữu ích:
 **Lưu ý quan trọng:** Không tự ý mua và sử dụng thuốc mà chưa có chỉ định của bác sĩ hoặc dược sĩ, vì có thể gây ra tác dụng phụ không mong muốn."
 
 Hãy thể hiện sự quan tâm và hỗ trợ tối đa có thể."""
+                state["direct_response"] = self._template_response(state, response_templates.MEDICINE_NOT_FOUND)
         
         else:  # general_chat
             state["use_context"] = False
-            state["system_prompt"] = "Bạn là trợ lý AI thân thiện."
+            self._set_system_prompt(state, system_prompts.GENERAL_CHAT)
             state["prompt"] = state["user_message"]
         
         return state
     
     # ==================== CONDITIONAL EDGES ====================
     
+    def route_by_analysis(self, state: GraphState) -> str:
+        """Route sau bước phân tích gộp (fallback về 2 bước nếu parse lỗi)"""
+        if not state.get("analyzed"):
+            return "fallback"
+        
+        if state["intent"] in ("medical_consultation", "general_chat"):
+            return state["intent"]
+        return self.route_by_symptoms(state)
+    
     def route_by_intent(self, state: GraphState) -> str:
         """Route dựa trên intent"""
         return state["intent"]
@@ -535,13 +1108,8 @@ Hãy thể hiện sự quan tâm và hỗ trợ tối đa có thể."""
     
     # ==================== PUBLIC API ====================
     
-    def route(self, user_message: str, conversation_context: str = "", user_only_context: str = "") -> Dict[str, Any]:
-        """
-        Main entry point - giống API cũ
-        
-        Returns:
-            Dict với keys: intent, use_context, system_prompt, prompt
-        """
+    def _initial_state(self, user_message: str, conversation_context: str, user_only_context: str,
+                       patient_state: Optional[PatientState] = None) -> GraphState:
         print(f"\n{'='*60}")
         print(f"🔍 LANGGRAPH ROUTER")
         print(f"{'='*60}")
@@ -549,28 +1117,72 @@ Hãy thể hiện sự quan tâm và hỗ trợ tối đa có thể."""
         print(f"User context: '{user_only_context[:50]}...'")
         print(f"{'='*60}\n")
         
-        # Prepare initial state
-        initial_state: GraphState = {
+        return {
             "user_message": user_message,
             "conversation_context": conversation_context,
             "user_only_context": user_only_context,
             "intent": "general_chat",
             "has_symptoms": None,
+            "analyzed": False,
+            "extracted_symptoms": None,
+            "specialty": None,
+            "patient": patient_state,
+            "retrieval": None,
+            "trace": None,
             "medical_context": None,
             "doctor_context": None,
             "medicine_context": None,
             "system_prompt": "",
+            "response_key": None,
             "prompt": "",
+            "direct_response": None,
             "use_context": False
         }
+    
+    def _build_result(self, final_state: GraphState) -> Dict[str, Any]:
+        trace = final_state["trace"].to_dict()
+        write_trace_log({"intent": final_state["intent"], "use_context": final_state["use_context"], **trace})
+        print(f"⏱️ Router: {trace['total_ms']:.0f} ms, {len(trace['spans'])} spans")
         
-        # Run graph
-        final_state = self.graph.invoke(initial_state)
-        
-        # Return response
         return {
             "intent": final_state["intent"],
             "use_context": final_state["use_context"],
             "system_prompt": final_state["system_prompt"],
-            "prompt": final_state["prompt"]
+            "response_key": final_state.get("response_key"),
+            "prompt": final_state["prompt"],
+            "direct_response": final_state.get("direct_response"),
+            "trace": trace,
+            "patient_state": final_state["patient"].to_dict() if final_state.get("patient") is not None else None
         }
+    
+    def route(self, user_message: str, conversation_context: str = "", user_only_context: str = "",
+              patient_state: Optional[PatientState] = None) -> Dict[str, Any]:
+        """
+        Main entry point - giống API cũ
+        
+        Args:
+            patient_state: Hồ sơ triệu chứng của phiên (được cập nhật tại chỗ). None → phân tích
+                           lại từ user_only_context như trước
+        
+        Returns:
+            Dict với keys: intent, use_context, system_prompt, response_key, prompt, direct_response, trace, patient_state
+        """
+        with start_trace() as trace:
+            initial_state = self._initial_state(user_message, conversation_context, user_only_context, patient_state)
+            initial_state["trace"] = trace
+            final_state = self.graph.invoke(initial_state)
+            return self._build_result(final_state)
+    
+    async def aroute(self, user_message: str, conversation_context: str = "", user_only_context: str = "",
+                     patient_state: Optional[PatientState] = None) -> Dict[str, Any]:
+        """
+        Async entry point - một event loop có thể xử lý nhiều hội thoại đồng thời
+        
+        Returns:
+            Dict với keys: intent, use_context, system_prompt, response_key, prompt, direct_response, trace, patient_state
+        """
+        with start_trace() as trace:
+            initial_state = self._initial_state(user_message, conversation_context, user_only_context, patient_state)
+            initial_state["trace"] = trace
+            final_state = await self.graph.ainvoke(initial_state)
+            return self._build_result(final_state)
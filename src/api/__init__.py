@@ -0,0 +1,4 @@
+from .chat_service import ChatService, ChatSession, ServerBusyError
+from .asgi import ChatServer, create_app
+
+__all__ = ['ChatService', 'ChatSession', 'ServerBusyError', 'ChatServer', 'create_app']
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from src.api.chat_service import ChatService, ServerBusyError
+
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_SESSION_ID_LENGTH = 128
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    """Một Server-Sent Event (data là JSON một dòng)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+class ChatServer:
+    """
+    ASGI app (không cần framework), chạy bằng uvicorn - mỗi worker một ChatService.
+
+    Endpoints:
+        POST   /chat                 {"message": ..., "session_id": ... (tùy chọn)} → SSE: meta, token..., done
+        GET    /health               liveness: trạng thái khởi động, số session, số lượt đang chạy
+                                     (chỉ đọc state, không khởi tạo gì - trả lời cả khi đang / lỗi warm-up)
+        GET    /ready                readiness: 503 khi đang warm-up hoặc khởi động lỗi (kèm lỗi),
+                                     200 + thời gian từng bước khi xong
+        DELETE /sessions/{id}        xóa state của session
+
+    Warm-up chạy nền sau khi khởi động; /chat đến sớm chờ warm-up xong (load balancer nên dựa vào /ready).
+    Khởi tạo / warm-up lỗi → /chat chạy lại một lần cho request đó, vẫn lỗi → 503 + Retry-After.
+    Hết slot xử lý (MAX_CONCURRENT_CHATS) quá CHAT_QUEUE_TIMEOUT giây → 503 + Retry-After.
+    """
+
+    def __init__(self, service_factory: Callable[[], ChatService] = ChatService):
+        self.service_factory = service_factory
+        self.service: Optional[ChatService] = None
+        self._start_lock = asyncio.Lock()
+        self._warmup: Optional[asyncio.Task] = None
+        # Lỗi của service_factory lần gần nhất (service vẫn None)
+        self._start_error: Optional[str] = None
+
+    async def get_service(self, wait_ready: bool = True) -> ChatService:
+        """
+        ChatService của worker - server không gửi lifespan (VD: test client) → khởi tạo ở request đầu tiên.
+        wait_ready: chờ warm-up xong; warm-up trước đó lỗi → chạy lại. Lỗi khởi tạo / warm-up được raise.
+        """
+        async with self._start_lock:
+            if self.service is None:
+                try:
+                    self.service = await asyncio.to_thread(self.service_factory)
+                except Exception as e:
+                    self._start_error = str(e)
+                    raise
+                self._start_error = None
+                self._warmup = asyncio.create_task(self.service.astart())
+            elif wait_ready and self._warmup_error() is not None:
+                print(f"🔁 Warm-up lỗi ({str(self._warmup_error())}), chạy lại")
+                self._warmup = asyncio.create_task(self.service.astart())
+        if wait_ready:
+            await asyncio.shield(self._warmup)
+        return self.service
+
+    def _warmup_error(self) -> Optional[BaseException]:
+        if self._warmup is None or not self._warmup.done() or self._warmup.cancelled():
+            return None
+        return self._warmup.exception()
+
+    def startup_state(self) -> Dict[str, Any]:
+        """Trạng thái khởi động (chỉ đọc, không tạo service): starting / warming_up / ready / failed"""
+        if self.service is None:
+            return {"status": "failed" if self._start_error else "starting", "error": self._start_error}
+        error = self._warmup_error()
+        if error is not None:
+            return {"status": "failed", "error": str(error)}
+        if self._warmup is not None and not self._warmup.done():
+            return {"status": "warming_up", "error": None}
+        if not self.service.ready:
+            return {"status": "failed", "error": "warm-up xong nhưng chưa có vector store"}
+        return {"status": "ready", "error": None}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    # Warm-up chạy nền: worker nhận /health ngay, /ready báo khi xong
+                    await self.get_service(wait_ready=False)
+                    await send({"type": "lifespan.startup.complete"})
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+            elif message["type"] == "lifespan.shutdown":
+                # Chờ tóm tắt nền xong; backend memory: ghi session còn trong RAM ra store
+                if self._warmup is not None and not self._warmup.done():
+                    self._warmup.cancel()
+                if self.service is not None:
+                    await asyncio.to_thread(self.service.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ==================== HTTP ====================
+
+    async def _http(self, scope, receive, send):
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if path == "/chat" and method == "POST":
+            await self._chat(receive, send)
+        elif path == "/health" and method == "GET":
+            stats = self.service.stats() if self.service is not None else {"ready": False}
+            await self._json(send, 200, {"status": "ok", "startup": self.startup_state()["status"], **stats})
+        elif path == "/ready" and method == "GET":
+            state = self.startup_state()
+            ready = state["status"] == "ready"
+            warmup = self.service.warmup if self.service is not None else None
+            await self._json(send, 200 if ready else 503, {
+                "ready": ready, **state, "warmup": warmup.to_dict() if warmup is not None else None
+            })
+        elif path.startswith("/sessions/") and method == "DELETE":
+            service = await self._service_or_unavailable(send, wait_ready=False)
+            if service is None:
+                return
+            removed = service.clear_session(path[len("/sessions/"):])
+            await self._json(send, 200 if removed else 404, {"removed": removed})
+        else:
+            await self._json(send, 404, {"error": "not found"})
+
+    async def _service_or_unavailable(self, send, wait_ready: bool = True) -> Optional[ChatService]:
+        """Service cho request; khởi tạo / warm-up lỗi → 503 + Retry-After, trả về None"""
+        try:
+            return await self.get_service(wait_ready=wait_ready)
+        except Exception as e:
+            print(f"⚠️ Chat service chưa sẵn sàng: {str(e)}")
+            await self._json(send, 503, {"error": "dịch vụ khởi động lỗi, vui lòng thử lại sau",
+                                         "startup": self.startup_state()},
+                             headers=[(b"retry-after", b"5")])
+            return None
+
+    @staticmethod
+    async def _json(send, status: int, data: Dict[str, Any], headers: Optional[list] = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                        (b"content-length", str(len(body)).encode())] + (headers or [])
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _read_body(receive) -> Optional[bytes]:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                return None
+            if not message.get("more_body"):
+                return body
+
+    async def _chat(self, receive, send):
+        body = await self._read_body(receive)
+        try:
+            payload = json.loads(body) if body else None
+        except json.JSONDecodeError:
+            payload = None
+        message = payload.get("message", "").strip() if isinstance(payload, dict) else ""
+        session_id = payload.get("session_id") if isinstance(payload, dict) else None
+        if not message or (session_id is not None and
+                           (not isinstance(session_id, str) or len(session_id) > MAX_SESSION_ID_LENGTH)):
+            await self._json(send, 400, {"error": "cần 'message' (và 'session_id' dạng chuỗi nếu có)"})
+            return
+
+        service = await self._service_or_unavailable(send)
+        if service is None:
+            return
+        try:
+            async with service.turn(session_id) as session:
+                await send({
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                (b"cache-control", b"no-cache"),
+                                (b"x-accel-buffering", b"no")]
+                })
+                try:
+                    async for event, data in service.astream_turn(session, message):
+                        await send({"type": "http.response.body", "body": sse_event(event, data), "more_body": True})
+                except Exception as e:
+                    traceback.print_exc()
+                    await send({"type": "http.response.body", "body": sse_event("error", {"error": str(e)}),
+                                "more_body": True})
+                await send({"type": "http.response.body", "body": b""})
+        except ServerBusyError as e:
+            print(f"⚠️ {str(e)}")
+            await self._json(send, 503, {"error": str(e)}, headers=[(b"retry-after", b"1")])
+
+
+def create_app(service_factory: Callable[[], ChatService] = ChatService) -> ChatServer:
+    return ChatServer(service_factory)
+
+
+def run(app_path: str = "server:app"):
+    """Chạy uvicorn với cấu hình từ .env (SERVER_HOST, SERVER_PORT, SERVER_WORKERS)"""
+    import uvicorn
+
+    uvicorn.run(
+        app_path,
+        host=os.getenv('SERVER_HOST', '0.0.0.0'),
+        port=int(os.getenv('SERVER_PORT', '8000')),
+        workers=int(os.getenv('SERVER_WORKERS', '1'))
+    )
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.agents.router_graph import AgentRouterGraph
+from src.models.llm import get_llm
+from src.orchestrator import MedicalOrchestrator
+from src.services.answer_chains import AnswerChainCache
+from src.services.history_window import HistoryWindow, RollingSummarizer, count_message_tokens
+from src.services.session_backend import create_session_backend
+from src.services.session_manager import ChatSession, SessionBackend
+from src.services.vector_store import VectorStoreService
+from src.services.warmup import DEFAULT_DOCUMENTS_PATH, WarmupReport, awarm_up, load_or_build_vector_store
+
+
+class ServerBusyError(Exception):
+    """Hết slot xử lý trong thời gian chờ (CHAT_QUEUE_TIMEOUT)"""
+
+
+class ChatService:
+    """
+    Chat nhiều session trên một worker: router, vector store và LLM dùng chung,
+    state hội thoại tách riêng theo session_id, tối đa MAX_CONCURRENT_CHATS lượt chạy đồng thời.
+
+    Mỗi lượt nạp state từ session backend (SESSION_BACKEND) và ghi lại một lần khi xong,
+    nên với backend dùng chung (sqlite / redis) lượt nào cũng chạy được ở worker nào.
+    Lịch sử gửi cho model theo HistoryWindow (số token có giới hạn), lượt cũ được tóm tắt nền.
+
+    Usage:
+        service = ChatService()
+        await service.astart()
+        async with service.turn(session_id) as session:
+            async for event, data in service.astream_turn(session, "tôi bị sốt"):
+                ...   # ("meta", {...}), ("token", {"content": ...}), ("done", {...})
+    """
+
+    def __init__(self, vector_service: Optional[VectorStoreService] = None, router=None, llm=None,
+                 max_concurrent: Optional[int] = None, queue_timeout: Optional[float] = None,
+                 sessions: Optional[SessionBackend] = None, summary_llm=None):
+        self.vector_service = vector_service or VectorStoreService()
+        self.router = router or MedicalOrchestrator(AgentRouterGraph(vector_service=self.vector_service))
+        self.llm = llm or get_llm(streaming=True)
+        self.sessions = sessions if sessions is not None else create_session_backend()
+        self.window = HistoryWindow()
+        self.summarizer = RollingSummarizer(summary_llm or get_llm(streaming=False), self.window)
+
+        self.max_concurrent = max_concurrent or int(os.getenv('MAX_CONCURRENT_CHATS', '16'))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv('CHAT_QUEUE_TIMEOUT', '30'))
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        # Lock theo session trong worker này (hai lượt cùng session không chạy chồng nhau)
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        # Chain trả lời dựng sẵn theo system prompt của từng nhánh, lịch sử truyền vào theo lượt
+        self.chains = AnswerChainCache(self.llm)
+
+        # Warm-up (astart) xong mới nhận traffic
+        self.ready = False
+        self.warmup: Optional[WarmupReport] = None
+
+    def load_vector_store(self, folder_path: str = DEFAULT_DOCUMENTS_PATH):
+        """Load vector store, chưa có thì tạo từ documents (giống app.py)"""
+        load_or_build_vector_store(self.vector_service, folder_path)
+
+    async def astart(self):
+        """
+        Warm-up (src/services/warmup.py): index, embedding, search, LLM (client async), router.
+        ready = True khi xong - /ready của server trả 200 từ lúc này.
+        """
+        self.warmup = await awarm_up(self.vector_service, self.router, self.llm)
+        self.ready = self.warmup.ready
+        print(f"✅ Chat service sẵn sàng (tối đa {self.max_concurrent} lượt đồng thời)")
+
+    # ==================== SESSIONS ====================
+
+    def get_session(self, session_id: Optional[str] = None) -> ChatSession:
+        return self.sessions.load(session_id or uuid.uuid4().hex)
+
+    def clear_session(self, session_id: str) -> bool:
+        return self.sessions.clear(session_id)
+
+    @asynccontextmanager
+    async def turn(self, session_id: Optional[str] = None) -> AsyncIterator[ChatSession]:
+        """Giữ lock của session và một slot xử lý (raise ServerBusyError nếu chờ quá queue_timeout)"""
+        session_id = session_id or uuid.uuid4().hex
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        async with lock:
+            session = await asyncio.to_thread(self.get_session, session_id)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise ServerBusyError(f"Quá {self.max_concurrent} lượt chat đồng thời")
+            self.active += 1
+            try:
+                yield session
+            finally:
+                self.active -= 1
+                self._slots.release()
+
+    # ==================== CHAT ====================
+
+    async def astream_turn(self, session: ChatSession, message: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Một lượt chat: route (async) rồi stream câu trả lời
+
+        Yields:
+            ("meta", {session_id, intent, intents, use_context}), ("token", {content}) ...,
+            ("done", {session_id, response, prompt_tokens, elapsed_ms})
+        """
+        start = time.perf_counter()
+        conversation_context = self.window.conversation_context(session.chat_history.messages)
+        # Chỉ lấy tin nhắn TRƯỚC câu hỏi hiện tại (giống app.py)
+        user_only_context = " ".join(session.user_messages_only[-6:])
+
+        routing_result = await self.router.aroute(
+            message,
+            conversation_context,
+            user_only_context,
+            patient_state=session.patient_state
+        )
+        yield "meta", {
+            "session_id": session.session_id,
+            "intent": routing_result["intent"],
+            "intents": routing_result.get("intents", [routing_result["intent"]]),
+            "use_context": routing_result["use_context"]
+        }
+
+        full_response = routing_result.get("direct_response") or ""
+        if full_response:
+            # Câu trả lời soạn sẵn → gửi thẳng, không gọi LLM
+            prompt_tokens = 0
+            yield "token", {"content": full_response}
+        else:
+            history = self.window.for_prompt(session, routing_result["prompt"], conversation_context)
+            prompt_tokens = count_message_tokens(
+                [SystemMessage(content=routing_result["system_prompt"]), *history,
+                 HumanMessage(content=routing_result["prompt"])]
+            )
+            chain = self.chains.get(routing_result.get("response_key"), routing_result["system_prompt"])
+            async for chunk in chain.astream({"input": routing_result["prompt"], "history": history}):
+                content = getattr(chunk, 'content', '')
+                if content:
+                    full_response += content
+                    yield "token", {"content": content}
+
+        # Ghi cả lượt một lần (nguyên tử) vào backend - lịch sử giữ câu hỏi gốc, không phải prompt đã chèn context
+        turn_messages = [HumanMessage(content=message), AIMessage(content=full_response)]
+        await asyncio.to_thread(self.sessions.append_turn, session, message, turn_messages)
+        self.summarizer.schedule(self.sessions, session)
+        yield "done", {
+            "session_id": session.session_id,
+            "response": full_response,
+            "prompt_tokens": prompt_tokens,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    def close(self):
+        self.summarizer.close()
+        self.sessions.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.sessions.stats(),
+            "summary_folds": self.summarizer.folds,
+            **self.chains.stats(),
+            "ready": self.ready,
+            "active": self.active,
+            "max_concurrent": self.max_concurrent
+        }
@@ -0,0 +1,9 @@
+from .entity_matcher import MedicalEntityMatcher, get_entity_matcher
+from .department_index import DepartmentIndex, get_department_index
+from .indication_index import IndicationIndex, build_indication_index, get_indication_index
+from .medicine_index import MedicineIndex, get_medicine_index
+from .interaction_index import Interaction, InteractionIndex, get_interaction_index
+
+__all__ = ['MedicalEntityMatcher', 'get_entity_matcher', 'DepartmentIndex', 'get_department_index',
+           'IndicationIndex', 'build_indication_index', 'get_indication_index',
+           'MedicineIndex', 'get_medicine_index', 'Interaction', 'InteractionIndex', 'get_interaction_index']
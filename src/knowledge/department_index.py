@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.knowledge.entity_matcher import MedicalEntityMatcher
+from src.utils.text_normalizer import fold_text
+
+
+PERSONNEL_PATH = os.path.join(os.getenv('DOCUMENTS_PATH', './data/documents'), 'medical_personnel.json')
+DEFAULT_INDEX_PATH = "./data/cache/department_index.json"
+
+# Tên gọi khác của khoa (key: tên khoa bỏ chữ "Khoa")
+DEPARTMENT_ALIASES = {
+    'Tim mạch': ['tim', 'tim mạch học', 'cardiology'],
+    'Tiêu hóa': ['dạ dày', 'tiêu hóa gan mật', 'gastroenterology'],
+    'Nội tiết': ['tiểu đường', 'đái tháo đường', 'tuyến giáp', 'endocrinology'],
+    'Tai-Mũi-Họng': ['tai mũi họng', 'tmh', 'ent'],
+    'Mắt': ['nhãn khoa', 'ophthalmology'],
+    'Da liễu': ['da', 'dermatology'],
+}
+
+# Tiền tố bỏ qua khi tra cứu ("khoa Tim mạch", "bác sĩ Tim mạch", "chuyên khoa Mắt")
+_PREFIX_PATTERN = re.compile(r'^(?:(?:khoa|chuyen khoa|bac si|bac sy|bs)\s+)+')
+
+
+def _key(text: str) -> str:
+    """Key tra cứu: không dấu, gọn khoảng trắng, bỏ tiền tố"""
+    folded = ' '.join(fold_text(text).split())
+    return _PREFIX_PATTERN.sub('', folded).strip()
+
+
+class DepartmentIndex:
+    """
+    Index chuyên khoa → khoa → bác sĩ, build từ medical_personnel.json.
+
+    Tra cứu theo thứ tự: alias chính xác → alias nằm trong query → nhóm chuyên khoa → cosine trên
+    embedding tên khoa (tính sẵn, cache ra file). Ba bước đầu không gọi mạng.
+
+    Alias (tên khoa, DEPARTMENT_ALIASES) và nhóm (trường "specialty": "Nội khoa", "Chuyên khoa lẻ")
+    được so khớp như MedicalEntityMatcher: nguyên từ, dấu người dùng gõ phải khớp ("tìm" ≠ "tim",
+    "dạ dày" ≠ "da"). Nhóm chỉ khớp nguyên cụm, không bao giờ thành alias của từng khoa.
+    """
+
+    ALIAS = "alias"
+    GROUP = "group"
+
+    def __init__(self, departments: List[Dict[str, Any]], vectors: Optional[np.ndarray] = None,
+                 embeddings=None):
+        self.departments = departments
+        self.vectors = vectors
+        self.embeddings = embeddings
+
+        self._matcher = MedicalEntityMatcher()
+        groups: Dict[str, List[int]] = {}
+        for i, department in enumerate(departments):
+            short_name = re.sub(r'^khoa\s+', '', department['department_name'], flags=re.IGNORECASE)
+            for name in [department['department_name'], short_name] + DEPARTMENT_ALIASES.get(short_name, []):
+                self._matcher.add(self.ALIAS, name, i)
+            if department.get('specialty'):
+                groups.setdefault(department['specialty'], []).append(i)
+        for group, indices in groups.items():
+            self._matcher.add(self.GROUP, group, tuple(indices))
+        self._matcher.build()
+
+    @staticmethod
+    def _format_content(department: Dict[str, Any]) -> str:
+        lines = [f"Khoa: {department['department_name']}"]
+        if department.get('specialty'):
+            lines.append(f"Chuyên khoa: {department['specialty']}")
+        if department.get('description'):
+            lines.append(f"Mô tả: {department['description']}")
+        lines.append("Bác sĩ:")
+        for doctor in department.get('doctors', []):
+            parts = [doctor.get('full_name', ''), doctor.get('degree', ''), doctor.get('position', '')]
+            lines.append("• " + " - ".join(part for part in parts if part))
+        return "\n".join(lines)
+
+    @staticmethod
+    def load_departments(path: str = PERSONNEL_PATH) -> List[Dict[str, Any]]:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        departments = []
+        for item in data.get('departments', []):
+            if not item.get('department_name'):
+                continue
+            department = {
+                'department_name': item['department_name'],
+                'specialty': item.get('specialty', ''),
+                'description': item.get('description', ''),
+                'doctors': item.get('doctors', [])
+            }
+            department['content'] = DepartmentIndex._format_content(department)
+            departments.append(department)
+        return departments
+
+    @classmethod
+    def build(cls, embeddings=None, path: str = PERSONNEL_PATH,
+              index_path: str = DEFAULT_INDEX_PATH) -> "DepartmentIndex":
+        """
+        Build index (embedding tên khoa được cache ra file, chỉ tính lại khi dữ liệu/model đổi)
+        """
+        departments = cls.load_departments(path)
+        texts = [f"{d['department_name']}: {d['description']}" for d in departments]
+
+        underlying = getattr(embeddings, 'underlying', embeddings)
+        model_name = str(getattr(underlying, 'model', '') or type(underlying).__name__)
+        fingerprint = hashlib.sha256(
+            (json.dumps(texts, ensure_ascii=False) + model_name).encode('utf-8')
+        ).hexdigest()
+
+        vectors = None
+        if embeddings is not None and departments:
+            if os.path.exists(index_path):
+                try:
+                    with open(index_path, 'r', encoding='utf-8') as f:
+                        cached = json.load(f)
+                    if cached.get('fingerprint') == fingerprint:
+                        vectors = np.asarray(cached['vectors'], dtype=np.float32)
+                except (json.JSONDecodeError, KeyError) as e:
+                    print(f"⚠️ Department index cache lỗi, build lại: {str(e)}")
+
+            if vectors is None:
+                try:
+                    vectors = cls._normalize(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+                    directory = os.path.dirname(index_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with open(index_path, 'w', encoding='utf-8') as f:
+                        json.dump({'fingerprint': fingerprint, 'vectors': vectors.tolist()}, f)
+                except Exception as e:
+                    print(f"⚠️ Không embed được tên khoa, chỉ dùng alias: {str(e)}")
+                    vectors = None
+
+        print(f"✅ Department index: {len(departments)} khoa, "
+              f"{sum(len(d['doctors']) for d in departments)} bác sĩ")
+        return cls(departments, vectors, embeddings)
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _longest_matches(self, query: str) -> List[Any]:
+        """Match không chồng lấn, ưu tiên cụm dài nhất ("da day" → "dạ dày", không thêm "da"), theo thứ tự xuất hiện"""
+        kept = []
+        for match in sorted(self._matcher.find(query), key=lambda m: (m.start - m.end, m.start)):
+            if all(match.end <= other.start or other.end <= match.start for other in kept):
+                kept.append(match)
+        return sorted(kept, key=lambda m: m.start)
+
+    def _match_aliases(self, query: str) -> List[Tuple[int, float]]:
+        """
+        Khoa có alias trong query (1.0 nếu alias là cả query, 0.9 nếu nằm trong query) theo thứ tự
+        xuất hiện, sau đó các khoa thuộc nhóm chuyên khoa có trong query (0.8)
+        """
+        key = _key(query)
+        if not key:
+            return []
+
+        aliases, groups = [], []
+        for match in self._longest_matches(query):
+            if match.kind == self.ALIAS:
+                aliases.append((match.value, 1.0 if _key(match.text) == key else 0.9))
+            else:
+                groups.extend((i, 0.8) for i in match.value)
+
+        # sort ổn định: cùng score thì giữ thứ tự xuất hiện trong query
+        aliases.sort(key=lambda m: -m[1])
+        matches: Dict[int, float] = {}
+        for i, score in aliases + groups:
+            matches.setdefault(i, score)
+        return list(matches.items())
+
+    def _match_vector(self, vector, k: int, min_score: float) -> List[Tuple[int, float]]:
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        scores = self.vectors @ query
+        top = np.argsort(-scores)[:k]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= min_score]
+
+    def lookup(self, specialty: str, k: int = 3, min_score: float = 0.3) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Returns:
+            List (department, score) - score 1.0 / 0.9 cho alias, cosine cho embedding
+        """
+        matches = self._match_aliases(specialty)
+        if not matches and self.vectors is not None and self.embeddings is not None and specialty.strip():
+            matches = self._match_vector(self.embeddings.embed_query(specialty), k, min_score)
+        return [(self.departments[i], score) for i, score in matches[:k]]
+
+    async def alookup(self, specialty: str, k: int = 3, min_score: float = 0.3) -> List[Tuple[Dict[str, Any], float]]:
+        """Async version của lookup (chỉ khác khi phải embed query)"""
+        matches = self._match_aliases(specialty)
+        if not matches and self.vectors is not None and self.embeddings is not None and specialty.strip():
+            matches = self._match_vector(await self.embeddings.aembed_query(specialty), k, min_score)
+        return [(self.departments[i], score) for i, score in matches[:k]]
+
+
+@lru_cache(maxsize=1)
+def get_department_index() -> DepartmentIndex:
+    """Department index dùng chung (build một lần khi khởi động)"""
+    try:
+        from src.models.llm import get_embeddings
+        embeddings = get_embeddings()
+    except Exception as e:
+        print(f"⚠️ Department index không có embeddings: {str(e)}")
+        embeddings = None
+    return DepartmentIndex.build(embeddings)
@@ -0,0 +1,302 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.text_normalizer import fold_text, is_unaccented, nfc_lower
+
+
+DOCUMENTS_PATH = os.getenv('DOCUMENTS_PATH', './data/documents')
+
+# Map triệu chứng → chuyên khoa
+SYMPTOM_TO_SPECIALTY = {
+    'đau đầu': ['Nội khoa', 'Tim mạch', 'Nội tiết'],
+    'đau bụng': ['Tiêu hóa', 'Nội khoa'],
+    'ợ nóng': ['Tiêu hóa'],
+    'tiêu chảy': ['Tiêu hóa'],
+    'táo bón': ['Tiêu hóa'],
+    'đau ngực': ['Tim mạch', 'Nội khoa'],
+    'khó thở': ['Tim mạch', 'Hồi sức tích cực'],
+    'ho': ['Tai-Mũi-Họng'],
+    'sổ mũi': ['Tai-Mũi-Họng'],
+    'đau họng': ['Tai-Mũi-Họng'],
+    'mờ mắt': ['Mắt'],
+    'ngứa': ['Da liễu'],
+    'phát ban': ['Da liễu'],
+}
+
+# Cách nói khác của các triệu chứng trong symptoms.json
+SYMPTOM_ALIASES = {
+    'Đau đầu': ['nhức đầu'],
+    'Chóng mặt': ['hoa mắt'],
+    'Buồn nôn và nôn': ['nôn mửa', 'ói'],
+    'Mất ngủ': ['khó ngủ'],
+    'Phát ban da': ['phát ban', 'nổi mẩn'],
+    'Mệt mỏi': ['mệt'],
+    'Sổ mũi, nghẹt mũi': ['chảy nước mũi', 'ngạt mũi'],
+    'Khó thở': ['hụt hơi'],
+    'Ợ nóng, trào ngược': ['ợ chua'],
+}
+
+# Từ cho thấy người dùng MÔ TẢ tình trạng của họ ("tôi bị sốt")
+DESCRIBING_CUES = ['bị', 'đang', 'cảm thấy']
+
+# Phủ định / đã khỏi: "không bị sốt", "chưa ho", "hết sốt", "khỏi ho rồi"
+NEGATION_CUES = ['không', 'chưa', 'chẳng', 'hết', 'khỏi']
+
+# Từ được phép đứng giữa từ phủ định và triệu chứng bị phủ định
+# ("không còn bị sốt", "hết sốt và ho") - dạng không dấu
+NEGATION_FILLERS = {'bi', 'con', 'co', 'thay', 'he', 'cam', 'da', 'roi', 'han', 'nua',
+                    'va', 'hay', 'hoac', 'lan', 'cung', 'voi'}
+
+# Ranh giới mệnh đề: phủ định không vượt qua ("không sốt, ho nhiều" → chỉ sốt bị phủ định)
+CLAUSE_BREAKS = ',.;!?\n'
+
+
+class EntityMatch(NamedTuple):
+    kind: str
+    value: Any
+    text: str
+    start: int
+    end: int
+
+
+class MedicalEntityMatcher:
+    """
+    Tìm triệu chứng / thuốc / khoa trong text bằng một automaton Aho–Corasick.
+
+    So khớp trên text không dấu, theo ranh giới từ. Nếu người dùng có gõ dấu thì dấu
+    phải khớp với pattern (tránh "hộ" → "ho"), gõ không dấu thì chấp nhận.
+    """
+
+    SYMPTOM = "symptom"
+    MEDICINE = "medicine"
+    DEPARTMENT = "department"
+    SPECIALTY_HINT = "specialty_hint"
+    CUE = "cue"
+    NEGATION = "negation"
+
+    def __init__(self):
+        self._automaton = AhoCorasick()
+
+    def add(self, kind: str, pattern: str, value: Any):
+        surface = nfc_lower(re.sub(r'\s+', ' ', pattern).strip())
+        if surface:
+            self._automaton.add(fold_text(surface), (kind, value, surface))
+
+    def build(self):
+        self._automaton.build()
+        return self
+
+    def __len__(self) -> int:
+        return len(self._automaton)
+
+    @staticmethod
+    def _accent_compatible(typed: str, pattern: str) -> bool:
+        """Ký tự có dấu mà người dùng gõ phải khớp với pattern"""
+        for typed_char, pattern_char in zip(typed, pattern):
+            if typed_char == pattern_char or not pattern_char.isalnum():
+                continue
+            if not is_unaccented(typed_char):
+                return False
+        return True
+
+    def find(self, text: str) -> List[EntityMatch]:
+        """Tất cả entity trong text (theo thứ tự xuất hiện)"""
+        if not text:
+            return []
+
+        lowered = nfc_lower(text)
+        folded = fold_text(text)
+        matches = []
+
+        for start, end, (kind, value, surface) in self._automaton.iter_matches(folded):
+            if start > 0 and folded[start - 1] != ' ':
+                continue
+            if end < len(folded) and folded[end] != ' ':
+                continue
+            if not self._accent_compatible(lowered[start:end], surface):
+                continue
+            matches.append(EntityMatch(kind, value, text[start:end], start, end))
+
+        return sorted(matches, key=lambda m: (m.start, -m.end))
+
+    def _negation_scan(self, text: str, matches: List[EntityMatch]) -> Tuple[List[Tuple[int, int]], bool]:
+        """
+        (vùng triệu chứng bị phủ định, có phủ định trong text hay không)
+
+        Triệu chứng bị phủ định nếu đứng sau từ phủ định trong cùng mệnh đề, giữa chúng chỉ có
+        NEGATION_FILLERS hoặc triệu chứng khác cũng bị phủ định ("không bị sốt hay ho").
+        Từ phủ định nằm trong tên entity ("ợ chua") hoặc cuối câu ("... được không?") bị bỏ qua.
+        """
+        lowered = nfc_lower(text)
+        folded = fold_text(text)
+        entities = [m for m in matches if m.kind in (self.SYMPTOM, self.MEDICINE, self.DEPARTMENT)]
+        symptoms = [m for m in entities if m.kind == self.SYMPTOM]
+
+        spans: List[Tuple[int, int]] = []
+        has_negation = False
+        for cue in matches:
+            if cue.kind != self.NEGATION:
+                continue
+            if any(e.start <= cue.start and cue.end <= e.end for e in entities):
+                continue
+            # Có chữ theo sau trong cùng mệnh đề → là phủ định, không phải trợ từ cuối câu "không?"
+            rest = lowered[cue.end:].lstrip(' ')
+            if rest and rest[0] not in CLAUSE_BREAKS:
+                has_negation = True
+
+            position = cue.end
+            for symptom in symptoms:
+                if symptom.start < position:
+                    continue
+                if not self._filler_gap(lowered, folded, position, symptom.start):
+                    break
+                spans.append((symptom.start, symptom.end))
+                position = symptom.end
+        return spans, has_negation
+
+    @staticmethod
+    def _filler_gap(lowered: str, folded: str, start: int, end: int) -> bool:
+        """Đoạn [start, end) cùng mệnh đề và chỉ gồm NEGATION_FILLERS → từ phủ định trước đó còn tác dụng"""
+        if any(char in CLAUSE_BREAKS for char in lowered[start:end]):
+            return False
+        return all(word in NEGATION_FILLERS for word in folded[start:end].split())
+
+    def _split_negated(self, text: str) -> Tuple[List[EntityMatch], List[EntityMatch]]:
+        """(match khẳng định, match triệu chứng / gợi ý chuyên khoa bị phủ định)"""
+        matches = self.find(text)
+        spans, _ = self._negation_scan(text, matches)
+        affirmed, negated = [], []
+        for match in matches:
+            inside = any(start <= match.start and match.end <= end for start, end in spans)
+            (negated if inside and match.kind in (self.SYMPTOM, self.SPECIALTY_HINT) else affirmed).append(match)
+        return affirmed, negated
+
+    @staticmethod
+    def _unique(matches: List[EntityMatch], kind: str) -> List[Any]:
+        values = []
+        for match in matches:
+            if match.kind == kind and match.value not in values:
+                values.append(match.value)
+        return values
+
+    def _values(self, text: str, kind: str) -> List[Any]:
+        return self._unique(self._split_negated(text)[0], kind)
+
+    def symptoms(self, text: str) -> List[str]:
+        """Tên triệu chứng chuẩn (theo symptoms.json), bỏ triệu chứng bị phủ định ("không bị sốt")"""
+        return self._values(text, self.SYMPTOM)
+
+    def negated_symptoms(self, text: str) -> List[str]:
+        """Triệu chứng người dùng phủ định hoặc đã khỏi ("không bị sốt", "hết ho") và không nhắc lại là có"""
+        affirmed, negated = self._split_negated(text)
+        present = self._unique(affirmed, self.SYMPTOM)
+        return [value for value in self._unique(negated, self.SYMPTOM) if value not in present]
+
+    def has_negation(self, text: str) -> bool:
+        """Text có phủ định ("không", "chưa", "hết"...) - khi đó không tự quyết định triệu chứng local"""
+        return self._negation_scan(text, self.find(text))[1]
+
+    def medicines(self, text: str) -> List[str]:
+        """Tên thuốc chuẩn (medicine_name trong medicines.json)"""
+        return self._values(text, self.MEDICINE)
+
+    def departments(self, text: str) -> List[str]:
+        """Tên khoa (department_name trong medical_personnel.json)"""
+        return self._values(text, self.DEPARTMENT)
+
+    def specialties(self, text: str) -> List[str]:
+        """Chuyên khoa gợi ý từ triệu chứng trong text"""
+        specialties = []
+        for hint in self._values(text, self.SPECIALTY_HINT):
+            for specialty in hint:
+                if specialty not in specialties:
+                    specialties.append(specialty)
+        return specialties
+
+    def affirms_symptoms(self, text: str) -> bool:
+        """
+        Có triệu chứng không bị phủ định VÀ dấu hiệu mô tả bản thân không bị phủ định
+        ("tôi bị đau đầu, không sốt" → True; "tôi không bị sốt" → False)
+        """
+        affirmed, _ = self._split_negated(text)
+        if not any(match.kind == self.SYMPTOM for match in affirmed):
+            return False
+        lowered, folded = nfc_lower(text), fold_text(text)
+        negations = [match for match in affirmed if match.kind == self.NEGATION]
+        return any(
+            not any(n.end <= cue.start and self._filler_gap(lowered, folded, n.end, cue.start) for n in negations)
+            for cue in affirmed if cue.kind == self.CUE
+        )
+
+    def describes_symptoms(self, text: str) -> bool:
+        """Text có triệu chứng VÀ có dấu hiệu người dùng đang mô tả bản thân VÀ không có phủ định"""
+        matches = self.find(text)
+        kinds = {match.kind for match in matches}
+        if self.SYMPTOM not in kinds or self.CUE not in kinds:
+            return False
+        return not self._negation_scan(text, matches)[1]
+
+    @classmethod
+    def from_documents(cls, documents_path: str = DOCUMENTS_PATH) -> "MedicalEntityMatcher":
+        """Build automaton từ symptoms.json, medicines.json, medical_personnel.json"""
+        matcher = cls()
+
+        def load(filename: str) -> Dict:
+            path = os.path.join(documents_path, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                print(f"⚠️ Entity matcher bỏ qua {filename}: {str(e)}")
+                return {}
+
+        for symptom in load('symptoms.json').get('symptoms', []):
+            name = symptom.get('symptom_name')
+            if not name:
+                continue
+            parts = re.split(r',| và ', name)
+            # Alias ("nhức đầu", "ngạt mũi") dùng chung chuyên khoa với tên chuẩn
+            specialties = [s for part in parts for s in SYMPTOM_TO_SPECIALTY.get(nfc_lower(part.strip()), [])]
+            for alias in parts + [name] + SYMPTOM_ALIASES.get(name, []):
+                matcher.add(cls.SYMPTOM, alias, name)
+                if specialties:
+                    matcher.add(cls.SPECIALTY_HINT, alias, tuple(specialties))
+
+        for medicine in load('medicines.json').get('medicines', []):
+            name = medicine.get('medicine_name')
+            if not name:
+                continue
+            names = [name, medicine.get('generic_name', '')] + medicine.get('brand_names', [])
+            # "Oresol (ORS)" → "Oresol", "ORS"
+            names += [part for n in names for part in re.split(r'[()]', n or '')]
+            for alias in names:
+                matcher.add(cls.MEDICINE, alias, name)
+
+        for department in load('medical_personnel.json').get('departments', []):
+            name = department.get('department_name')
+            if not name:
+                continue
+            matcher.add(cls.DEPARTMENT, name, name)
+            matcher.add(cls.DEPARTMENT, re.sub(r'^khoa\s+', '', name, flags=re.IGNORECASE), name)
+
+        for keyword, specialties in SYMPTOM_TO_SPECIALTY.items():
+            matcher.add(cls.SPECIALTY_HINT, keyword, tuple(specialties))
+
+        for cue in DESCRIBING_CUES:
+            matcher.add(cls.CUE, cue, cue)
+
+        for cue in NEGATION_CUES:
+            matcher.add(cls.NEGATION, cue, cue)
+
+        print(f"✅ Entity matcher: {len(matcher)} patterns")
+        return matcher.build()
+
+
+@lru_cache(maxsize=1)
+def get_entity_matcher() -> MedicalEntityMatcher:
+    """Entity matcher dùng chung (build một lần khi khởi động)"""
+    return MedicalEntityMatcher.from_documents()
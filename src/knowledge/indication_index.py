@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.knowledge.entity_matcher import MedicalEntityMatcher
+from src.utils.text_normalizer import fold_text, nfc_lower
+
+
+MEDICINES_PATH = os.path.join(os.getenv('DOCUMENTS_PATH', './data/documents'), 'medicines.json')
+DEFAULT_INDEX_PATH = "./data/cache/indication_index.json"
+
+
+def _key(text: str) -> str:
+    return ' '.join(fold_text(text).split())
+
+
+# Cụm động từ điều trị đứng đầu một chỉ định ("Hạ sốt" → "sốt", "Điều trị loét dạ dày" → "loét dạ dày")
+_LEADING_ACTION = re.compile(r'^(?:(?:ho tro\s+)?dieu tri|giam trieu chung|giam|ha|chong|tri|bao gom)\s+')
+
+
+def _tokens(text: str) -> Tuple[List[str], List[str]]:
+    """(các từ không dấu, các từ gốc lowercase có dấu) - cùng vị trí, bỏ dấu câu"""
+    lowered, folded = nfc_lower(text), fold_text(text)
+    spans = [m.span() for m in re.finditer(r'[a-z0-9]+', folded)]
+    return [folded[a:b] for a, b in spans], [lowered[a:b] for a, b in spans]
+
+
+def _segments(indication: str) -> List[Tuple[List[str], List[str]]]:
+    """
+    Các cụm của một chỉ định, tách theo dấu câu và "và", bỏ động từ điều trị ở đầu:
+    "Giảm đau và viêm trong các tình trạng như viêm khớp, đau cơ" → "đau", "viêm trong ... viêm khớp", "đau cơ"
+    """
+    segments = []
+    for part in re.split(r'[,;.()]|\s+và\s+', indication):
+        folded, surface = _tokens(part)
+        match = _LEADING_ACTION.match(' '.join(folded))
+        if match:
+            skip = len(match.group(0).split())
+            folded, surface = folded[skip:], surface[skip:]
+        if folded:
+            segments.append((folded, surface))
+    return segments
+
+
+def _accent_compatible(typed: List[str], surface: List[str]) -> bool:
+    return all(MedicalEntityMatcher._accent_compatible(t, s) for t, s in zip(typed, surface))
+
+
+class IndicationIndex:
+    """
+    Bảng embedding chỉ định (indications) của từng thuốc trong medicines.json, tính sẵn lúc ingest.
+
+    Pre-screen validation: điểm = max cosine giữa các triệu chứng và các chỉ định của thuốc
+    (một phép nhân ma trận). Điểm ≥ accept → PHÙ HỢP, ≤ reject → KHÔNG PHÙ HỢP,
+    ở giữa (hoặc thuốc không có chỉ định) → để LLM quyết định.
+
+    So khớp nguyên văn (dấu người dùng gõ phải khớp, như MedicalEntityMatcher):
+    - triệu chứng là CẢ một cụm của chỉ định ("sốt" = "Hạ sốt", "Đau đầu") → PHÙ HỢP (1.0)
+    - triệu chứng chỉ là một phần của cụm dài hơn ("đau bụng" ⊂ "Đau bụng kinh", "ho" ~ "hô hấp")
+      → chỉ là gợi ý, luôn để LLM quyết định
+    """
+
+    def __init__(self, medicines: Dict[str, List[str]], vectors: np.ndarray, embeddings=None,
+                 accept: float = 0.75, reject: float = 0.3):
+        self.embeddings = embeddings
+        self.accept = accept
+        self.reject = reject
+
+        # Các dòng của một thuốc nằm liền nhau: key thuốc → slice trong ma trận
+        self.indications: List[str] = []
+        self.rows: Dict[str, slice] = {}
+        for medicine, indications in medicines.items():
+            start = len(self.indications)
+            self.indications.extend(indications)
+            self.rows[_key(medicine)] = slice(start, len(self.indications))
+        self.segments = [_segments(indication) for indication in self.indications]
+        self.vectors = vectors
+
+    @staticmethod
+    def load_medicines(path: str = MEDICINES_PATH) -> Dict[str, List[str]]:
+        """Tên thuốc → danh sách chỉ định"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        medicines = {}
+        for item in data.get('medicines', []):
+            if item.get('medicine_name'):
+                medicines[item['medicine_name']] = [i.strip() for i in item.get('indications') or [] if i.strip()]
+        return medicines
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def build(cls, embeddings, path: str = MEDICINES_PATH, index_path: str = DEFAULT_INDEX_PATH,
+              accept: float = 0.75, reject: float = 0.3) -> "IndicationIndex":
+        """
+        Build bảng embedding (cache ra file, chỉ embed lại khi medicines.json hoặc model đổi)
+        """
+        medicines = cls.load_medicines(path)
+        texts = [indication for indications in medicines.values() for indication in indications]
+
+        underlying = getattr(embeddings, 'underlying', embeddings)
+        model_name = str(getattr(underlying, 'model', '') or type(underlying).__name__)
+        fingerprint = hashlib.sha256(
+            (json.dumps(medicines, ensure_ascii=False, sort_keys=True) + model_name).encode('utf-8')
+        ).hexdigest()
+
+        vectors = None
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get('fingerprint') == fingerprint:
+                    vectors = np.asarray(cached['vectors'], dtype=np.float32).reshape(len(texts), -1)
+                    print(f"✅ Indication index: load {len(texts)} chỉ định từ cache")
+            except (json.JSONDecodeError, KeyError, ValueError) as e:
+                print(f"⚠️ Indication index cache lỗi, build lại: {str(e)}")
+
+        if vectors is None:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+            if texts:
+                vectors = cls._normalize(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+            directory = os.path.dirname(index_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': fingerprint, 'vectors': vectors.tolist()}, f)
+            print(f"✅ Indication index: embed {len(texts)} chỉ định của {len(medicines)} thuốc")
+
+        return cls(medicines, vectors, embeddings, accept=accept, reject=reject)
+
+    # ==================== SCORING ====================
+
+    def _lexical_match(self, symptoms: List[str], rows: slice) -> Optional[Tuple[bool, str, str]]:
+        """
+        (khớp cả cụm?, triệu chứng, chỉ định) - ưu tiên khớp cả cụm; None nếu không khớp nguyên văn
+        """
+        hint = None
+        for row in range(rows.start, rows.stop):
+            for symptom in symptoms:
+                typed_folded, typed = _tokens(symptom)
+                if not typed_folded:
+                    continue
+                size = len(typed_folded)
+                for folded, surface in self.segments[row]:
+                    if folded == typed_folded and _accent_compatible(typed, surface):
+                        return True, symptom, self.indications[row]
+                    if hint is None and any(
+                        folded[i:i + size] == typed_folded and _accent_compatible(typed, surface[i:i + size])
+                        for i in range(len(folded) - size + 1)
+                    ):
+                        hint = (False, symptom, self.indications[row])
+        return hint
+
+    def scores(self, symptoms: List[str], symptom_vectors, medicine_keys: List[str]) -> List[Optional[tuple]]:
+        """
+        Returns:
+            Mỗi thuốc: (score, triệu chứng, chỉ định khớp nhất, cần LLM) hoặc None nếu thuốc không có trong bảng.
+            cần LLM = True khi triệu chứng chỉ khớp một phần cụm chỉ định (gợi ý, không tự quyết)
+        """
+        similarity = None
+        if len(symptom_vectors) and self.vectors.size:
+            # (số chỉ định × số triệu chứng)
+            similarity = self.vectors @ self._normalize(np.asarray(symptom_vectors, dtype=np.float32)).T
+
+        results = []
+        for medicine in medicine_keys:
+            rows = self.rows.get(_key(medicine))
+            if rows is None or rows.start == rows.stop:
+                results.append(None)
+                continue
+
+            lexical = self._lexical_match(symptoms, rows)
+            if lexical and lexical[0]:
+                results.append((1.0, lexical[1], lexical[2], False))
+                continue
+            if similarity is None:
+                results.append((0.0, *lexical[1:], True) if lexical else None)
+                continue
+
+            block = similarity[rows]
+            row, col = np.unravel_index(np.argmax(block), block.shape)
+            score = float(block[row, col])
+            if lexical:
+                results.append((score, lexical[1], lexical[2], True))
+            else:
+                results.append((score, symptoms[col], self.indications[rows.start + row], False))
+        return results
+
+    def decide(self, score: Optional[tuple]) -> Optional[Tuple[bool, str]]:
+        """(fit, lý do) nếu đủ chắc chắn, None nếu cần LLM"""
+        if score is None:
+            return None
+        value, symptom, indication, needs_llm = score
+        if needs_llm:
+            return None
+        reason = f"'{symptom}' ~ chỉ định '{indication}' ({value:.2f})"
+        if value >= self.accept:
+            return True, reason
+        if value <= self.reject:
+            return False, reason
+        return None
+
+    def _split(self, extracted_symptoms: str) -> List[str]:
+        return [s.strip() for s in extracted_symptoms.split(',') if len(s.strip()) >= 2]
+
+    def prescreen(self, extracted_symptoms: str, medicine_keys: List[str]) -> List[Optional[Tuple[bool, str]]]:
+        """Verdict local cho từng thuốc (None = borderline, chuyển LLM)"""
+        symptoms = self._split(extracted_symptoms)
+        if not symptoms:
+            return [None] * len(medicine_keys)
+        vectors = [self.embeddings.embed_query(symptom) for symptom in symptoms]
+        return [self.decide(score) for score in self.scores(symptoms, vectors, medicine_keys)]
+
+    async def aprescreen(self, extracted_symptoms: str, medicine_keys: List[str]) -> List[Optional[Tuple[bool, str]]]:
+        """Async version của prescreen (embed các triệu chứng đồng thời)"""
+        symptoms = self._split(extracted_symptoms)
+        if not symptoms:
+            return [None] * len(medicine_keys)
+        vectors = await asyncio.gather(*[self.embeddings.aembed_query(symptom) for symptom in symptoms])
+        return [self.decide(score) for score in self.scores(symptoms, vectors, medicine_keys)]
+
+
+def build_indication_index(embeddings) -> IndicationIndex:
+    """Build bảng embedding chỉ định (gọi lúc ingest), ngưỡng từ .env"""
+    return IndicationIndex.build(
+        embeddings,
+        index_path=os.getenv('INDICATION_INDEX_PATH', DEFAULT_INDEX_PATH),
+        accept=float(os.getenv('INDICATION_ACCEPT_THRESHOLD', '0.75')),
+        reject=float(os.getenv('INDICATION_REJECT_THRESHOLD', '0.3'))
+    )
+
+
+@lru_cache(maxsize=1)
+def get_indication_index() -> Optional[IndicationIndex]:
+    """
+    Indication index dùng chung cho pre-screen validation thuốc
+
+    Cấu hình qua .env: INDICATION_PRESCREEN, INDICATION_INDEX_PATH,
+    INDICATION_ACCEPT_THRESHOLD, INDICATION_REJECT_THRESHOLD
+    """
+    if os.getenv('INDICATION_PRESCREEN', 'true').lower() != 'true':
+        return None
+
+    try:
+        from src.models.llm import get_embeddings
+        return build_indication_index(get_embeddings())
+    except Exception as e:
+        print(f"⚠️ Không build được indication index, validate bằng LLM: {str(e)}")
+        return None
@@ -0,0 +1,173 @@
+import json
+import os
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.knowledge.medicine_index import MedicineIndex, get_medicine_index
+from src.utils.text_normalizer import fold_text
+
+
+# Bộ dữ liệu thật (có nguồn) không đi kèm repo; drug_interactions.example.json chỉ minh họa định dạng
+DEFAULT_INTERACTIONS_PATH = "./data/interactions/drug_interactions.json"
+
+# Thứ tự hiển thị cảnh báo
+SEVERITY_RANK = {'major': 0, 'moderate': 1, 'minor': 2}
+SEVERITY_LABELS = {
+    'major': "🔴 NGHIÊM TRỌNG",
+    'moderate': "🟠 TRUNG BÌNH",
+    'minor': "🟢 NHẸ",
+}
+
+
+def _key(text: str) -> str:
+    return ' '.join(fold_text(text).split())
+
+
+class Interaction(NamedTuple):
+    drug_a: str
+    drug_b: str
+    severity: str
+    effect: str
+    recommendation: str
+    source: str
+
+
+class InteractionIndex:
+    """
+    Bảng tương tác thuốc - thuốc theo hoạt chất, dạng sparse và đối xứng.
+
+    Mỗi hoạt chất (không dấu) được gán một id; cặp (a, b) lưu một lần dưới key số nguyên
+    (min_id << 32 | max_id) → tra một cặp là một lần tra dict, N thuốc là N(N-1)/2 lần.
+    Key int + record dạng tuple giữ bộ nhớ gọn khi nạp cơ sở dữ liệu ~1M cặp.
+
+    Tên biệt dược / tên gõ dở được quy về hoạt chất qua medicine index ("Panadol" → Acetaminophen).
+    """
+
+    def __init__(self, medicine_index: Optional[MedicineIndex] = None):
+        self.medicine_index = medicine_index
+        # hoạt chất không dấu → id
+        self.ids: Dict[str, int] = {}
+        # id → tên hoạt chất gốc
+        self.names: List[str] = []
+        # tên đúng như trong file → id (nạp file lớn không phải fold lại tên lặp)
+        self._raw_ids: Dict[str, int] = {}
+        # key cặp → (severity, effect, recommendation, source)
+        self.pairs: Dict[int, Tuple[str, str, str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def _id(self, drug: str) -> int:
+        drug_id = self._raw_ids.get(drug)
+        if drug_id is not None:
+            return drug_id
+        key = _key(drug)
+        drug_id = self.ids.get(key)
+        if drug_id is None:
+            drug_id = self.ids[key] = len(self.names)
+            self.names.append(drug.strip())
+        self._raw_ids[drug] = drug_id
+        return drug_id
+
+    @staticmethod
+    def _pair_key(a: int, b: int) -> int:
+        return (a << 32) | b if a < b else (b << 32) | a
+
+    def add(self, drug_a: str, drug_b: str, severity: str, effect: str = "",
+            recommendation: str = "", source: str = ""):
+        a, b = self._id(drug_a), self._id(drug_b)
+        if a == b:
+            return
+        self.pairs[self._pair_key(a, b)] = (severity, effect, recommendation, source)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INTERACTIONS_PATH, medicine_index: Optional[MedicineIndex] = None,
+             allow_example: bool = False) -> "InteractionIndex":
+        """
+        Nạp drug_interactions.json:
+            {"interactions": [{"drugs": [a, b], "severity": "major|moderate|minor",
+                               "effect": ..., "recommendation": ..., "source": ...}]}
+
+        File có "example": true (dữ liệu mẫu, chưa kiểm chứng) bị bỏ qua trừ khi allow_example=True -
+        cảnh báo tương tác hiển thị cho người bệnh chỉ lấy từ bộ dữ liệu có nguồn.
+        """
+        index = cls(medicine_index)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"⚠️ Không nạp được bảng tương tác thuốc {path}: {str(e)}")
+            return index
+        if data.get('example') and not allow_example:
+            print(f"⚠️ {path} là dữ liệu mẫu chưa kiểm chứng - bỏ qua, không cảnh báo tương tác")
+            return index
+        items = data.get('interactions', [])
+
+        for item in items:
+            drugs = item.get('drugs') or []
+            if len(drugs) != 2:
+                continue
+            index.add(drugs[0], drugs[1], item.get('severity', 'moderate'), item.get('effect', ''),
+                      item.get('recommendation', ''), item.get('source', ''))
+
+        print(f"✅ Interaction index: {len(index)} cặp tương tác, {len(index.names)} hoạt chất")
+        return index
+
+    def resolve(self, drug: str) -> Optional[int]:
+        """Id hoạt chất từ hoạt chất / tên thuốc / biệt dược - None nếu không có trong bảng"""
+        drug_id = self._raw_ids.get(drug)
+        if drug_id is None:
+            drug_id = self.ids.get(_key(drug))
+        if drug_id is None and self.medicine_index is not None:
+            medicine = self.medicine_index.resolve_name(drug)
+            if medicine:
+                drug_id = self.ids.get(_key(self.medicine_index.generics.get(medicine, medicine)))
+        return drug_id
+
+    def check(self, drugs: List[str]) -> List[Interaction]:
+        """
+        Mọi tương tác từng cặp trong danh sách thuốc (không embedding, không LLM)
+
+        Returns:
+            List Interaction, nặng nhất trước
+        """
+        resolved = []
+        seen = set()
+        for drug in drugs:
+            drug_id = self.resolve(drug)
+            if drug_id is not None and drug_id not in seen:
+                seen.add(drug_id)
+                resolved.append((drug, drug_id))
+
+        interactions = []
+        for (drug_a, a), (drug_b, b) in combinations(resolved, 2):
+            record = self.pairs.get(self._pair_key(a, b))
+            if record:
+                interactions.append(Interaction(drug_a, drug_b, *record))
+        return sorted(interactions, key=lambda x: SEVERITY_RANK.get(x.severity, len(SEVERITY_RANK)))
+
+    def format(self, interactions: List[Interaction]) -> Optional[str]:
+        """Cảnh báo tương tác dạng text cho context trả lời"""
+        if not interactions:
+            return None
+        lines = ["CẢNH BÁO TƯƠNG TÁC THUỐC:"]
+        for interaction in interactions:
+            lines.append(f"\n⚠️ {interaction.drug_a} + {interaction.drug_b} - "
+                         f"{SEVERITY_LABELS.get(interaction.severity, interaction.severity)}")
+            if interaction.effect:
+                lines.append(f"   Ảnh hưởng: {interaction.effect}")
+            if interaction.recommendation:
+                lines.append(f"   Khuyến nghị: {interaction.recommendation}")
+            if interaction.source:
+                lines.append(f"   Nguồn: {interaction.source}")
+        return "\n".join(lines)
+
+
+@lru_cache(maxsize=1)
+def get_interaction_index() -> InteractionIndex:
+    """Bảng tương tác thuốc dùng chung (nạp một lần), đường dẫn qua INTERACTIONS_PATH"""
+    return InteractionIndex.load(
+        os.getenv('INTERACTIONS_PATH', DEFAULT_INTERACTIONS_PATH),
+        medicine_index=get_medicine_index()
+    )
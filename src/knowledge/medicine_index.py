@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.knowledge.entity_matcher import SYMPTOM_ALIASES, MedicalEntityMatcher, get_entity_matcher
+from src.utils.document_loader import DocumentLoader
+from src.utils.prefix_trie import PrefixTrie
+from src.utils.text_normalizer import fold_text, is_unaccented, nfc_lower
+
+
+DOCUMENTS_PATH = os.getenv('DOCUMENTS_PATH', './data/documents')
+
+# Số từ tối đa của một cụm trong inverted index ("trào ngược dạ dày thực quản")
+MAX_PHRASE_WORDS = 5
+
+# Thuốc được gợi ý trong treatment_suggestion của symptoms.json (không phải chỉ định chính thức)
+SUGGESTION_WEIGHT = 0.5
+
+# Độ dài tối thiểu của tên thuốc gõ dở ("parac") khi tra theo tiền tố
+MIN_PREFIX_LENGTH = 3
+
+
+def _words(text: str) -> List[str]:
+    return fold_text(text).split()
+
+
+def _load_items(path: str, array_name: str) -> List[dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(array_name, [])
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"⚠️ Medicine index bỏ qua {os.path.basename(path)}: {str(e)}")
+        return []
+
+
+class MedicineIndex:
+    """
+    Index có cấu trúc trên medicines.json: triệu chứng → thuốc.
+
+    Inverted index: mọi cụm 1..MAX_PHRASE_WORDS từ (không dấu) của từng chỉ định → thuốc,
+    trọng số = tỉ lệ cụm phủ chỉ định ("tiêu chảy" phủ 2/3 "Tiêu chảy cấp").
+    Triệu chứng được mở rộng theo tên gọi khác trong symptoms.json / SYMPTOM_ALIASES.
+    Kết quả sắp xếp cố định (trọng số, thứ tự trong medicines.json).
+
+    Name index: tên thuốc / hoạt chất / biệt dược (không dấu) trong prefix trie → tên chuẩn.
+    """
+
+    def __init__(self, documents: List[Document]):
+        # Document giống hệt lúc ingest (format, metadata) → dùng thẳng làm context
+        self.documents: Dict[str, Document] = {}
+        self.order: Dict[str, int] = {}
+        # cụm không dấu → [(thuốc, trọng số, cụm gốc có dấu, chỉ định)]
+        self.postings: Dict[str, List[Tuple[str, float, str, str]]] = {}
+        # triệu chứng không dấu → nhóm tên gọi khác (không dấu)
+        self.synonyms: Dict[str, List[str]] = {}
+        # triệu chứng không dấu → dạng có dấu chuẩn ("ho" → "ho", không phải "hỗ")
+        self.surfaces: Dict[str, str] = {}
+        # tên thuốc / hoạt chất / biệt dược không dấu → medicine_name
+        self.names = PrefixTrie()
+        # medicine_name → hoạt chất (generic_name)
+        self.generics: Dict[str, str] = {}
+
+        for document in documents:
+            name = document.metadata.get('medicine_name')
+            if not name:
+                continue
+            self.order[name] = len(self.order)
+            self.documents[name] = document
+
+    def add_indication(self, medicine: str, indication: str, weight: float = 1.0):
+        # fold_text giữ nguyên độ dài so với nfc_lower → cắt được từ gốc có dấu theo vị trí
+        lowered, folded_text = nfc_lower(indication), fold_text(indication)
+        spans = [m.span() for m in re.finditer(r'\S+', folded_text)]
+        folded = [folded_text[start:end] for start, end in spans]
+        surface = [lowered[start:end] for start, end in spans]
+        for size in range(1, min(MAX_PHRASE_WORDS, len(folded)) + 1):
+            for start in range(len(folded) - size + 1):
+                phrase = ' '.join(folded[start:start + size])
+                self.postings.setdefault(phrase, []).append(
+                    (medicine, weight * size / len(folded), ' '.join(surface[start:start + size]), indication)
+                )
+
+    def add_names(self, medicine: str, names: List[str]):
+        # "Oresol (ORS)" → "Oresol", "ORS"
+        names = names + [part for name in names for part in re.split(r'[()]', name or '')]
+        for name in names:
+            key = ' '.join(_words(name or ''))
+            if key:
+                self.names.add(key, medicine)
+
+    def add_synonyms(self, names: List[str]):
+        group = []
+        for name in names:
+            key = ' '.join(_words(name))
+            if key and key not in group:
+                group.append(key)
+                self.surfaces.setdefault(key, nfc_lower(' '.join(name.split())))
+        for key in group:
+            self.synonyms.setdefault(key, [])
+            self.synonyms[key] += [k for k in group if k not in self.synonyms[key]]
+
+    @classmethod
+    def from_documents(cls, documents_path: str = DOCUMENTS_PATH) -> "MedicineIndex":
+        """Build từ medicines.json (chỉ định) + symptoms.json (tên gọi khác, thuốc được gợi ý)"""
+        medicines_path = os.path.join(documents_path, 'medicines.json')
+        index = cls(DocumentLoader().load_document(medicines_path) or [])
+
+        for item in _load_items(medicines_path, 'medicines'):
+            if not item.get('medicine_name'):
+                continue
+            index.generics[item['medicine_name']] = item.get('generic_name') or item['medicine_name']
+            index.add_names(item['medicine_name'],
+                            [item['medicine_name'], item.get('generic_name', '')] + (item.get('brand_names') or []))
+            for indication in item.get('indications') or []:
+                index.add_indication(item['medicine_name'], indication)
+
+        matcher = get_entity_matcher()
+        for symptom in _load_items(os.path.join(documents_path, 'symptoms.json'), 'symptoms'):
+            name = symptom.get('symptom_name')
+            if not name:
+                continue
+            parts = [part.strip() for part in re.split(r',| và ', name)]
+            names = [name] + parts + SYMPTOM_ALIASES.get(name, [])
+            index.add_synonyms(names)
+            for medicine in matcher.medicines(symptom.get('treatment_suggestion', '')):
+                for part in parts:
+                    index.add_indication(medicine, part, weight=SUGGESTION_WEIGHT)
+
+        print(f"✅ Medicine index: {len(index.documents)} thuốc, {len(index.names)} tên, "
+              f"{len(index.postings)} cụm chỉ định")
+        return index
+
+    def lookup(self, symptom: str) -> List[Tuple[str, float, str]]:
+        """
+        Thuốc điều trị triệu chứng (khớp nguyên văn cụm từ trong chỉ định)
+
+        Returns:
+            List (tên thuốc, trọng số, chỉ định khớp) - rỗng nếu không khớp (dùng vector search)
+        """
+        typed = nfc_lower(' '.join(symptom.split()))
+        key = ' '.join(_words(symptom))
+        if not key:
+            return []
+
+        best: Dict[str, Tuple[float, str]] = {}
+        for variant in self.synonyms.get(key, [key]):
+            canonical = self.surfaces.get(variant)
+            for medicine, weight, surface, indication in self.postings.get(variant, []):
+                # Người dùng gõ có dấu thì dấu phải khớp; triệu chứng đã biết thì khớp đúng dạng chuẩn
+                # ("ho" ≠ "hỗ trợ", "hô hấp")
+                if variant == key and not is_unaccented(typed):
+                    if not MedicalEntityMatcher._accent_compatible(typed, surface):
+                        continue
+                elif canonical is not None and surface != canonical:
+                    continue
+                if medicine not in best or best[medicine][0] < weight:
+                    best[medicine] = (weight, indication)
+
+        return sorted(
+            [(medicine, weight, indication) for medicine, (weight, indication) in best.items()],
+            key=lambda x: (-x[1], self.order.get(x[0], len(self.order)))
+        )
+
+    def resolve_name(self, name: str, min_prefix: int = MIN_PREFIX_LENGTH) -> Optional[str]:
+        """
+        Tên chuẩn (medicine_name) từ tên / hoạt chất / biệt dược, không phân biệt dấu, hoa thường.
+        Tên gõ dở được chấp nhận nếu tiền tố chỉ khớp một thuốc ("parac" → Paracetamol).
+        """
+        key = ' '.join(_words(name))
+        if not key:
+            return None
+        medicine = self.names.get(key)
+        if medicine is None and len(key) >= min_prefix:
+            candidates = self.names.complete(key)
+            if len(candidates) == 1:
+                medicine = next(iter(candidates))
+        return medicine
+
+    def find_names(self, text: str, min_prefix: int = 5) -> List[str]:
+        """Tên thuốc gõ dở trong câu (từng từ, tiền tố duy nhất, tối thiểu min_prefix ký tự)"""
+        medicines = []
+        for word in _words(text):
+            if len(word) < min_prefix:
+                continue
+            medicine = self.resolve_name(word, min_prefix)
+            if medicine and medicine not in medicines:
+                medicines.append(medicine)
+        return medicines
+
+    def document(self, medicine: str) -> Optional[Document]:
+        return self.documents.get(medicine)
+
+
+@lru_cache(maxsize=1)
+def get_medicine_index() -> MedicineIndex:
+    """Medicine index dùng chung (build một lần khi khởi động)"""
+    return MedicineIndex.from_documents()
@@ -1,23 +1,89 @@
 import os
+from functools import lru_cache
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
 
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 
+from src.models.llm_cache import CachedEmbeddings, LLMResponseCache, create_cache_store
+from src.utils.tracing import TraceCallbackHandler
+
 load_dotenv()
 
 
-def get_llm(streaming: bool = True):
+@lru_cache(maxsize=1)
+def get_llm_cache():
+    """
+    Response cache dùng chung cho các LLM tất định (temperature 0, non-streaming): phân tích intent,
+    trích xuất triệu chứng / chuyên khoa, validation thuốc - không cache câu trả lời cho người dùng.
+
+    Cấu hình qua .env: LLM_CACHE, LLM_CACHE_BACKEND (memory/sqlite), LLM_CACHE_PATH,
+    LLM_SEMANTIC_CACHE, LLM_SEMANTIC_CACHE_THRESHOLD
+    """
+    if os.getenv('LLM_CACHE', 'true').lower() != 'true':
+        return None
+
+    store = create_cache_store(
+        backend=os.getenv('LLM_CACHE_BACKEND', 'memory'),
+        path=os.getenv('LLM_CACHE_PATH', './data/cache/llm_cache.sqlite'),
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+    )
+
+    embeddings = None
+    if os.getenv('LLM_SEMANTIC_CACHE', 'false').lower() == 'true':
+        embeddings = get_embeddings()
+
+    return LLMResponseCache(
+        store=store,
+        embeddings=embeddings,
+        semantic_threshold=float(os.getenv('LLM_SEMANTIC_CACHE_THRESHOLD', '0.97'))
+    )
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100')),
+        max_keepalive_connections=int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '20')),
+        keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_SECONDS', '60'))
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(float(os.getenv('LLM_HTTP_TIMEOUT', '600')), connect=5.0)
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """
+    HTTP client dùng chung cho mọi LLM / embedding client (sync): một connection pool,
+    kết nối TLS đã mở (VD: lúc warm-up) được tái sử dụng thay vì mỗi AzureChatOpenAI một pool riêng
+    """
+    return httpx.Client(limits=_http_limits(), timeout=_http_timeout())
+
+
+@lru_cache(maxsize=1)
+def get_http_async_client() -> httpx.AsyncClient:
+    """Như get_http_client cho các call async (ainvoke / astream) - dùng trong một event loop (server)"""
+    return httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+
+
+def get_llm(streaming: bool = True, temperature: Optional[float] = None):
     """
     Initialize Azure OpenAI LLM
     
     Args:
         streaming: Enable streaming response (default: True)
+        temperature: None → TEMPERATURE trong .env. Chỉ LLM non-streaming với temperature 0
+                     (kết quả tất định) mới dùng response cache (xem get_llm_cache)
     """
     api_key = os.getenv('AZURE_OPENAI_API_KEY')
     endpoint = os.getenv('AZURE_OPENAI_ENDPOINT') 
     deployment = os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME','gpt-4o-mini')
     api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2024-06-01')
-    temperature = float(os.getenv('TEMPERATURE', '0.7'))
+    if temperature is None:
+        temperature = float(os.getenv('TEMPERATURE', '0.7'))
     max_tokens = int(os.getenv('MAX_TOKENS', '4096'))
     
     return AzureChatOpenAI(
@@ -27,22 +93,34 @@ def get_llm(streaming: bool = True):
         deployment_name=deployment,
         temperature=temperature,
         max_tokens=max_tokens,
-        streaming=streaming  # ← Enable streaming
+        streaming=streaming,  # ← Enable streaming
+        # Output có sampling (temperature > 0) không được cache: không "đóng băng" một câu trả lời ngẫu nhiên
+        cache=get_llm_cache() if not streaming and temperature == 0 else None,
+        http_client=get_http_client(),
+        http_async_client=get_http_async_client(),
+        callbacks=[TraceCallbackHandler()]  # Span cho mỗi LLM call khi đang trace (xem src/utils/tracing.py)
     )
 
 
+@lru_cache(maxsize=1)
 def get_embeddings():
-    """Initialize Azure OpenAI Embeddings"""
+    """Initialize Azure OpenAI Embeddings (có cache embedding của query)"""
     api_key = os.getenv('AZURE_OPENAI_EMBEDDING_API_KEY') or os.getenv('AZURE_OPENAI_API_KEY')
     endpoint = os.getenv('AZURE_OPENAI_EMBEDDING_ENDPOINT') or os.getenv('AZURE_OPENAI_ENDPOINT')
     deployment = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME', 'text-embedding-3-small')
     api_version = os.getenv('AZURE_OPENAI_EMBEDDING_API_VERSION', '2024-02-15-preview')
     
-    return AzureOpenAIEmbeddings(
+    embeddings = AzureOpenAIEmbeddings(
         azure_endpoint=endpoint,
         api_key=api_key,
         api_version=api_version,
         azure_deployment=deployment,  # Sử dụng azure_deployment
-        model=deployment  # Thêm model parameter để force model name
+        model=deployment,  # Thêm model parameter để force model name
+        http_client=get_http_client(),
+        http_async_client=get_http_async_client()
     )
+    
+    if os.getenv('EMBEDDING_CACHE', 'true').lower() != 'true':
+        return embeddings
+    return CachedEmbeddings(embeddings, max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '5000')))
 
@@ -0,0 +1,312 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps, loads
+
+
+# Text "biến" của prompt hiện tại (VD: tin nhắn user) - dùng cho semantic lookup
+_semantic_text: ContextVar[Optional[str]] = ContextVar("llm_cache_semantic_text", default=None)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@contextmanager
+def semantic_key(text: str):
+    """
+    Đánh dấu phần text thay đổi của prompt (VD: tin nhắn user) cho semantic cache.
+
+    Usage:
+        with semantic_key(user_message):
+            response = llm.invoke(prompt)
+    """
+    token = _semantic_text.set(text)
+    try:
+        yield
+    finally:
+        _semantic_text.reset(token)
+
+
+# ==================== STORAGE BACKENDS ====================
+
+class CacheStore:
+    """Key-value store (str → str) cho cache"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryLRUStore(CacheStore):
+    """In-memory LRU store - mỗi process một bản"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore(CacheStore):
+    """SQLite store - chia sẻ giữa nhiều worker trên cùng máy"""
+
+    def __init__(self, path: str, table: str = "llm_cache"):
+        self.path = path
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL cho phép nhiều process đọc/ghi đồng thời
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                (key, value)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def create_cache_store(backend: str = "memory", path: str = "", table: str = "llm_cache",
+                       max_entries: int = 10000) -> CacheStore:
+    """Tạo store theo tên backend: "memory" hoặc "sqlite" """
+    if backend == "sqlite":
+        return SQLiteStore(path or "./data/cache/llm_cache.sqlite", table=table)
+    if backend == "memory":
+        return InMemoryLRUStore(max_entries=max_entries)
+    raise ValueError(f"Cache backend không hỗ trợ: {backend}")
+
+
+# ==================== EMBEDDING CACHE ====================
+
+class CachedEmbeddings(Embeddings):
+    """Wrapper cache embedding của query (LRU trong RAM)"""
+
+    def __init__(self, underlying: Embeddings, max_entries: int = 5000):
+        self.underlying = underlying
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _put(self, text: str, vector: List[float]) -> None:
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._get(text)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._put(text, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._get(text)
+        if vector is None:
+            vector = await self.underlying.aembed_query(text)
+            self._put(text, vector)
+        return vector
+
+
+# ==================== LLM RESPONSE CACHE ====================
+
+class LLMResponseCache(BaseCache):
+    """
+    Cache response của LLM (gắn vào model qua tham số `cache`).
+
+    - Exact hit: key = (hash llm_string [deployment + params], hash toàn bộ prompt)
+    - Semantic hit (tùy chọn): so cosine giữa embedding của text biến (xem `semantic_key`)
+      với các entry cùng template, chỉ trả về khi similarity >= threshold
+
+    Chỉ dùng cho call tất định (temperature 0, xem get_llm): kết quả phân loại / trích xuất JSON,
+    không phải câu trả lời cho bệnh nhân. Semantic hit trả kết quả của một tin nhắn *khác* (gần giống).
+
+    Semantic index (vector) chỉ nằm trong RAM của process, không lưu vào store: với backend sqlite,
+    các worker dùng chung exact hit, semantic hit chỉ có trong worker đã ghi entry (mất khi restart).
+    """
+
+    def __init__(self, store: CacheStore, embeddings: Optional[Embeddings] = None,
+                 semantic_threshold: float = 0.97, max_semantic_entries: int = 2000):
+        self.store = store
+        self.embeddings = embeddings
+        self.semantic_threshold = semantic_threshold
+        self.max_semantic_entries = max_semantic_entries
+        # scope (template) → deque[(vector, exact_key)]
+        self._semantic_index: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _exact_key(prompt: str, llm_string: str) -> str:
+        return f"{_sha256(llm_string)[:16]}:{_sha256(prompt)}"
+
+    @staticmethod
+    def _template_scope(prompt: str, llm_string: str, text: str) -> str:
+        """Fingerprint của template = prompt sau khi bỏ phần text biến"""
+        # Prompt của chat model là JSON (ensure_ascii) nên thay cả dạng đã escape
+        template = prompt.replace(text, "\x00").replace(json.dumps(text)[1:-1], "\x00")
+        return f"{_sha256(llm_string)[:16]}:{_sha256(template)}"
+
+    def _semantic_lookup(self, prompt: str, llm_string: str, text: str) -> Optional[Tuple[str, List[float]]]:
+        scope = self._template_scope(prompt, llm_string, text)
+        vector = self.embeddings.embed_query(text)
+
+        with self._lock:
+            entries = list(self._semantic_index.get(scope, ()))
+
+        best_key, best_score = None, 0.0
+        for entry_vector, entry_key in entries:
+            score = _cosine(vector, entry_vector)
+            if score > best_score:
+                best_key, best_score = entry_key, score
+
+        if best_key and best_score >= self.semantic_threshold:
+            return best_key, vector
+        return None
+
+    @staticmethod
+    def _mark_hit(value: str, kind: str) -> RETURN_VAL_TYPE:
+        """Generation từ cache, generation_info["cache_hit"] = exact / semantic (trace đếm cache hit)"""
+        generations = loads(value)
+        for generation in generations:
+            generation.generation_info = {**(generation.generation_info or {}), "cache_hit": kind}
+        return generations
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.store.get(self._exact_key(prompt, llm_string))
+        if value is not None:
+            self.stats["exact_hits"] += 1
+            return self._mark_hit(value, "exact")
+
+        text = _semantic_text.get()
+        if self.embeddings is not None and text:
+            try:
+                match = self._semantic_lookup(prompt, llm_string, text)
+                if match:
+                    value = self.store.get(match[0])
+                    if value is not None:
+                        self.stats["semantic_hits"] += 1
+                        return self._mark_hit(value, "semantic")
+            except Exception as e:
+                print(f"⚠️ Semantic cache lookup error: {str(e)}")
+
+        self.stats["misses"] += 1
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._exact_key(prompt, llm_string)
+        self.store.set(key, dumps(list(return_val)))
+
+        text = _semantic_text.get()
+        if self.embeddings is not None and text:
+            try:
+                scope = self._template_scope(prompt, llm_string, text)
+                vector = self.embeddings.embed_query(text)
+                with self._lock:
+                    entries = self._semantic_index.setdefault(
+                        scope, deque(maxlen=self.max_semantic_entries)
+                    )
+                    entries.append((vector, key))
+            except Exception as e:
+                print(f"⚠️ Semantic cache update error: {str(e)}")
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+        with self._lock:
+            self._semantic_index.clear()
@@ -0,0 +1,3 @@
+from .medical_orchestrator import MedicalOrchestrator
+
+__all__ = ['MedicalOrchestrator']
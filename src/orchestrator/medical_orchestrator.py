@@ -1,358 +1,308 @@
-from typing import Dict, Any, Optional, List
-from src.models.llm import get_llm
-
-
-class MedicineAgent:
-    """Agent chuyên tư vấn về thuốc - Hybrid with tools"""
-    
-    def __init__(self, vector_service=None):
-        self.llm = get_llm(streaming=False)
-        self.vector_service = vector_service
-        
-        # ✅ Initialize tools if available
-        if vector_service:
-            from src.tools.medical_tools import MedicalTools
-            self.medical_tools = MedicalTools(vector_service)
-        else:
-            self.medical_tools = None
-    
-    def _format_medicine_info(self, doc, score=None) -> str:
-        """Helper method để format thông tin thuốc bao gồm nguồn"""
-        medicine_name = doc.metadata.get('item_name', 'Thuốc')
-        content = doc.page_content
-        
-        # Thêm thông tin nguồn nếu có
-        source = doc.metadata.get('source', '')
-        reference_url = doc.metadata.get('reference_url', '')
-        last_updated = doc.metadata.get('last_updated', '')
-        
-        result = f"{'='*60}\n{medicine_name.upper()}\n{'='*60}\n\n{content}"
-        
-        # Thêm section nguồn tham khảo
-        if source or reference_url or last_updated:
-            result += f"\n\n{'─'*60}\n📚 NGUỒN THAM KHẢO:\n"
-            if source:
-                result += f"- Nguồn: {source}\n"
-            if reference_url:
-                result += f"- Link: {reference_url}\n"
-            if last_updated:
-                result += f"- Cập nhật: {last_updated}\n"
-        
-        return result
-    
-    def search_medicine_by_symptoms(self, symptoms: str, conversation_context: str = "") -> Optional[str]:
-        """Tìm thuốc - Với LLM validation cải tiến"""
-        if not self.vector_service or not self.vector_service.vector_store:
-            return None
-        
-        try:
-            # Trích xuất triệu chứng
-            if conversation_context:
-                extract_prompt = f"""Từ lịch sử, CHỈ liệt kê triệu chứng người dùng ĐÃ NÓI:
-{conversation_context}
-
-QUY TẮC:
-- CHỈ ghi triệu chứng có trong tin nhắn người dùng
-- KHÔNG thêm triệu chứng khác
-- Format ngắn: "triệu chứng1, triệu chứng2"
-
-Triệu chứng:"""
-                
-                response = self.llm.invoke(extract_prompt)
-                extracted_symptoms = response.content.strip()
-                
-                # Validation
-                context_lower = conversation_context.lower()
-                symptom_keywords = [s.strip() for s in extracted_symptoms.split(',')]
-                
-                validated_keywords = []
-                for keyword in symptom_keywords:
-                    if len(keyword) < 2:
-                        continue
-                    if keyword.lower() in context_lower:
-                        validated_keywords.append(keyword)
-                    else:
-                        print(f"⚠️ Loại bỏ triệu chứng không có trong lịch sử: '{keyword}'")
-                
-                extracted_symptoms = ", ".join(validated_keywords)
-                print(f"✅ Triệu chứng sau validation: {extracted_symptoms}")
-            else:
-                extracted_symptoms = symptoms
-            
-            if not extracted_symptoms or len(extracted_symptoms) < 2:
-                print("❌ Không có triệu chứng hợp lệ")
-                return None
-            
-            print(f"💊 Tìm thuốc cho triệu chứng: {extracted_symptoms}")
-            
-            # ✅ Check if user asks for specific medicine by name
-            if self.medical_tools:
-                medicine_keywords = ["paracetamol", "ibuprofen", "omeprazole", "cetirizine", "loperamide"]
-                query_lower = extracted_symptoms.lower()
-                
-                for med_name in medicine_keywords:
-                    if med_name in query_lower:
-                        print(f"🔧 Detected medicine name query: {med_name}")
-                        tool_result = self.medical_tools.search_medicine_by_name(med_name)
-                        
-                        if tool_result and "Lỗi" not in tool_result:
-                            return f"THÔNG TIN THUỐC:\n\n{tool_result}\n\n{'='*60}\n"
-            
-            # Original symptom-based search
-            symptom_keywords = [s.strip() for s in extracted_symptoms.split(',')]
-            medicine_scores = {}
-            
-            for keyword in symptom_keywords:
-                if len(keyword) < 2:
-                    continue
-                
-                queries = [keyword, f"thuốc {keyword}", f"điều trị {keyword}", f"giảm {keyword}"]
-                
-                for query in queries:
-                    results = self.vector_service.similarity_search_with_filter_and_scores(
-                        query=query,
-                        k=5,
-                        filter_dict={"filename": "medicines.json"}
-                    )
-                    
-                    for doc, score in results:
-                        medicine_name = doc.metadata.get('item_name')
-                        if not medicine_name:
-                            continue
-                        
-                        total_score = score
-                        
-                        indications_text = doc.metadata.get('indications_text', '').lower()
-                        if keyword.lower() in indications_text:
-                            total_score += 0.5
-                        
-                        if keyword.lower() in doc.page_content.lower():
-                            total_score += 0.2
-                        
-                        if medicine_name not in medicine_scores or medicine_scores[medicine_name]['score'] < total_score:
-                            medicine_scores[medicine_name] = {
-                                'doc': doc,
-                                'score': total_score,
-                                'cosine_score': score
-                            }
-            
-            sorted_medicines = sorted(medicine_scores.items(), key=lambda x: x[1]['score'], reverse=True)
-            medicine_candidates = [(item[1]['doc'], item[1]['score']) for item in sorted_medicines[:5]]
-            
-            print(f"📊 Tìm thấy {len(medicine_candidates)} loại thuốc candidates")
-            
-            # ✅ LLM VALIDATION với prompt cải tiến
-            if medicine_candidates:
-                validated_medicines = []
-                
-                for doc, score in medicine_candidates:
-                    medicine_name = doc.metadata.get('item_name', 'Unknown')
-                    category = doc.metadata.get('category', '')
-                    indications_text = doc.metadata.get('indications_text', '')
-                    
-                    # ✅ Prompt chi tiết hơn với strict rules
-                    validation_prompt = f"""Bạn là dược sĩ chuyên nghiệp. Phân tích xem thuốc có TRỰC TIẾP điều trị triệu chứng không.
-
-**TRIỆU CHỨNG CỦA BỆNH NHÂN:**
-{extracted_symptoms}
-
-**THUỐC ĐANG XÉT:**
-- Tên: {medicine_name}
-- Loại: {category}
-- Chỉ định: {indications_text}
-
-**QUY TẮC NGHIÊM NGẶT:**
-
-✅ CHỈ TRẢ LỜI "PHÙ HỢP" KHI:
-- Chỉ định của thuốc TRỰC TIẾP match với triệu chứng
-- Ví dụ:
-  + Triệu chứng "tiêu chảy" + Chỉ định "Tiêu chảy cấp, Tiêu chảy mạn tính" → PHÙ HỢP ✅
-  + Triệu chứng "sốt" + Chỉ định "Hạ sốt, Giảm đau" → PHÙ HỢP ✅
-  + Triệu chứng "đau đầu" + Chỉ định "Đau đầu, Giảm đau" → PHÙ HỢP ✅
-
-❌ TRẢ LỜI "KHÔNG PHÙ HỢP" KHI:
-- Chỉ định KHÔNG liên quan trực tiếp
-- Ví dụ:
-  + Triệu chứng "tiêu chảy" + Chỉ định "Loét dạ dày, Ợ nóng" → KHÔNG PHÙ HỢP ❌
-  + Triệu chứng "sốt" + Chỉ định "Tiêu chảy cấp" → KHÔNG PHÙ HỢP ❌
-  + Triệu chứng "đau đầu" + Chỉ định "Viêm mũi dị ứng" → KHÔNG PHÙ HỢP ❌
-
-**CÂU HỎI:**
-Với triệu chứng "{extracted_symptoms}", thuốc "{medicine_name}" (chỉ định: "{indications_text}") có PHÙ HỢP để điều trị TRỰC TIẾP không?
-
-**CHỈ TRẢ LỜI MỘT TRONG HAI:**
-- "PHÙ HỢP" (nếu chỉ định match trực tiếp)
-- "KHÔNG PHÙ HỢP" (nếu không match)
-
-Trả lời:"""
-                    
-                    try:
-                        response = self.llm.invoke(validation_prompt)
-                        decision = response.content.strip().upper()
-                        
-                        # Stricter parsing
-                        if "PHÙ HỢP" in decision and "KHÔNG" not in decision:
-                            validated_medicines.append((doc, score))
-                            print(f"  ✅ {medicine_name} ({category}) - LLM: PHÙ HỢP")
-                        else:
-                            print(f"  ❌ {medicine_name} ({category}) - LLM: KHÔNG PHÙ HỢP")
-                            print(f"       Lý do: Chỉ định '{indications_text}' không match '{extracted_symptoms}'")
-                    
-                    except Exception as e:
-                        print(f"  ⚠️ {medicine_name} - LLM error: {str(e)}, skipping")
-                        continue
-                
-                # Lấy top 3
-                validated_medicines = validated_medicines[:3]
-                
-                print(f"✅ Sau LLM validation: {len(validated_medicines)} thuốc phù hợp")
-                
-                if validated_medicines:
-                    context_parts = []
-                    for i, (doc, score) in enumerate(validated_medicines, 1):
-                        medicine_name = doc.metadata.get('item_name', f'Thuốc {i}')
-                        cosine = medicine_scores[medicine_name]['cosine_score']
-                        print(f"  {i}. {medicine_name} (Score: {score:.3f})")
-                        
-                        # ✅ Sử dụng helper method để format bao gồm nguồn
-                        formatted_info = self._format_medicine_info(doc, score)
-                        context_parts.append(formatted_info)
-                    
-                    context = "\n\n".join(context_parts)
-                    result = f"THÔNG TIN THUỐC:\n\n{context}\n\n{'='*60}\n"
-                    
-                    print(f"✅ Returning {len(validated_medicines)} LLM-validated medicines")
-                    
-                    return result
-            
-            print("❌ Không tìm thấy thuốc phù hợp sau LLM validation")
-            return None
-            
-        except Exception as e:
-            print(f"⚠️ Lỗi tìm kiếm thuốc: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
-    
-    def get_medicine_details(self, medicine_name: str) -> Optional[str]:
-        """Lấy thông tin chi tiết về một loại thuốc cụ thể"""
-        if not self.vector_service or not self.vector_service.vector_store:
-            return None
-        
-        try:
-            results = self.vector_service.similarity_search(medicine_name, k=1)
-            
-            if results and results[0].metadata.get('filename') == 'medicines.json':
-                doc = results[0]
-                # ✅ Sử dụng helper method để format bao gồm nguồn
-                return self._format_medicine_info(doc)
-            
-            return None
-            
-        except Exception as e:
-            print(f"⚠️ Lỗi tra cứu thuốc: {str(e)}")
-            return None
-    
-    def check_drug_interaction(self, drug1: str, drug2: str) -> Optional[str]:
-        """Kiểm tra tương tác giữa hai loại thuốc"""
-        if not self.vector_service or not self.vector_service.vector_store:
-            return None
-        
+import asyncio
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.agents import response_templates, system_prompts
+from src.agents.graph_state import GraphState
+from src.agents.patient_state import PatientState
+from src.agents.router_graph import AgentRouterGraph, IntentType
+from src.knowledge.entity_matcher import MedicalEntityMatcher
+from src.models.llm_cache import semantic_key
+from src.utils.tracing import span, start_trace, write_trace_log
+
+
+# Cụm từ cho thấy từng loại yêu cầu trong một câu hỏi ghép
+# ("tôi bị sốt, nên uống thuốc gì và khám khoa nào?" → thuốc + bác sĩ)
+INTENT_CUES = {
+    IntentType.MEDICAL_CONSULTATION.value: [
+        "bệnh gì", "là bệnh", "nguyên nhân", "vì sao", "tại sao", "có nguy hiểm", "có sao không",
+    ],
+    IntentType.MEDICINE_INQUIRY.value: [
+        "thuốc gì", "thuốc nào", "uống thuốc", "dùng thuốc", "mua thuốc", "uống gì", "liều dùng", "liều lượng",
+    ],
+    IntentType.DOCTOR_RECOMMENDATION.value: [
+        "bác sĩ nào", "gặp bác sĩ", "gợi ý bác sĩ", "tìm bác sĩ", "khám ở đâu", "khám khoa", "khoa nào",
+        "chuyên khoa nào", "đi khám", "bệnh viện nào", "phòng khám nào",
+    ],
+}
+
+SECTION_TITLES = {
+    IntentType.MEDICAL_CONSULTATION.value: "TƯ VẤN Y TẾ",
+    IntentType.MEDICINE_INQUIRY.value: "TƯ VẤN THUỐC",
+    IntentType.DOCTOR_RECOMMENDATION.value: "GỢI Ý BÁC SĨ",
+}
+
+# Nhánh chỉ hỏi lại triệu chứng (bác sĩ / thuốc khi chưa có triệu chứng) → gộp thành một lời hỏi
+NO_SYMPTOMS_KEYS = {system_prompts.DOCTOR_NO_SYMPTOMS, system_prompts.MEDICINE_NO_SYMPTOMS}
+
+
+class MedicalOrchestrator:
+    """
+    Orchestrator cho câu hỏi nhiều intent, đặt trước AgentRouterGraph (cùng API route / aroute).
+
+    - Dò các intent trong tin nhắn bằng cụm từ (Aho–Corasick, không gọi LLM)
+    - Một intent → chuyển nguyên cho router graph như trước
+    - Nhiều intent → phân tích triệu chứng một lần, lấy context y tế / thuốc / bác sĩ ĐỒNG THỜI
+      (node của router trên bản sao state), rồi gộp thành một prompt trả lời từng phần
+    """
+
+    def __init__(self, router: AgentRouterGraph):
+        self.router = router
+        self.entity_matcher = router.entity_matcher
+        self.enabled = os.getenv('MULTI_INTENT_ORCHESTRATOR', 'true').lower() == 'true'
+        self._cue_matcher = self._build_cue_matcher()
+
+    @staticmethod
+    def _build_cue_matcher() -> MedicalEntityMatcher:
+        matcher = MedicalEntityMatcher()
+        for intent, cues in INTENT_CUES.items():
+            for cue in cues:
+                matcher.add(MedicalEntityMatcher.CUE, cue, intent)
+        return matcher.build()
+
+    # ==================== INTENT DETECTION ====================
+
+    def detect_intents(self, user_message: str) -> List[str]:
+        """Các intent y tế trong tin nhắn, theo thứ tự xuất hiện"""
+        intents = []
+        for match in self._cue_matcher.find(user_message):
+            if match.value not in intents:
+                intents.append(match.value)
+        # Nhắc tên thuốc cụ thể ("paracetamol") cũng là hỏi thuốc
+        if IntentType.MEDICINE_INQUIRY.value not in intents and self.entity_matcher.medicines(user_message):
+            intents.append(IntentType.MEDICINE_INQUIRY.value)
+        return intents
+
+    # ==================== ANALYSIS ====================
+
+    def _symptom_intent(self, intents: List[str]) -> Optional[str]:
+        """Intent đầu tiên cần triệu chứng (bác sĩ / thuốc)"""
+        return next((intent for intent in intents if intent != IntentType.MEDICAL_CONSULTATION.value), None)
+
+    def _apply_analysis(self, state: GraphState, analysis: Optional[Dict[str, Any]]):
+        if analysis is None:
+            print("⚠️ Structured analysis không hợp lệ, coi như chưa có triệu chứng")
+            state["has_symptoms"] = False
+            return
+        self.router._apply_analysis(state, analysis)
+
+    def analyze(self, state: GraphState, intents: List[str]):
+        """Triệu chứng / chuyên khoa dùng chung cho mọi nhánh: hồ sơ → entity matcher → một LLM call"""
+        self.router._update_patient(state)
+        symptom_intent = self._symptom_intent(intents)
+        if symptom_intent is None or self.router._apply_entities(state, symptom_intent):
+            return
+
+        patient = state.get("patient")
+        user_only_context = "" if patient is not None else state.get("user_only_context", "")
         try:
-            query = f"{drug1} {drug2} tương tác"
-            results = self.vector_service.similarity_search(query, k=3)
-            
-            interaction_docs = [doc for doc in results 
-                              if doc.metadata.get('filename') == 'drug_interactions.json']
-            
-            if interaction_docs:
-                context = "\n\n".join([doc.page_content for doc in interaction_docs])
-                return f"CẢNH BÁO TƯƠNG TÁC THUỐC:\n\n{context}"
-            
-            return None
-            
+            with semantic_key(state["user_message"]):
+                response = self.router.analysis_llm.invoke(
+                    self.router._build_analysis_prompt(state["user_message"], user_only_context, patient)
+                )
+            analysis = self.router._parse_analysis(response.content, state["user_message"], user_only_context)
         except Exception as e:
-            print(f"⚠️ Lỗi kiểm tra tương tác thuốc: {str(e)}")
-            return None
-    
-    def get_health_tips(self, category: str = "") -> Optional[str]:
-        """Lấy lời khuyên sức khỏe"""
-        if not self.vector_service or not self.vector_service.vector_store:
-            return None
-        
+            print(f"⚠️ LLM analysis error: {str(e)}")
+            analysis = None
+        self._apply_analysis(state, analysis)
+
+    async def aanalyze(self, state: GraphState, intents: List[str]):
+        """Async version của analyze"""
+        self.router._update_patient(state)
+        symptom_intent = self._symptom_intent(intents)
+        if symptom_intent is None or self.router._apply_entities(state, symptom_intent):
+            return
+
+        patient = state.get("patient")
+        user_only_context = "" if patient is not None else state.get("user_only_context", "")
         try:
-            query = f"{category} sức khỏe lời khuyên" if category else "sức khỏe lời khuyên"
-            results = self.vector_service.similarity_search(query, k=2)
-            
-            tip_docs = [doc for doc in results 
-                       if doc.metadata.get('filename') == 'health_tips.json']
-            
-            if tip_docs:
-                context = "\n\n".join([doc.page_content for doc in tip_docs])
-                return f"💡 LỜI KHUYÊN SỨC KHỎE:\n\n{context}"
-            
-            return None
-            
+            with semantic_key(state["user_message"]):
+                response = await self.router.analysis_llm.ainvoke(
+                    self.router._build_analysis_prompt(state["user_message"], user_only_context, patient)
+                )
+            analysis = self.router._parse_analysis(response.content, state["user_message"], user_only_context)
         except Exception as e:
-            print(f"⚠️ Lỗi lấy health tips: {str(e)}")
-            return None
-    
-    def _create_prompt_with_context(self, query: str, context: str, history: str = "") -> str:
-        """Tạo prompt với context - BẮT BUỘC bao gồm nguồn tham khảo"""
-        
-        base_prompt = f"""Bạn là trợ lý y tế AI chuyên nghiệp và thân thiện.
-
-**THÔNG TIN TỪ CƠ SỞ DỮ LIỆU:**
-{context}
-
-**LỊCH SỬ HỘI THOẠI:**
-{history}
-
-**CÂU HỎI CỦA NGƯỜI DÙNG:**
-{query}
-
-**HƯỚNG DẪN TRẢ LỜI - BẮT BUỘC TUÂN THỦ:**
-
-1. Sử dụng CHÍNH XÁC thông tin từ cơ sở dữ liệu phía trên
-2. Trả lời bằng tiếng Việt, dễ hiểu, thân thiện
-3. Cấu trúc rõ ràng với bullet points hoặc đánh số
-
-4. **⚠️ QUY TẮC BẮT BUỘC VỀ NGUỒN THAM KHẢO:**
-   - Nếu thông tin có chứa phần "📚 NGUỒN THAM KHẢO" hoặc "NGUỒN THAM KHẢO (BẮT BUỘC HIỂN THỊ)"
-   - BẮT BUỘC phải SAO CHÉP NGUYÊN VĂN và ĐƯA VÀO CUỐI câu trả lời
-   - Format chính xác:
-     ```
-     📚 NGUỒN THAM KHẢO:
-     📖 Nguồn: [URL từ dữ liệu]
-     🔗 Link tham khảo: [URL từ dữ liệu]
-     📅 Cập nhật: [ngày từ dữ liệu]
-     ```
-   - KHÔNG được bỏ qua, rút gọn hay thay đổi phần này
-
-5. Luôn kết thúc bằng: "⚠️ Thông tin chỉ mang tính tham khảo. Vui lòng tham khảo bác sĩ/dược sĩ trước khi sử dụng."
-
-**QUY TẮC NGHIÊM NGẶT:**
-❌ KHÔNG bịa đặt thông tin không có trong dữ liệu
-❌ KHÔNG đưa ra chẩn đoán y tế
-❌ KHÔNG tự ý thay đổi hoặc bỏ qua phần nguồn tham khảo
-❌ KHÔNG rút gọn hay paraphrase nguồn tham khảo
-✅ BẮT BUỘC sao chép nguyên văn phần nguồn nếu có trong dữ liệu
-✅ Đặt nguồn tham khảo ở CUỐI câu trả lời, trước lời nhắc cuối cùng
-
-**VÍ DỤ CẤU TRÚC TRẢ LỜI:**
-[Nội dung tư vấn của bạn]
-
-[Thông tin chi tiết...]
-
-📚 NGUỒN THAM KHẢO:
-📖 Nguồn: WHO Model List of Essential Medicines, Drugbank
-🔗 Link tham khảo: https://www.drugs.com/paracetamol.html
-📅 Cập nhật: 2024-01-15
-
-⚠️ Thông tin chỉ mang tính tham khảo. Vui lòng tham khảo bác sĩ/dược sĩ trước khi sử dụng.
-
----
-
-Bây giờ hãy trả lời câu hỏi một cách chuyên nghiệp, đầy đủ và NHỚ BAO GỒM NGUỒN THAM KHẢO:"""
-    
-        return base_prompt
\ No newline at end of file
+            print(f"⚠️ LLM analysis error: {str(e)}")
+            analysis = None
+        self._apply_analysis(state, analysis)
+
+    # ==================== FAN-OUT ====================
+
+    def _branch_state(self, state: GraphState, intent: str) -> GraphState:
+        """Bản sao state cho một nhánh: hồ sơ bệnh nhân và list triệu chứng copy riêng (các nhánh chạy song song)"""
+        branch = dict(state)
+        branch["intent"] = intent
+        branch["patient"] = copy.deepcopy(state.get("patient"))
+        branch["extracted_symptoms"] = copy.copy(state.get("extracted_symptoms"))
+        return branch
+
+    @staticmethod
+    def _merge_patient(state: GraphState, branches: List[GraphState]):
+        """Cập nhật của các nhánh vào hồ sơ dùng chung (node bác sĩ chốt chuyên khoa)"""
+        patient = state.get("patient")
+        for branch in branches:
+            if branch.get("specialty") and not state.get("specialty"):
+                state["specialty"] = branch["specialty"]
+            if patient is not None and branch["patient"].specialty and branch["patient"].specialty != patient.specialty:
+                patient.specialty = branch["patient"].specialty
+
+    def _context_node(self, intent: str, is_async: bool = False):
+        """Node lấy context (sync / async) của router cho intent"""
+        router = self.router
+        nodes = {
+            IntentType.MEDICAL_CONSULTATION.value: (router.get_medical_context_node, router.aget_medical_context_node),
+            IntentType.DOCTOR_RECOMMENDATION.value: (router.get_doctor_context_node, router.aget_doctor_context_node),
+            IntentType.MEDICINE_INQUIRY.value: (router.get_medicine_context_node, router.aget_medicine_context_node),
+        }
+        return nodes[intent][1 if is_async else 0]
+
+    def _run_branch(self, state: GraphState, intent: str) -> GraphState:
+        branch = self._branch_state(state, intent)
+        with span("node", f"{intent}_branch"):
+            if intent == IntentType.MEDICAL_CONSULTATION.value or branch.get("has_symptoms"):
+                branch = self._context_node(intent)(branch)
+            return self.router.build_response_node(branch)
+
+    async def _arun_branch(self, state: GraphState, intent: str) -> GraphState:
+        branch = self._branch_state(state, intent)
+        with span("node", f"{intent}_branch"):
+            if intent == IntentType.MEDICAL_CONSULTATION.value or branch.get("has_symptoms"):
+                branch = await self._context_node(intent, is_async=True)(branch)
+            return self.router.build_response_node(branch)
+
+    # ==================== MERGE ====================
+
+    def _symptom_request(self, state: GraphState, branches: List[GraphState]) -> GraphState:
+        """Một lời hỏi triệu chứng thay cho các nhánh cùng hỏi lại (bác sĩ + thuốc)"""
+        request = dict(branches[0])
+        request["prompt"] = f"""Người dùng hỏi: {state['user_message']}
+
+QUAN TRỌNG: Người dùng CHƯA cung cấp triệu chứng cụ thể.
+
+Hãy trả lời:
+"{response_templates.NO_SYMPTOMS_MULTI}"
+
+KHÔNG tự bịa triệu chứng, KHÔNG gợi ý bác sĩ hoặc thuốc."""
+        request["direct_response"] = self.router._template_response(state, response_templates.NO_SYMPTOMS_MULTI)
+        return request
+
+    def _sections(self, state: GraphState, branches: List[GraphState]) -> List[Tuple[str, GraphState]]:
+        """(tiêu đề, nhánh) theo thứ tự; các nhánh hỏi lại triệu chứng gộp vào vị trí nhánh đầu tiên"""
+        requests = [branch for branch in branches if branch.get("response_key") in NO_SYMPTOMS_KEYS]
+        if len(requests) < 2:
+            return [(SECTION_TITLES[branch["intent"]], branch) for branch in branches]
+
+        request_ids = {id(request) for request in requests}
+        sections = []
+        for branch in branches:
+            if branch is requests[0]:
+                title = " / ".join(SECTION_TITLES[request["intent"]] for request in requests)
+                sections.append((title, self._symptom_request(state, requests)))
+            elif id(branch) not in request_ids:
+                sections.append((SECTION_TITLES[branch["intent"]], branch))
+        return sections
+
+    def merge(self, state: GraphState, branches: List[GraphState]) -> GraphState:
+        """Gộp prompt của các nhánh thành một prompt trả lời lần lượt từng phần"""
+        self._merge_patient(state, branches)
+        for key in ("medical_context", "doctor_context", "medicine_context"):
+            state[key] = next((branch[key] for branch in branches if branch.get(key)), None)
+
+        sections = self._sections(state, branches)
+        if len(sections) == 1:
+            # Mọi nhánh chỉ hỏi lại triệu chứng → hỏi một lần, không chia phần
+            request = sections[0][1]
+            for key in ("intent", "use_context", "response_key", "system_prompt", "prompt", "direct_response"):
+                state[key] = request[key]
+            return state
+
+        parts = []
+        for i, (title, branch) in enumerate(sections, 1):
+            parts.append(f"""{'='*60}
+PHẦN {i} - {title}
+{'='*60}
+Vai trò và quy tắc cho phần này:
+{branch['system_prompt']}
+
+{branch['prompt']}""")
+
+        state["intent"] = branches[0]["intent"]
+        state["use_context"] = any(branch["use_context"] for branch in branches)
+        state["response_key"] = system_prompts.MULTI_INTENT
+        state["system_prompt"] = system_prompts.SYSTEM_PROMPTS[system_prompts.MULTI_INTENT]
+        state["prompt"] = f"""Câu hỏi: {state['user_message']}
+
+{chr(10).join(parts)}
+
+Trả lời lần lượt {len(sections)} phần:"""
+        # Mọi phần đều là câu trả lời soạn sẵn → ghép lại, không cần gọi LLM
+        state["direct_response"] = None
+        if all(branch.get("direct_response") for _, branch in sections):
+            state["direct_response"] = "\n\n".join(
+                f"**{title}**\n\n{branch['direct_response']}" for title, branch in sections
+            )
+        return state
+
+    def _build_result(self, state: GraphState, intents: List[str]) -> Dict[str, Any]:
+        trace = state["trace"].to_dict()
+        write_trace_log({"intent": "+".join(intents), "use_context": state["use_context"], **trace})
+        print(f"⏱️ Orchestrator: {trace['total_ms']:.0f} ms, {len(intents)} intents, {len(trace['spans'])} spans")
+
+        return {
+            "intent": state["intent"],
+            "intents": intents,
+            "use_context": state["use_context"],
+            "system_prompt": state["system_prompt"],
+            "response_key": state.get("response_key"),
+            "prompt": state["prompt"],
+            "direct_response": state["direct_response"],
+            "trace": trace,
+            "patient_state": state["patient"].to_dict() if state.get("patient") is not None else None
+        }
+
+    # ==================== PUBLIC API ====================
+
+    def route(self, user_message: str, conversation_context: str = "", user_only_context: str = "",
+              patient_state: Optional[PatientState] = None) -> Dict[str, Any]:
+        """
+        Cùng API với AgentRouterGraph.route
+
+        Returns:
+            Dict với keys: intent (intent đầu tiên), intents, use_context, system_prompt, response_key,
+            prompt, direct_response, trace, patient_state
+        """
+        intents = self.detect_intents(user_message) if self.enabled else []
+        if len(intents) < 2:
+            return self.router.route(user_message, conversation_context, user_only_context, patient_state)
+
+        print(f"🧩 Multi-intent: {intents}")
+        with start_trace() as trace:
+            state = self.router._initial_state(user_message, conversation_context, user_only_context, patient_state)
+            state["trace"] = trace
+            with span("node", "orchestrator_analyze"):
+                self.analyze(state, intents)
+            # Pool riêng cho từng lượt: các phiên chat đồng thời không xếp hàng sau nhau
+            # copy_context: mỗi nhánh chạy trong thread riêng vẫn ghi span vào trace của lượt chat
+            with ThreadPoolExecutor(max_workers=len(intents), thread_name_prefix="orchestrator") as executor:
+                futures = [executor.submit(copy_context().run, self._run_branch, state, intent) for intent in intents]
+                branches = [future.result() for future in futures]
+            return self._build_result(self.merge(state, branches), intents)
+
+    async def aroute(self, user_message: str, conversation_context: str = "", user_only_context: str = "",
+                     patient_state: Optional[PatientState] = None) -> Dict[str, Any]:
+        """Async version của route - các nhánh chạy đồng thời trên event loop"""
+        intents = self.detect_intents(user_message) if self.enabled else []
+        if len(intents) < 2:
+            return await self.router.aroute(user_message, conversation_context, user_only_context, patient_state)
+
+        print(f"🧩 Multi-intent: {intents}")
+        with start_trace() as trace:
+            state = self.router._initial_state(user_message, conversation_context, user_only_context, patient_state)
+            state["trace"] = trace
+            with span("node", "orchestrator_analyze"):
+                await self.aanalyze(state, intents)
+            branches = await asyncio.gather(*[self._arun_branch(state, intent) for intent in intents])
+            return self._build_result(self.merge(state, list(branches)), intents)
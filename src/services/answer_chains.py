@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable
+
+from src.agents.system_prompts import SYSTEM_PROMPTS
+
+
+def build_answer_chain(llm, system_prompt: str) -> Runnable:
+    """
+    prompt | llm với system prompt cố định, input: {"input": ..., "history": [...]}
+
+    System prompt là SystemMessage (không phải template) → nội dung có dấu { } không bị format
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        SystemMessage(content=system_prompt),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}")
+    ])
+    return prompt | llm
+
+
+class AnswerChainCache:
+    """
+    Chain trả lời dựng sẵn theo khóa system prompt "<intent>.<nhánh>" (src/agents/system_prompts.py):
+    dựng một lần lúc khởi động, mỗi lượt chat chỉ tra dict thay vì dựng lại prompt + chain.
+
+    System prompt ngoài bảng (VD: router khác không trả response_key) → dựng theo nội dung
+    và giữ trong LRU nhỏ (ANSWER_CHAIN_CACHE_SIZE).
+
+    Usage:
+        chains = AnswerChainCache(llm)
+        chain = chains.get(routing_result.get("response_key"), routing_result["system_prompt"])
+        chain.stream({"input": routing_result["prompt"], "history": history})
+    """
+
+    def __init__(self, llm, system_prompts: Mapping[str, str] = SYSTEM_PROMPTS, max_extra: Optional[int] = None):
+        self.llm = llm
+        self.system_prompts = dict(system_prompts)
+        self._chains: Dict[str, Runnable] = {
+            key: build_answer_chain(llm, system_prompt) for key, system_prompt in self.system_prompts.items()
+        }
+        self.max_extra = max_extra or int(os.getenv('ANSWER_CHAIN_CACHE_SIZE', '32'))
+        self._extra: "OrderedDict[str, Runnable]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def __len__(self) -> int:
+        return len(self._chains) + len(self._extra)
+
+    def get(self, response_key: Optional[str], system_prompt: str) -> Runnable:
+        # Khóa có trong bảng và system prompt đúng như bảng → chain dựng sẵn
+        if response_key in self._chains and self.system_prompts[response_key] == system_prompt:
+            self.hits += 1
+            return self._chains[response_key]
+
+        with self._lock:
+            chain = self._extra.get(system_prompt)
+            if chain is not None:
+                self._extra.move_to_end(system_prompt)
+                self.hits += 1
+                return chain
+            chain = build_answer_chain(self.llm, system_prompt)
+            self._extra[system_prompt] = chain
+            if len(self._extra) > self.max_extra:
+                self._extra.popitem(last=False)
+            self.builds += 1
+            return chain
+
+    def stats(self) -> Dict[str, int]:
+        return {"prebuilt_chains": len(self._chains), "extra_chains": len(self._extra),
+                "chain_hits": self.hits, "chain_builds": self.builds}
@@ -0,0 +1,210 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from src.services.session_manager import ChatSession, SessionBackend
+
+
+# Phần còn lại của ngân sách ít hơn mức này thì bỏ hẳn message thay vì cắt
+MIN_TRUNCATED_TOKENS = 32
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Encoding của tiktoken (cần tải file BPE lần đầu) - không có thì None → ước lượng theo ký tự"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(os.getenv('TOKENIZER_ENCODING', 'o200k_base'))
+    except Exception as e:
+        print(f"⚠️ Không load được tokenizer ({type(e).__name__}), ước lượng token theo số ký tự")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        # Tiếng Việt có dấu: ~3 ký tự / token
+        return len(text) // 3 + 1
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    # +4 token mỗi message cho role/định dạng
+    return sum(count_tokens(msg.content) + 4 for msg in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt text (giữ phần đầu) về tối đa max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 3]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+class HistoryWindow:
+    """
+    Chính sách lịch sử gửi cho model trả lời, số token mỗi lượt có giới hạn:
+    - keep_turns lượt gần nhất giữ nguyên văn, bỏ dần lượt cũ nếu vượt max_tokens
+    - các lượt cũ hơn được gộp vào bản tóm tắt (RollingSummarizer, chạy nền)
+
+    Cấu hình qua .env: HISTORY_KEEP_TURNS, HISTORY_MAX_TOKENS, HISTORY_SUMMARY_TOKENS
+    """
+
+    def __init__(self, keep_turns: Optional[int] = None, max_tokens: Optional[int] = None,
+                 summary_tokens: Optional[int] = None):
+        self.keep_turns = keep_turns or int(os.getenv('HISTORY_KEEP_TURNS', '3'))
+        self.max_tokens = max_tokens or int(os.getenv('HISTORY_MAX_TOKENS', '1500'))
+        self.summary_tokens = summary_tokens or int(os.getenv('HISTORY_SUMMARY_TOKENS', '300'))
+
+    @property
+    def keep_messages(self) -> int:
+        return self.keep_turns * 2
+
+    def recent(self, messages: Sequence[BaseMessage], max_tokens: Optional[int] = None) -> List[BaseMessage]:
+        """keep_turns lượt cuối trong max_tokens: lấy từ mới nhất về cũ, message không vừa thì cắt bớt rồi dừng"""
+        remaining = max_tokens if max_tokens is not None else self.max_tokens
+        window: List[BaseMessage] = []
+        for msg in reversed(messages[-self.keep_messages:]):
+            tokens = count_tokens(msg.content) + 4
+            if tokens > remaining:
+                if remaining > MIN_TRUNCATED_TOKENS:
+                    content = truncate_to_tokens(msg.content, remaining - 4) + " …"
+                    window.insert(0, msg.model_copy(update={"content": content}))
+                break
+            window.insert(0, msg)
+            remaining -= tokens
+        return window
+
+    def summary_message(self, session: ChatSession) -> Optional[SystemMessage]:
+        if not session.summary:
+            return None
+        summary = truncate_to_tokens(session.summary, self.summary_tokens)
+        return SystemMessage(content=f"Tóm tắt các lượt hội thoại trước:\n{summary}")
+
+    def messages(self, session: ChatSession, include_recent: bool = True) -> List[BaseMessage]:
+        """
+        Lịch sử cho chain trả lời: [tóm tắt] + các lượt gần nhất.
+
+        include_recent=False khi prompt đã chèn sẵn các lượt gần nhất ("Lịch sử: ...")
+        → chỉ gửi tóm tắt, không lặp lại cùng nội dung.
+        """
+        summary = self.summary_message(session)
+        history = [summary] if summary else []
+        if include_recent:
+            history += self.recent(session.chat_history.messages, self.max_tokens - count_message_tokens(history))
+        return history
+
+    def for_prompt(self, session: ChatSession, prompt: str, conversation_context: str) -> List[BaseMessage]:
+        """Lịch sử cho prompt của router: bỏ các lượt gần nhất nếu prompt đã chèn conversation_context"""
+        inlined = bool(conversation_context) and conversation_context in prompt
+        return self.messages(session, include_recent=not inlined)
+
+    def conversation_context(self, messages: Sequence[BaseMessage]) -> str:
+        """Context dạng text (Bệnh nhân / Bác sĩ) từ các lượt gần nhất, cho router"""
+        return "\n".join(
+            f"{'Bệnh nhân' if msg.type == 'human' else 'Bác sĩ'}: {msg.content}"
+            for msg in self.recent(messages)
+        )
+
+    def foldable(self, session: ChatSession) -> List[BaseMessage]:
+        """Các message cũ hơn cửa sổ nguyên văn, chưa được gộp vào tóm tắt"""
+        return list(session.chat_history.messages[:-self.keep_messages])
+
+
+SUMMARY_PROMPT = """Cập nhật bản tóm tắt cuộc hội thoại tư vấn y tế giữa Bệnh nhân và Bác sĩ AI.
+
+Tóm tắt hiện tại:
+{summary}
+
+Các lượt mới cần gộp vào:
+{turns}
+
+Yêu cầu:
+- Giữ: triệu chứng, thời gian/mức độ, chuyên khoa, bác sĩ và thuốc đã gợi ý, thông tin cá nhân liên quan
+- Bỏ: lời chào, câu hỏi lặp lại, nội dung chung chung
+- Tối đa {max_words} từ, viết liền một đoạn
+
+Tóm tắt mới:"""
+
+
+class RollingSummarizer:
+    """
+    Gộp các lượt cũ hơn cửa sổ nguyên văn vào bản tóm tắt, chạy nền (thread riêng)
+    ngay sau khi lượt chat đã trả lời xong - không nằm trên đường trả lời.
+
+    Chỉ gộp khi đã có ít nhất fold_turns lượt cũ (HISTORY_FOLD_TURNS) để giảm số lần gọi LLM.
+    Mỗi session tối đa một lần gộp đang chạy.
+
+    Usage:
+        summarizer = RollingSummarizer(llm, window)
+        ...                                          # sau backend.append_turn(...)
+        summarizer.schedule(backend, session)
+    """
+
+    def __init__(self, llm, window: Optional[HistoryWindow] = None, fold_turns: Optional[int] = None):
+        self.llm = llm
+        self.window = window or HistoryWindow()
+        self.fold_turns = fold_turns or int(os.getenv('HISTORY_FOLD_TURNS', '2'))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+        self._pending: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.folds = 0
+
+    def needs_fold(self, session: ChatSession) -> bool:
+        return len(self.window.foldable(session)) >= self.fold_turns * 2
+
+    def schedule(self, backend: SessionBackend, session: ChatSession):
+        """Đưa session vào hàng đợi gộp nếu cần (không chờ)"""
+        if not self.needs_fold(session):
+            return None
+        with self._lock:
+            if session.session_id in self._pending:
+                return self._pending[session.session_id]
+            future = self._executor.submit(self._fold, backend, session.session_id)
+            self._pending[session.session_id] = future
+        return future
+
+    def _build_prompt(self, summary: str, messages: Sequence[BaseMessage]) -> str:
+        turns = "\n".join(
+            f"{'Bệnh nhân' if msg.type == 'human' else 'Bác sĩ'}: {msg.content}" for msg in messages
+        )
+        return SUMMARY_PROMPT.format(
+            summary=summary or "(chưa có)",
+            turns=turns,
+            max_words=int(self.window.summary_tokens * 0.6)
+        )
+
+    def _fold(self, backend: SessionBackend, session_id: str):
+        try:
+            # Nạp lại bản mới nhất: lượt có thể đã được ghi bởi worker khác
+            session = backend.load(session_id)
+            messages = self.window.foldable(session)
+            if len(messages) < self.fold_turns * 2:
+                return
+            if not messages[-1].id:
+                print(f"⚠️ Session {session_id}: tin nhắn cũ chưa có id, bỏ qua tóm tắt")
+                return
+            response = self.llm.invoke(self._build_prompt(session.summary, messages))
+            summary = truncate_to_tokens(response.content.strip(), self.window.summary_tokens)
+            if not backend.save_summary(session_id, summary, messages[-1].id):
+                # Lịch sử đã bị cắt / gộp bởi worker khác trong lúc gọi LLM → lần sau gộp lại
+                print(f"⚠️ Session {session_id}: lịch sử đã thay đổi, bỏ bản tóm tắt")
+                return
+            self.folds += 1
+            print(f"📝 Đã tóm tắt {len(messages)} tin nhắn cũ của session {session_id}")
+        except Exception as e:
+            print(f"⚠️ Lỗi tóm tắt lịch sử: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.pop(session_id, None)
+
+    def close(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
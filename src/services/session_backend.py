@@ -0,0 +1,269 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from src.agents.patient_state import PatientState
+from src.services.session_manager import (ChatSession, SessionBackend, SessionManager, assign_message_ids,
+                                          max_session_messages)
+
+
+DEFAULT_SESSION_DB_PATH = "./data/sessions/sessions.sqlite"
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Session lưu trong một file SQLite (WAL) - các worker trên cùng máy dùng chung.
+
+    Mỗi tin nhắn một dòng (append, không ghi lại cả lịch sử); một lượt = một transaction
+    (BEGIN IMMEDIATE): tin nhắn user + hỏi/đáp + hồ sơ triệu chứng + cắt về max_messages.
+    Tóm tắt các lượt cũ nằm ở bảng session_summary.
+    """
+
+    def __init__(self, path: str = DEFAULT_SESSION_DB_PATH, max_messages: Optional[int] = None):
+        self.path = path
+        self.max_messages = max_messages or max_session_messages()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # isolation_level=None: tự quản lý transaction (BEGIN IMMEDIATE ... COMMIT)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_session_messages ON session_messages (session_id, kind, seq)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            "session_id TEXT PRIMARY KEY, patient TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_summary (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+        )
+
+    def _recent(self, session_id: str, kind: str) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT data FROM session_messages WHERE session_id = ? AND kind = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, kind, self.max_messages)
+        ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def load(self, session_id: str) -> ChatSession:
+        session = ChatSession(session_id)
+        with self._lock:
+            # Đọc trong một transaction → snapshot nhất quán kể cả khi worker khác đang ghi
+            self._conn.execute("BEGIN")
+            try:
+                history = self._recent(session_id, "history")
+                users = self._recent(session_id, "user")
+                row = self._conn.execute(
+                    "SELECT patient, updated_at FROM session_state WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                summary = self._conn.execute(
+                    "SELECT summary FROM session_summary WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            finally:
+                self._conn.execute("COMMIT")
+
+        session.chat_history.add_messages(messages_from_dict([json.loads(data) for data in history]))
+        session.user_messages_only = [json.loads(data) for data in users]
+        if row:
+            session.patient_state = PatientState.from_dict(json.loads(row[0]))
+            session.last_active = row[1]
+        if summary:
+            session.summary = summary[0]
+        return session
+
+    def append_turn(self, session: ChatSession, user_message: str, messages: List[BaseMessage]) -> None:
+        session_id = session.session_id
+        assign_message_ids(messages)
+        rows = [(session_id, "user", json.dumps(user_message, ensure_ascii=False))]
+        rows += [(session_id, "history", json.dumps(message_to_dict(msg), ensure_ascii=False)) for msg in messages]
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT INTO session_messages (session_id, kind, data) VALUES (?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO session_state (session_id, patient, updated_at) VALUES (?, ?, ?)",
+                    (session_id, json.dumps(session.patient_state.to_dict(), ensure_ascii=False), time.time())
+                )
+                for kind in ("user", "history"):
+                    self._conn.execute(
+                        "DELETE FROM session_messages WHERE session_id = ? AND kind = ? AND seq NOT IN "
+                        "(SELECT seq FROM session_messages WHERE session_id = ? AND kind = ? ORDER BY seq DESC LIMIT ?)",
+                        (session_id, kind, session_id, kind, self.max_messages)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        session.append(user_message, messages)
+        session.trim(self.max_messages)
+
+    def save_summary(self, session_id: str, summary: str, through_id: str) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # seq của message cuối đã gộp, tìm trong transaction (không dùng vị trí từ lúc load)
+                row = self._conn.execute(
+                    "SELECT seq FROM session_messages WHERE session_id = ? AND kind = 'history' "
+                    "AND json_extract(data, '$.data.id') = ?",
+                    (session_id, through_id)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "DELETE FROM session_messages WHERE session_id = ? AND kind = 'history' AND seq <= ?",
+                        (session_id, row[0])
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO session_summary (session_id, summary) VALUES (?, ?)",
+                        (session_id, summary)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def clear(self, session_id: str) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            removed = self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,)).rowcount
+            removed += self._conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,)).rowcount
+            removed += self._conn.execute("DELETE FROM session_summary WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.execute("COMMIT")
+        return removed > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM session_state").fetchone()[0]
+            messages = self._conn.execute("SELECT COUNT(*) FROM session_messages").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, "stored_messages": messages,
+                "max_messages": self.max_messages}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Session lưu trong Redis - mọi worker / máy dùng chung.
+
+    Client là bất kỳ object có API redis-py (redis.Redis, hoặc fakeredis.FakeRedis khi test local).
+    Keys: {prefix}{id}:history (list), {prefix}{id}:user (list), {prefix}{id}:patient (string),
+    {prefix}{id}:summary (string).
+    Một lượt = một MULTI/EXEC: RPUSH + LTRIM + SET hồ sơ + EXPIRE.
+    Gộp tóm tắt = WATCH history + MULTI/EXEC (thử lại nếu worker khác ghi xen giữa).
+    """
+
+    def __init__(self, client, max_messages: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 prefix: str = "session:"):
+        self.client = client
+        self.max_messages = max_messages or max_session_messages()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('SESSION_TTL_SECONDS', '604800'))
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisSessionBackend":
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("SESSION_BACKEND=redis cần package redis: pip install redis")
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def _keys(self, session_id: str):
+        base = f"{self.prefix}{session_id}"
+        return f"{base}:history", f"{base}:user", f"{base}:patient", f"{base}:summary"
+
+    @staticmethod
+    def _text(value) -> str:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def load(self, session_id: str) -> ChatSession:
+        history_key, user_key, patient_key, summary_key = self._keys(session_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(history_key, -self.max_messages, -1)
+        pipe.lrange(user_key, -self.max_messages, -1)
+        pipe.get(patient_key)
+        pipe.get(summary_key)
+        history, users, patient, summary = pipe.execute()
+
+        session = ChatSession(session_id)
+        session.chat_history.add_messages(messages_from_dict([json.loads(self._text(data)) for data in history]))
+        session.user_messages_only = [json.loads(self._text(data)) for data in users]
+        if patient:
+            session.patient_state = PatientState.from_dict(json.loads(self._text(patient)))
+        if summary:
+            session.summary = self._text(summary)
+        return session
+
+    def append_turn(self, session: ChatSession, user_message: str, messages: List[BaseMessage]) -> None:
+        history_key, user_key, patient_key, _ = self._keys(session.session_id)
+        assign_message_ids(messages)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(user_key, json.dumps(user_message, ensure_ascii=False))
+        if messages:
+            pipe.rpush(history_key, *[json.dumps(message_to_dict(msg), ensure_ascii=False) for msg in messages])
+        pipe.ltrim(user_key, -self.max_messages, -1)
+        pipe.ltrim(history_key, -self.max_messages, -1)
+        pipe.set(patient_key, json.dumps(session.patient_state.to_dict(), ensure_ascii=False))
+        if self.ttl_seconds > 0:
+            for key in self._keys(session.session_id):
+                pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+        session.append(user_message, messages)
+        session.trim(self.max_messages)
+
+    def save_summary(self, session_id: str, summary: str, through_id: str) -> bool:
+        history_key, _, _, summary_key = self._keys(session_id)
+
+        def fold(pipe) -> bool:
+            # Đang WATCH history: vị trí message tính trên list hiện tại, list đổi trước EXEC → chạy lại
+            history = pipe.lrange(history_key, 0, -1)
+            ids = [json.loads(self._text(data))["data"].get("id") for data in history]
+            if through_id not in ids:
+                return False
+            pipe.multi()
+            pipe.ltrim(history_key, ids.index(through_id) + 1, -1)
+            pipe.set(summary_key, summary)
+            if self.ttl_seconds > 0:
+                pipe.expire(summary_key, self.ttl_seconds)
+            return True
+
+        return self.client.transaction(fold, history_key, value_from_callable=True)
+
+    def clear(self, session_id: str) -> bool:
+        return self.client.delete(*self._keys(session_id)) > 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "max_messages": self.max_messages, "ttl_seconds": self.ttl_seconds}
+
+
+def create_session_backend(backend: Optional[str] = None) -> SessionBackend:
+    """
+    Backend theo SESSION_BACKEND:
+        memory  - SessionManager trong process (LRU + spill SQLite), chỉ một worker
+        sqlite  - SQLiteSessionBackend tại SESSION_DB_PATH, các worker cùng máy
+        redis   - RedisSessionBackend tại SESSION_REDIS_URL, nhiều máy
+    """
+    backend = backend or os.getenv('SESSION_BACKEND', 'memory')
+    if backend == "memory":
+        return SessionManager()
+    if backend == "sqlite":
+        return SQLiteSessionBackend(os.getenv('SESSION_DB_PATH', DEFAULT_SESSION_DB_PATH))
+    if backend == "redis":
+        return RedisSessionBackend.from_url(os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0'))
+    raise ValueError(f"Session backend không hỗ trợ: {backend}")
@@ -0,0 +1,276 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from src.agents.patient_state import PatientState
+from src.models.llm_cache import CacheStore, SQLiteStore
+
+
+DEFAULT_SESSION_SPILL_PATH = "./data/cache/sessions.sqlite"
+
+
+def max_session_messages() -> int:
+    return int(os.getenv('SESSION_MAX_MESSAGES', '40'))
+
+
+def cap_messages(items: List[Any], limit: Optional[int] = None) -> List[Any]:
+    """Giữ `limit` phần tử mới nhất của list (cắt tại chỗ)"""
+    limit = limit or max_session_messages()
+    if len(items) > limit:
+        del items[:-limit]
+    return items
+
+
+def assign_message_ids(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Gán id cho message chưa có - save_summary xác định các message đã gộp theo id, không theo vị trí"""
+    for msg in messages:
+        if not msg.id:
+            msg.id = uuid.uuid4().hex
+    return messages
+
+
+class ChatSession:
+    """State hội thoại của một session: lịch sử chat, tin nhắn user, hồ sơ triệu chứng, tóm tắt lượt cũ"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.chat_history = ChatMessageHistory()
+        self.user_messages_only: List[str] = []
+        self.patient_state = PatientState()
+        # Tóm tắt các lượt đã bị gộp khỏi chat_history (xem src/services/history_window.py)
+        self.summary = ""
+        self.last_active = time.time()
+
+    def append(self, user_message: str, messages: List[BaseMessage]):
+        self.user_messages_only.append(user_message)
+        self.chat_history.add_messages(assign_message_ids(messages))
+        self.last_active = time.time()
+
+    def fold(self, summary: str, through_id: str) -> bool:
+        """Thay các message từ đầu tới message `through_id` bằng bản tóm tắt (False nếu message không còn)"""
+        ids = [msg.id for msg in self.chat_history.messages]
+        if through_id not in ids:
+            return False
+        del self.chat_history.messages[:ids.index(through_id) + 1]
+        self.summary = summary
+        return True
+
+    def trim(self, max_messages: int):
+        cap_messages(self.chat_history.messages, max_messages)
+        cap_messages(self.user_messages_only, max_messages)
+
+    def memory_bytes(self) -> int:
+        """Ước lượng bộ nhớ của state (object tin nhắn + text)"""
+        size = sum(sys.getsizeof(msg) + sys.getsizeof(msg.content) for msg in self.chat_history.messages)
+        size += sum(sys.getsizeof(text) for text in self.user_messages_only)
+        size += sum(sys.getsizeof(symptom) for symptom in self.patient_state.symptoms)
+        size += sys.getsizeof(self.summary)
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "messages": messages_to_dict(self.chat_history.messages),
+            "user_messages_only": self.user_messages_only,
+            "patient_state": self.patient_state.to_dict(),
+            "summary": self.summary,
+            "last_active": self.last_active
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChatSession":
+        session = cls(data["session_id"])
+        session.chat_history.add_messages(messages_from_dict(data.get("messages") or []))
+        session.user_messages_only = list(data.get("user_messages_only") or [])
+        session.patient_state = PatientState.from_dict(data.get("patient_state"))
+        session.summary = data.get("summary") or ""
+        session.last_active = data.get("last_active", session.last_active)
+        return session
+
+
+class SessionBackend:
+    """
+    Nơi lưu state hội thoại. Mỗi lượt chat: load → route + trả lời → append_turn,
+    worker không giữ state giữa các lượt nên lượt nào cũng chạy được ở worker nào
+    (khi backend dùng chung: SQLite / Redis, xem src/services/session_backend.py).
+    """
+
+    def load(self, session_id: str) -> ChatSession:
+        """State hiện tại của session (tạo mới nếu chưa có)"""
+        raise NotImplementedError
+
+    def append_turn(self, session: ChatSession, user_message: str, messages: List[BaseMessage]) -> None:
+        """
+        Ghi một lượt (nguyên tử): tin nhắn user, các message lịch sử (hỏi + đáp), hồ sơ triệu chứng.
+        Cập nhật luôn `session` tại chỗ.
+        """
+        raise NotImplementedError
+
+    def save_summary(self, session_id: str, summary: str, through_id: str) -> bool:
+        """
+        Ghi bản tóm tắt mới và bỏ các message lịch sử từ đầu tới message có id `through_id` (nguyên tử).
+        Vị trí message tính lại trong cùng transaction - lượt ghi / cắt bởi worker khác không làm xóa nhầm.
+        False (không ghi gì) nếu message không còn: đã bị cắt hoặc đã được gộp ở nơi khác.
+        """
+        raise NotImplementedError
+
+    def clear(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+class SessionManager(SessionBackend):
+    """
+    Các session đang hoạt động trong RAM, có giới hạn:
+    - mỗi session giữ tối đa max_messages tin nhắn mới nhất
+    - tối đa max_sessions session trong RAM; session dùng lâu nhất (LRU) hoặc nhàn rỗi quá
+      idle_seconds bị ghi ra store (SQLite) và nạp lại trong suốt ở tin nhắn tiếp theo
+
+    State chỉ nằm trong process (SESSION_BACKEND=memory) - nhiều worker cần backend dùng chung.
+
+    Usage:
+        sessions = SessionManager()
+        session = sessions.load(session_id)     # RAM → store → tạo mới
+        ...                                     # chạy lượt chat
+        sessions.append_turn(session, user_message, [human, ai])
+    """
+
+    def __init__(self, store: Optional[CacheStore] = None, max_sessions: Optional[int] = None,
+                 max_messages: Optional[int] = None, idle_seconds: Optional[float] = None):
+        # `is None` chứ không `or`: store rỗng có len() == 0
+        self.store = store if store is not None else SQLiteStore(
+            os.getenv('SESSION_SPILL_PATH', DEFAULT_SESSION_SPILL_PATH), table="sessions"
+        )
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_MAX_RESIDENT', '1000'))
+        self.max_messages = max_messages or max_session_messages()
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv('SESSION_IDLE_SECONDS', '1800'))
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def load(self, session_id: str) -> ChatSession:
+        """Session trong RAM, hoặc nạp lại từ store, hoặc tạo mới"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id) or ChatSession(session_id)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_active = time.time()
+            self._evict(keep=session_id)
+        return session
+
+    def append_turn(self, session: ChatSession, user_message: str, messages: List[BaseMessage]) -> None:
+        """Thêm lượt vào session (cắt về max_messages), đánh dấu vừa dùng"""
+        with self._lock:
+            session.append(user_message, messages)
+            session.trim(self.max_messages)
+            if session.session_id not in self._sessions:
+                # Bị evict trong lúc đang chạy lượt → bản trong RAM là bản mới nhất
+                self._sessions[session.session_id] = session
+                self.store.delete(session.session_id)
+            self._sessions.move_to_end(session.session_id)
+            self._evict(keep=session.session_id)
+
+    def save_summary(self, session_id: str, summary: str, through_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return session.fold(summary, through_id)
+            # Đã bị spill → sửa bản trong store
+            value = self.store.get(session_id)
+            if value is None:
+                return False
+            session = ChatSession.from_dict(json.loads(value))
+            if not session.fold(summary, through_id):
+                return False
+            self.store.set(session_id, json.dumps(session.to_dict(), ensure_ascii=False))
+            return True
+
+    def clear(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+        if self.store.get(session_id) is not None:
+            self.store.delete(session_id)
+            removed = True
+        return removed
+
+    # ==================== SPILL ====================
+
+    def _load(self, session_id: str) -> Optional[ChatSession]:
+        value = self.store.get(session_id)
+        if value is None:
+            return None
+        try:
+            session = ChatSession.from_dict(json.loads(value))
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"⚠️ Session {session_id} lỗi khi nạp lại: {str(e)}")
+            return None
+        self.store.delete(session_id)
+        self.reloads += 1
+        return session
+
+    def _spill(self, session: ChatSession):
+        self.store.set(session.session_id, json.dumps(session.to_dict(), ensure_ascii=False))
+        self.evictions += 1
+
+    def _evict(self, keep: Optional[str] = None):
+        """Ghi ra store các session LRU vượt max_sessions và session nhàn rỗi (bỏ qua session đang chạy / `keep`)"""
+        now = time.time()
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            over_capacity = len(self._sessions) > self.max_sessions
+            idle = self.idle_seconds > 0 and now - session.last_active > self.idle_seconds
+            if not over_capacity and not idle:
+                # OrderedDict theo thứ tự dùng gần nhất → các session sau còn mới hơn
+                break
+            if session_id == keep:
+                continue
+            self._spill(self._sessions.pop(session_id))
+
+    def close(self):
+        self.spill_all()
+
+    def spill_all(self):
+        """Ghi mọi session ra store (VD: khi tắt worker)"""
+        with self._lock:
+            while self._sessions:
+                _, session = self._sessions.popitem(last=False)
+                self._spill(session)
+
+    # ==================== STATS ====================
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = [session.memory_bytes() for session in self._sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "spilled_sessions": len(self.store),
+            "memory_bytes": sum(sizes),
+            "avg_session_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+            "max_session_bytes": max(sizes, default=0),
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+            "max_sessions": self.max_sessions,
+            "max_messages": self.max_messages
+        }
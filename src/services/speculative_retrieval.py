@@ -0,0 +1,115 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.text_normalizer import nfc_lower
+
+
+class SpeculativeRetrieval:
+    """
+    Vector search chạy trước (trên tin nhắn thô) trong lúc router gọi LLM phân tích intent.
+
+    Có cùng API search với VectorStoreService: query đã được prefetch thì lấy kết quả
+    đang chạy / đã xong, query khác thì gọi thẳng vector service. Các nhánh không
+    được dùng bị hủy (hoặc bỏ qua kết quả nếu đã chạy) bằng discard().
+
+    Usage:
+        retrieval = SpeculativeRetrieval(vector_service, executor)
+        retrieval.prefetch("medical", "similarity_search", user_message, k=3)
+        ...
+        docs = retrieval.similarity_search(user_message, k=3)   # dùng kết quả đã prefetch
+        retrieval.discard(keep="medical")
+    """
+
+    def __init__(self, vector_service, executor: Optional[ThreadPoolExecutor] = None):
+        self.vector_service = vector_service
+        self.executor = executor
+        # key → (branch, Future | asyncio.Task)
+        self._pending: Dict[Tuple, Tuple[str, Any]] = {}
+        self.hits = 0
+
+    def __getattr__(self, name: str):
+        # Các thuộc tính khác (vector_store, embeddings, ...) lấy từ vector service
+        if name == 'vector_service':
+            raise AttributeError(name)
+        return getattr(self.vector_service, name)
+
+    @staticmethod
+    def _key(method: str, query: str, k: int, filter_dict: Optional[dict] = None) -> Tuple:
+        method = method.removeprefix('a')
+        filter_key = tuple(sorted((filter_dict or {}).items()))
+        return method, nfc_lower(query).strip(), k, filter_key
+
+    # ==================== PREFETCH ====================
+
+    def prefetch(self, branch: str, method: str, query: str, k: int, filter_dict: Optional[dict] = None):
+        """Chạy search sync trong thread pool"""
+        key = self._key(method, query, k, filter_dict)
+        if key in self._pending or self.executor is None:
+            return
+        kwargs = {'k': k} if filter_dict is None else {'k': k, 'filter_dict': filter_dict}
+        # copy_context: search trong thread vẫn ghi span vào trace của lượt chat
+        future = self.executor.submit(copy_context().run, getattr(self.vector_service, method), query, **kwargs)
+        self._pending[key] = (branch, future)
+
+    def aprefetch(self, branch: str, method: str, query: str, k: int, filter_dict: Optional[dict] = None):
+        """Chạy search async (task trên event loop hiện tại)"""
+        key = self._key(method, query, k, filter_dict)
+        if key in self._pending:
+            return
+        kwargs = {'k': k} if filter_dict is None else {'k': k, 'filter_dict': filter_dict}
+        task = asyncio.create_task(getattr(self.vector_service, f"a{method}")(query, **kwargs))
+        self._pending[key] = (branch, task)
+
+    def _take(self, method: str, query: str, k: int, filter_dict: Optional[dict] = None):
+        entry = self._pending.pop(self._key(method, query, k, filter_dict), None)
+        if entry is None or entry[1].cancelled():
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def discard(self, keep: Optional[str] = None):
+        """Hủy các search của nhánh khác `keep` (keep=None → hủy tất cả)"""
+        discarded = [key for key, (branch, _) in self._pending.items() if branch != keep]
+        for key in discarded:
+            _, job = self._pending.pop(key)
+            job.cancel()
+            if isinstance(job, asyncio.Task):
+                # Tránh warning "exception was never retrieved"
+                job.add_done_callback(lambda t: t.cancelled() or t.exception())
+        if discarded:
+            print(f"🗑️ Speculative retrieval: bỏ {len(discarded)} search (giữ nhánh: {keep})")
+
+    # ==================== SEARCH API ====================
+
+    def similarity_search(self, query: str, k: int = 4):
+        job = self._take("similarity_search", query, k)
+        if job is not None:
+            return job.result()
+        return self.vector_service.similarity_search(query, k=k)
+
+    def similarity_search_with_filter_and_scores(self, query: str, k: int = 4, filter_dict: dict = None):
+        job = self._take("similarity_search_with_filter_and_scores", query, k, filter_dict)
+        if job is not None:
+            return job.result()
+        return self.vector_service.similarity_search_with_filter_and_scores(query, k=k, filter_dict=filter_dict)
+
+    async def _await(self, job):
+        if isinstance(job, Future):
+            return await asyncio.wrap_future(job)
+        return await job
+
+    async def asimilarity_search(self, query: str, k: int = 4):
+        job = self._take("similarity_search", query, k)
+        if job is not None:
+            return await self._await(job)
+        return await self.vector_service.asimilarity_search(query, k=k)
+
+    async def asimilarity_search_with_filter_and_scores(self, query: str, k: int = 4, filter_dict: dict = None):
+        job = self._take("similarity_search_with_filter_and_scores", query, k, filter_dict)
+        if job is not None:
+            return await self._await(job)
+        return await self.vector_service.asimilarity_search_with_filter_and_scores(
+            query, k=k, filter_dict=filter_dict
+        )
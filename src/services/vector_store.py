@@ -12,14 +12,28 @@ from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from typing import List
+from typing import List, Optional
 from src.models.llm import get_embeddings
+from src.knowledge import build_indication_index
+from src.utils.tracing import traced_search
+import asyncio
 import json
 import shutil
 
 load_dotenv()
 
 
+# Chroma trả về khoảng cách → quy về độ tương đồng cosine [0, 1]
+DISTANCE_SPACE = "cosine"
+
+# Ngưỡng relevance theo nguồn (filename) - hit thấp hơn bị bỏ ngay sau search
+RELEVANCE_THRESHOLD_ENV = {
+    'medicines.json': 'RELEVANCE_THRESHOLD_MEDICINES',
+    'medical_personnel.json': 'RELEVANCE_THRESHOLD_PERSONNEL',
+    'symptoms.json': 'RELEVANCE_THRESHOLD_SYMPTOMS',
+}
+
+
 class VectorStoreService:
     """Service for managing vector store operations"""
 
@@ -38,6 +52,14 @@ class VectorStoreService:
             chunk_overlap=chunk_overlap,
         )
         self.vector_store = None
+        self.distance_space = DISTANCE_SPACE
+        
+        default_threshold = float(os.getenv('RELEVANCE_THRESHOLD', '0.25'))
+        self.default_threshold = default_threshold
+        self.relevance_thresholds = {
+            filename: float(os.getenv(env_key, str(default_threshold)))
+            for filename, env_key in RELEVANCE_THRESHOLD_ENV.items()
+        }
 
     def create_vector_store(self, documents: List[Document]):
         """Create vector store from documents"""
@@ -59,7 +81,16 @@ class VectorStoreService:
             documents=all_documents,
             embedding=self.embeddings,
             persist_directory=vector_store_path,
+            collection_metadata={"hnsw:space": DISTANCE_SPACE},
         )
+        self.distance_space = DISTANCE_SPACE
+        
+        # ⚡ Bảng embedding chỉ định thuốc cho pre-screen validation (tính một lần lúc ingest)
+        if any(doc.metadata.get('filename') == 'medicines.json' for doc in json_docs):
+            try:
+                build_indication_index(self.embeddings)
+            except Exception as e:
+                print(f"⚠️ Không build được indication index: {str(e)}")
         return self.vector_store
 
     def load_vector_store(self):
@@ -73,11 +104,53 @@ class VectorStoreService:
             self.vector_store = Chroma(
                 persist_directory=vector_store_path,
                 embedding_function=self.embeddings,
+                collection_metadata={"hnsw:space": DISTANCE_SPACE},
             )
+            # Store cũ build với L2: space không đổi được khi mở lại → quy đổi theo space thật
+            self.distance_space = self._collection_space()
+            if self.distance_space != DISTANCE_SPACE:
+                print(f"⚠️ Vector store dùng space '{self.distance_space}', nên rebuild để dùng cosine "
+                      f"(python src/services/vector_store.py)")
             return self.vector_store
         except Exception as e:
             raise e
 
+    def _collection_space(self) -> str:
+        try:
+            hnsw = self.vector_store._collection.configuration.get("hnsw") or {}
+            return hnsw.get("space") or "l2"
+        except Exception:
+            metadata = self.vector_store._collection.metadata or {}
+            return metadata.get("hnsw:space", "l2")
+
+    # ==================== RELEVANCE ====================
+
+    def to_similarity(self, distance: float) -> float:
+        """Khoảng cách Chroma → độ tương đồng cosine trong [0, 1]"""
+        if self.distance_space == "l2":
+            # Embedding OpenAI đã chuẩn hóa độ dài: ||a - b||² = 2 - 2cos
+            similarity = 1.0 - distance / 2.0
+        else:
+            # cosine / ip: distance = 1 - cos
+            similarity = 1.0 - distance
+        return min(1.0, max(0.0, similarity))
+
+    def relevance_threshold(self, doc: Document) -> float:
+        return self.relevance_thresholds.get(doc.metadata.get('filename'), self.default_threshold)
+
+    def _calibrate(self, results: List[tuple]) -> List[tuple]:
+        """[(doc, distance)] → [(doc, similarity)], bỏ các hit dưới ngưỡng của nguồn"""
+        scored = [(doc, self.to_similarity(distance)) for doc, distance in results]
+        relevant = [(doc, score) for doc, score in scored if score >= self.relevance_threshold(doc)]
+        if len(relevant) < len(scored):
+            print(f"🔻 Relevance: bỏ {len(scored) - len(relevant)}/{len(scored)} hit dưới ngưỡng")
+        return relevant
+
+    def _search_with_relevance(self, query: str, k: int = 4, filter_dict: Optional[dict] = None) -> List[tuple]:
+        if not self.vector_store:
+            self.load_vector_store()
+        return self._calibrate(self.vector_store.similarity_search_with_score(query, k=k, filter=filter_dict))
+
     def get_retriever(self, search_type: str = "similarity", k: int = 4):
         """
         Tạo retriever từ vector store
@@ -97,23 +170,20 @@ class VectorStoreService:
             search_kwargs={"k": k}
         )
 
+    @traced_search
     def similarity_search(self, query: str, k: int = 4):
-        """Perform similarity search (giữ lại để backward compatible)"""
+        """Perform similarity search (giữ lại để backward compatible) - chỉ các hit qua ngưỡng relevance"""
         try:
-            if not self.vector_store:
-                self.load_vector_store()
-            return self.vector_store.similarity_search(query, k=k)
+            return [doc for doc, _ in self._search_with_relevance(query, k=k)]
         except Exception as e:
             if "key_model_access_denied" in str(e):
                 print(f"❌ Lỗi model embedding: {os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME', 'text-embedding-ada-002')}")
             raise e
 
+    @traced_search
     def retrieve_with_score(self, query: str, k: int = 4):
-        """Retrieve documents with relevance scores"""
-        if not self.vector_store:
-            self.load_vector_store()
-        
-        return self.vector_store.similarity_search_with_score(query, k=k)
+        """Retrieve documents with relevance scores (similarity [0, 1], đã lọc theo ngưỡng)"""
+        return self._search_with_relevance(query, k=k)
 
     def need_update(self, documents: List[Document]) -> bool:
         """Kiểm tra xem vector store có cần cập nhật không"""
@@ -141,27 +211,23 @@ class VectorStoreService:
         # Tạo mới
         return self.create_vector_store(documents)
 
+    @traced_search
     def similarity_search_with_scores(self, query: str, k: int = 4):
         """
         Perform similarity search with cosine similarity scores
         
         Returns:
-            List of (Document, score) tuples
+            List of (Document, score) tuples - score là similarity [0, 1], hit dưới ngưỡng đã bị bỏ
         """
         try:
-            if not self.vector_store:
-                self.load_vector_store()
-            
-            # Lấy kết quả kèm scores
-            results = self.vector_store.similarity_search_with_score(query, k=k)
-            
             # results = [(doc1, 0.85), (doc2, 0.72), ...]
-            return results
+            return self._search_with_relevance(query, k=k)
         except Exception as e:
             if "key_model_access_denied" in str(e):
                 print(f"❌ Lỗi model embedding: {os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME', 'text-embedding-ada-002')}")
             raise e
 
+    @traced_search
     def similarity_search_with_filter(self, query: str, k: int = 4, filter_dict: dict = None):
         """
         Similarity search với metadata filtering
@@ -190,6 +256,7 @@ class VectorStoreService:
             print(f"⚠️ Lỗi search with filter: {str(e)}")
             return []
     
+    @traced_search
     def similarity_search_with_filter_and_scores(self, query: str, k: int = 4, filter_dict: dict = None):
         """
         Similarity search với metadata filtering + scores
@@ -200,23 +267,59 @@ class VectorStoreService:
             filter_dict: Metadata filter
             
         Returns:
-            List of (Document, score) tuples
+            List of (Document, score) tuples - score là similarity [0, 1], hit dưới ngưỡng đã bị bỏ
         """
         try:
-            if not self.vector_store:
-                self.load_vector_store()
-            
-            results = self.vector_store.similarity_search_with_score(
-                query,
-                k=k,
-                filter=filter_dict
-            )
-            
-            return results
+            return self._search_with_relevance(query, k=k, filter_dict=filter_dict)
         except Exception as e:
             print(f"⚠️ Lỗi search with filter and scores: {str(e)}")
             return []
     
+    # ==================== ASYNC API ====================
+
+    @traced_search
+    async def _asearch_by_vector_with_scores(self, query: str, k: int = 4, filter_dict: dict = None):
+        """
+        Async search: embedding gọi API bất đồng bộ, query Chroma (local) chạy trong executor
+
+        Returns:
+            List of (Document, score) tuples - score là similarity [0, 1], hit dưới ngưỡng đã bị bỏ
+        """
+        if not self.vector_store:
+            self.load_vector_store()
+        
+        embedding = await self.embeddings.aembed_query(query)
+        # langchain_chroma trả về khoảng cách thô (dù tên là relevance_scores) → calibrate như bản sync
+        results = await asyncio.to_thread(
+            self.vector_store.similarity_search_by_vector_with_relevance_scores,
+            embedding,
+            k=k,
+            filter=filter_dict
+        )
+        return self._calibrate(results)
+
+    async def asimilarity_search(self, query: str, k: int = 4):
+        """Async version của similarity_search"""
+        results = await self.asimilarity_search_with_scores(query, k=k)
+        return [doc for doc, _ in results]
+
+    async def asimilarity_search_with_scores(self, query: str, k: int = 4):
+        """Async version của similarity_search_with_scores"""
+        try:
+            return await self._asearch_by_vector_with_scores(query, k=k)
+        except Exception as e:
+            if "key_model_access_denied" in str(e):
+                print(f"❌ Lỗi model embedding: {os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME', 'text-embedding-ada-002')}")
+            raise e
+
+    async def asimilarity_search_with_filter_and_scores(self, query: str, k: int = 4, filter_dict: dict = None):
+        """Async version của similarity_search_with_filter_and_scores"""
+        try:
+            return await self._asearch_by_vector_with_scores(query, k=k, filter_dict=filter_dict)
+        except Exception as e:
+            print(f"⚠️ Lỗi async search with filter and scores: {str(e)}")
+            return []
+    
     def _process_medicines_json(self, file_path: str, filename: str) -> List[Document]:
         """Process medicines.json - Đảm bảo lưu đầy đủ metadata"""
         try:
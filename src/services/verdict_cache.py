@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from src.models.llm_cache import CacheStore, create_cache_store
+from src.utils.text_normalizer import fold_text
+
+
+MEDICINES_PATH = os.path.join(os.getenv('DOCUMENTS_PATH', './data/documents'), 'medicines.json')
+
+
+def corpus_version(path: str = MEDICINES_PATH) -> str:
+    """Version của medicines.json (hash nội dung) - dữ liệu thuốc đổi thì verdict cũ tự hết hiệu lực"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return "unknown"
+
+
+def normalize_symptoms(symptoms: Iterable[str]) -> List[str]:
+    """Tập triệu chứng chuẩn hóa: không dấu, bỏ trùng, sắp xếp"""
+    return sorted({' '.join(fold_text(s).split()) for s in symptoms if len(s.strip()) >= 2})
+
+
+class VerdictCache:
+    """
+    Cache verdict validation thuốc (PHÙ HỢP / KHÔNG PHÙ HỢP + lý do).
+
+    Key: (tập triệu chứng chuẩn hóa, tên thuốc, version corpus thuốc).
+    Tập nhiều triệu chứng chưa có trong cache được suy ra từ verdict từng triệu chứng:
+    thuốc phù hợp nếu điều trị trực tiếp ít nhất một triệu chứng.
+    """
+
+    def __init__(self, store: CacheStore, version: str):
+        self.store = store
+        self.version = version
+
+    def _key(self, symptoms: List[str], medicine: str) -> str:
+        return f"{self.version}|{fold_text(medicine).strip()}|{','.join(symptoms)}"
+
+    def _get(self, symptoms: List[str], medicine: str) -> Optional[Tuple[bool, str]]:
+        value = self.store.get(self._key(symptoms, medicine))
+        if value is None:
+            return None
+        try:
+            data = json.loads(value)
+            return bool(data["fit"]), data.get("reason", "")
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return None
+
+    def get(self, symptoms: Iterable[str], medicine: str) -> Optional[Tuple[bool, str]]:
+        symptoms = normalize_symptoms(symptoms)
+        if not symptoms:
+            return None
+
+        verdict = self._get(symptoms, medicine)
+        if verdict is not None or len(symptoms) == 1:
+            return verdict
+
+        # Suy ra từ verdict từng triệu chứng (chỉ khi đủ tất cả)
+        singles = [self._get([symptom], medicine) for symptom in symptoms]
+        if any(single is None for single in singles):
+            return None
+        fits = [reason for fit, reason in singles if fit]
+        return (True, fits[0]) if fits else (False, singles[0][1])
+
+    def set(self, symptoms: Iterable[str], medicine: str, fit: bool, reason: str = "") -> None:
+        symptoms = normalize_symptoms(symptoms)
+        if symptoms:
+            self.store.set(self._key(symptoms, medicine),
+                           json.dumps({"fit": fit, "reason": reason}, ensure_ascii=False))
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+
+@lru_cache(maxsize=1)
+def get_verdict_cache() -> Optional[VerdictCache]:
+    """
+    Verdict cache dùng chung (SQLite, giữ qua restart)
+
+    Cấu hình qua .env: VERDICT_CACHE, VERDICT_CACHE_PATH
+    """
+    if os.getenv('VERDICT_CACHE', 'true').lower() != 'true':
+        return None
+
+    store = create_cache_store(
+        backend="sqlite",
+        path=os.getenv('VERDICT_CACHE_PATH', './data/cache/verdict_cache.sqlite'),
+        table="verdict_cache"
+    )
+    cache = VerdictCache(store, corpus_version())
+    print(f"✅ Verdict cache: {len(cache)} verdicts (corpus {cache.version})")
+    return cache
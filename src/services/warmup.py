@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from src.agents.patient_state import PatientState
+from src.services.vector_store import VectorStoreService
+from src.utils.document_loader import DocumentLoader
+from src.utils.tracing import write_trace_log
+
+
+DEFAULT_DOCUMENTS_PATH = "./data/documents"
+
+# Câu hỏi mẫu phủ các nhánh chính: triệu chứng, bác sĩ, thuốc, chào hỏi
+DEFAULT_WARMUP_QUERIES = [
+    "tôi bị sốt và đau đầu",
+    "tôi bị đau bụng nên gặp bác sĩ nào",
+    "bị ho thì uống thuốc gì",
+    "xin chào"
+]
+
+
+def warmup_queries() -> List[str]:
+    """WARMUP_QUERIES (phân cách bằng |) hoặc bộ câu hỏi mặc định"""
+    queries = [q.strip() for q in os.getenv('WARMUP_QUERIES', '').split('|') if q.strip()]
+    return queries or DEFAULT_WARMUP_QUERIES
+
+
+def _enabled(key: str) -> bool:
+    return os.getenv(key, 'true').lower() == 'true'
+
+
+def load_or_build_vector_store(vector_service: VectorStoreService, folder_path: str = DEFAULT_DOCUMENTS_PATH):
+    """Load vector store, chưa có thì tạo từ documents"""
+    try:
+        vector_service.load_vector_store()
+    except Exception:
+        if os.path.exists(folder_path):
+            use_unstructured = os.getenv('USE_UNSTRUCTURED', 'false').lower() == 'true'
+            documents = DocumentLoader(use_unstructured=use_unstructured).load_documents_from_folder(folder_path)
+            if documents:
+                vector_service.create_vector_store(documents)
+
+
+class WarmupReport:
+    """Thời gian từng bước warm-up (ms), lỗi nếu có; ready khi xong và đã có vector store"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.steps: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.total_ms: Optional[float] = None
+        self.ready = False
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def step(self, name: str):
+        """Đo một bước; lỗi được ghi lại, không dừng các bước sau"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"⚠️ Warm-up '{name}' lỗi: {str(e)}")
+        finally:
+            self.steps[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def finish(self, vector_service: VectorStoreService) -> "WarmupReport":
+        self.total_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        self.ready = vector_service.vector_store is not None
+        steps = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.steps.items())
+        print(f"{'🔥' if self.ready else '❌'} Warm-up {self.total_ms:.0f} ms ({steps})")
+        # Theo dõi cold start qua các lần deploy (WARMUP_LOG_PATH, rỗng = tắt)
+        write_trace_log({"event": "warmup", **self.to_dict()}, os.getenv('WARMUP_LOG_PATH', './logs/warmup.jsonl'))
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "steps": self.steps,
+            "errors": self.errors
+        }
+
+
+def _embed_and_search(report: WarmupReport, vector_service: VectorStoreService, queries: List[str]):
+    # Embedding của câu hỏi mẫu vào cache, kết nối tới endpoint embedding được mở sẵn
+    with report.step("embeddings"):
+        for query in queries:
+            vector_service.embeddings.embed_query(query)
+    # HNSW index của Chroma được nạp vào RAM ở lần search đầu
+    with report.step("search"):
+        for query in queries:
+            vector_service.similarity_search_with_scores(query, k=4)
+
+
+def warm_up(vector_service: VectorStoreService, router=None, llm=None, queries: Optional[List[str]] = None,
+            folder_path: str = DEFAULT_DOCUMENTS_PATH) -> WarmupReport:
+    """
+    Warm-up trước khi nhận người dùng (sync - app.py, warm_up.py):
+        vector_store  load index (chưa có thì build từ documents)
+        embeddings    embed câu hỏi mẫu (mở kết nối, điền cache embedding)
+        search        search câu hỏi mẫu (nạp HNSW index)
+        llm           một call rất nhỏ (mở kết nối TLS trong pool dùng chung)
+        router        route câu hỏi mẫu (knowledge index, LLM cache, verdict cache) - tắt bằng WARMUP_ROUTER=false
+
+    WARMUP=false → chỉ load index.
+    """
+    queries = queries or warmup_queries()
+    report = WarmupReport()
+
+    with report.step("vector_store"):
+        load_or_build_vector_store(vector_service, folder_path)
+    if not _enabled('WARMUP'):
+        return report.finish(vector_service)
+    if vector_service.vector_store is not None:
+        _embed_and_search(report, vector_service, queries)
+    if llm is not None:
+        with report.step("llm"):
+            llm.bind(max_tokens=1).invoke("ping")
+    if router is not None and _enabled('WARMUP_ROUTER'):
+        with report.step("router"):
+            for query in queries:
+                router.route(query, "", query, patient_state=PatientState())
+    return report.finish(vector_service)
+
+
+async def awarm_up(vector_service: VectorStoreService, router=None, llm=None, queries: Optional[List[str]] = None,
+                   folder_path: str = DEFAULT_DOCUMENTS_PATH) -> WarmupReport:
+    """Như warm_up cho server: LLM call và router chạy async để mở kết nối của client async trong event loop"""
+    queries = queries or warmup_queries()
+    report = WarmupReport()
+
+    with report.step("vector_store"):
+        await asyncio.to_thread(load_or_build_vector_store, vector_service, folder_path)
+    if not _enabled('WARMUP'):
+        return report.finish(vector_service)
+    if vector_service.vector_store is not None:
+        await asyncio.to_thread(_embed_and_search, report, vector_service, queries)
+    if llm is not None:
+        with report.step("llm"):
+            await llm.bind(max_tokens=1).ainvoke("ping")
+    if router is not None and _enabled('WARMUP_ROUTER'):
+        with report.step("router"):
+            await asyncio.gather(*[
+                router.aroute(query, "", query, patient_state=PatientState()) for query in queries
+            ])
+    return report.finish(vector_service)
@@ -1,44 +1,82 @@
 from typing import Optional, List
 from src.services.vector_store import VectorStoreService
+from src.knowledge.department_index import DepartmentIndex, get_department_index
+from src.knowledge.medicine_index import MedicineIndex, get_medicine_index
 
 
 class MedicalTools:
     """Collection of tools for medical assistant"""
     
-    def __init__(self, vector_service: VectorStoreService):
+    def __init__(self, vector_service: VectorStoreService, department_index: Optional[DepartmentIndex] = None,
+                 medicine_index: Optional[MedicineIndex] = None):
         self.vector_service = vector_service
+        # ⚡ Index khoa/bác sĩ build sẵn: tra chuyên khoa không cần vector search
+        self.department_index = department_index or get_department_index()
+        # ⚡ Name index thuốc: tra tên / biệt dược là tra dictionary, không cần embedding
+        self.medicine_index = medicine_index or get_medicine_index()
     
-    def search_doctors_by_specialty(self, specialty: str) -> str:
+    def search_doctors_by_specialty(self, specialty: str, retrieval=None) -> str:
         """
         Tìm bác sĩ theo chuyên khoa.
         
         Args:
             specialty: Tên chuyên khoa (VD: "Tim mạch", "Tiêu hóa", "Da liễu")
+            retrieval: Speculative retrieval của lượt chat (nếu có), mặc định vector service
             
         Returns:
             Danh sách bác sĩ
         """
         try:
-            results = self.vector_service.similarity_search_with_filter_and_scores(
+            departments = self.department_index.lookup(specialty)
+            if departments:
+                return self._format_departments(departments)
+            
+            results = (retrieval or self.vector_service).similarity_search_with_filter_and_scores(
                 query=specialty,
                 k=5,
                 filter_dict={"filename": "medical_personnel.json"}
             )
+            return self._format_doctors(specialty, results)
             
-            if not results:
-                return f"Không tìm thấy bác sĩ chuyên khoa {specialty}"
-            
-            # Format output
-            doctors_info = []
-            for doc, score in results[:3]:
-                dept_name = doc.metadata.get('department_name', 'N/A')
-                doctors_info.append(f"**{dept_name}**\n{doc.page_content}")
+        except Exception as e:
+            return f"Lỗi tìm bác sĩ: {str(e)}"
+    
+    async def asearch_doctors_by_specialty(self, specialty: str, retrieval=None) -> str:
+        """Async version của search_doctors_by_specialty"""
+        try:
+            departments = await self.department_index.alookup(specialty)
+            if departments:
+                return self._format_departments(departments)
             
-            return "\n\n".join(doctors_info)
+            results = await (retrieval or self.vector_service).asimilarity_search_with_filter_and_scores(
+                query=specialty,
+                k=5,
+                filter_dict={"filename": "medical_personnel.json"}
+            )
+            return self._format_doctors(specialty, results)
             
         except Exception as e:
             return f"Lỗi tìm bác sĩ: {str(e)}"
     
+    def _format_doctors(self, specialty: str, results) -> str:
+        """Format kết quả tìm bác sĩ"""
+        if not results:
+            return f"Không tìm thấy bác sĩ chuyên khoa {specialty}"
+        
+        doctors_info = []
+        for doc, score in results[:3]:
+            dept_name = doc.metadata.get('department_name', 'N/A')
+            doctors_info.append(f"**{dept_name}**\n{doc.page_content}")
+        
+        return "\n\n".join(doctors_info)
+    
+    def _format_departments(self, departments) -> str:
+        """Format kết quả tra department index (cùng dạng với _format_doctors)"""
+        return "\n\n".join(
+            f"**{department['department_name']}**\n{department['content']}"
+            for department, score in departments
+        )
+    
     def _format_medicine_info(self, doc) -> str:
         """Helper method để format thông tin thuốc bao gồm nguồn"""
         medicine_name = doc.metadata.get('item_name', 'Thuốc')
@@ -84,30 +122,59 @@ class MedicalTools:
         Returns:
             Thông tin chi tiết về thuốc
         """
+        doc = self._lookup_medicine(medicine_name)
+        if doc is not None:
+            return self._format_medicine_info(doc)
+        
         try:
             results = self.vector_service.similarity_search_with_filter_and_scores(
                 query=medicine_name,
                 k=3,
                 filter_dict={"filename": "medicines.json"}
             )
+            return self._match_medicine_result(medicine_name, results)
             
-            if not results:
-                return f"Không tìm thấy thông tin về thuốc {medicine_name}"
-            
-            # Lấy kết quả có score cao nhất
-            best_doc, best_score = results[0]
-            found_name = best_doc.metadata.get('item_name', '')
-            
-            # Kiểm tra xem tên có match không (case-insensitive)
-            if medicine_name.lower() in found_name.lower():
-                # ✅ Sử dụng helper method để format bao gồm nguồn
-                return self._format_medicine_info(best_doc)
-            else:
-                return f"❌ Không tìm thấy thông tin chính xác về thuốc '{medicine_name}'"
+        except Exception as e:
+            return f"⚠️ Lỗi khi tìm kiếm thuốc: {str(e)}"
+    
+    async def asearch_medicine_by_name(self, medicine_name: str) -> str:
+        """Async version của search_medicine_by_name"""
+        doc = self._lookup_medicine(medicine_name)
+        if doc is not None:
+            return self._format_medicine_info(doc)
+        
+        try:
+            results = await self.vector_service.asimilarity_search_with_filter_and_scores(
+                query=medicine_name,
+                k=3,
+                filter_dict={"filename": "medicines.json"}
+            )
+            return self._match_medicine_result(medicine_name, results)
             
         except Exception as e:
             return f"⚠️ Lỗi khi tìm kiếm thuốc: {str(e)}"
     
+    def _lookup_medicine(self, medicine_name: str):
+        """Document thuốc từ name index (tên chuẩn, hoạt chất, biệt dược, tên gõ dở) - None thì dùng vector search"""
+        name = self.medicine_index.resolve_name(medicine_name)
+        return self.medicine_index.document(name) if name else None
+    
+    def _match_medicine_result(self, medicine_name: str, results) -> str:
+        """Chọn kết quả khớp tên thuốc và format"""
+        if not results:
+            return f"Không tìm thấy thông tin về thuốc {medicine_name}"
+        
+        # Lấy kết quả có score cao nhất
+        best_doc, best_score = results[0]
+        found_name = best_doc.metadata.get('medicine_name') or best_doc.metadata.get('item_name', '')
+        
+        # Kiểm tra xem tên có match không (case-insensitive)
+        if medicine_name.lower() in found_name.lower():
+            # ✅ Sử dụng helper method để format bao gồm nguồn
+            return self._format_medicine_info(best_doc)
+        else:
+            return f"❌ Không tìm thấy thông tin chính xác về thuốc '{medicine_name}'"
+    
     def search_symptoms_info(self, symptom: str) -> str:
         """
         Tìm thông tin về triệu chứng và bệnh lý.
@@ -0,0 +1,75 @@
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Automaton Aho–Corasick: tìm tất cả pattern trong text với một lần duyệt.
+
+    Usage:
+        automaton = AhoCorasick()
+        automaton.add("dau dau", "Đau đầu")
+        automaton.build()
+        for start, end, value in automaton.iter_matches("toi bi dau dau"):
+            ...
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Mỗi node: danh sách (độ dài pattern, value) kết thúc tại node
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+
+    def __len__(self) -> int:
+        return sum(len(outputs) for outputs in self._output)
+
+    def add(self, pattern: str, value: Any):
+        """Thêm pattern (phải build() lại trước khi match)"""
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(pattern), value))
+        self._built = False
+
+    def build(self):
+        """Tính failure links (BFS)"""
+        queue = deque()
+        for node in self._goto[0].values():
+            self._fail[node] = 0
+            queue.append(node)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yield (start, end, value) cho mọi pattern xuất hiện trong text"""
+        if not self._built:
+            self.build()
+
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, value in self._output[node]:
+                yield i - length + 1, i + 1, value
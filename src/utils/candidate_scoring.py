@@ -0,0 +1,149 @@
+import unicodedata
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@lru_cache(maxsize=16384)
+def _lower(text: str) -> str:
+    # Chỉ so khớp chuỗi con, không cần giữ độ dài như nfc_lower → str.lower().
+    # Cache theo nội dung: corpus cố định nên mỗi document chỉ lowercase một lần mỗi process
+    return unicodedata.normalize('NFC', text).lower()
+
+
+class CandidateBatch:
+    """
+    Kết quả search của nhiều query gộp thành mảng để tính điểm bằng NumPy.
+
+    Mỗi kết quả i: query_ids[i] (query nào trả về), doc_ids[i] (document khác nhau, theo nội dung),
+    item_ids[i] (key gộp: tên thuốc / tên khoa), scores[i] (điểm search).
+    Text của document chỉ lowercase một lần, phép "query có trong text" chỉ tính cho các cặp
+    (query, document) khác nhau thực sự xuất hiện thay vì từng kết quả.
+
+    Usage:
+        batch = CandidateBatch.from_results(keyword_results, lambda doc: doc.metadata.get('item_name'))
+        totals = batch.scores + batch.query_bonus(lambda doc: doc.page_content, 0.2)
+        ranked = batch.top(totals, n=5)     # [(doc, total)] mỗi item một kết quả tốt nhất
+    """
+
+    def __init__(self):
+        self.queries: List[str] = []
+        self.docs: List[Any] = []
+        self.items: List[str] = []
+        self.query_ids = np.zeros(0, dtype=np.int32)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.item_ids = np.zeros(0, dtype=np.int32)
+        self.scores = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @classmethod
+    def from_results(cls, query_results: List[Tuple[str, List[tuple]]],
+                     item_key: Callable[[Any], Optional[str]]) -> "CandidateBatch":
+        """
+        Args:
+            query_results: [(query, [(doc, score)])]
+            item_key: key gộp của document (None → bỏ kết quả)
+        """
+        batch = cls()
+        doc_index: Dict[Tuple[str, str], int] = {}
+        item_index: Dict[str, int] = {}
+        query_index: Dict[str, int] = {}
+        query_ids, doc_ids, item_ids, scores = [], [], [], []
+
+        for query, results in query_results:
+            query_id = query_index.get(query)
+            if query_id is None:
+                query_id = query_index[query] = len(batch.queries)
+                batch.queries.append(query)
+            for doc, score in results:
+                item = item_key(doc)
+                if not item:
+                    continue
+                doc_id = doc_index.get((item, doc.page_content))
+                if doc_id is None:
+                    doc_id = doc_index[(item, doc.page_content)] = len(batch.docs)
+                    batch.docs.append(doc)
+                # id theo thứ tự xuất hiện đầu tiên → dùng làm tie-break khi xếp hạng
+                item_id = item_index.get(item)
+                if item_id is None:
+                    item_id = item_index[item] = len(batch.items)
+                    batch.items.append(item)
+                query_ids.append(query_id)
+                doc_ids.append(doc_id)
+                item_ids.append(item_id)
+                scores.append(score)
+
+        batch.query_ids = np.asarray(query_ids, dtype=np.int32)
+        batch.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        batch.item_ids = np.asarray(item_ids, dtype=np.int32)
+        batch.scores = np.asarray(scores, dtype=np.float64)
+        return batch
+
+    # ==================== FEATURES ====================
+
+    def _doc_texts(self, text_of: Callable[[Any], str]) -> List[str]:
+        return [_lower(text_of(doc) or '') for doc in self.docs]
+
+    @staticmethod
+    def contains(needles: List[str], texts: List[str]) -> np.ndarray:
+        """Ma trận bool (needle × text): needle (đã lowercase) nằm trong text"""
+        matrix = np.zeros((len(needles), len(texts)), dtype=bool)
+        for row, needle in enumerate(needles):
+            if needle:
+                matrix[row] = [needle in text for text in texts]
+        return matrix
+
+    def query_bonus(self, text_of: Callable[[Any], str], weight: float) -> np.ndarray:
+        """Bonus cho từng kết quả khi query của nó nằm trong text của document"""
+        if not len(self):
+            return np.zeros(0)
+        needles = [_lower(query) for query in self.queries]
+        texts = self._doc_texts(text_of)
+        # Mỗi cặp (query, document) chỉ kiểm tra một lần
+        doc_count = len(self.docs)
+        pairs, inverse = np.unique(self.query_ids.astype(np.int64) * doc_count + self.doc_ids, return_inverse=True)
+        flags = np.fromiter(
+            (bool(needles[pair // doc_count]) and needles[pair // doc_count] in texts[pair % doc_count]
+             for pair in pairs.tolist()),
+            dtype=bool, count=len(pairs)
+        )
+        return weight * flags[inverse]
+
+    def doc_bonus(self, needles: List[str], text_of: Callable[[Any], str], weight: float) -> np.ndarray:
+        """Bonus cho từng kết quả: weight × số needle nằm trong text của document"""
+        if not len(self):
+            return np.zeros(0)
+        counts = self.contains([_lower(needle) for needle in needles], self._doc_texts(text_of)).sum(axis=0)
+        return weight * counts[self.doc_ids]
+
+    # ==================== RANKING ====================
+
+    def best_per_item(self, totals: np.ndarray) -> np.ndarray:
+        """Index kết quả có tổng điểm cao nhất của mỗi item (hòa điểm → kết quả xuất hiện trước)"""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        order = np.lexsort((-totals, self.item_ids))
+        sorted_items = self.item_ids[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_items[1:] != sorted_items[:-1]
+        return order[first]
+
+    def top(self, totals: np.ndarray, n: int) -> List[Tuple[Any, float]]:
+        """
+        Top n item theo tổng điểm, mỗi item một kết quả tốt nhất
+
+        Returns:
+            [(doc, total)] giảm dần (hòa điểm → item xuất hiện trước)
+        """
+        best = self.best_per_item(totals)
+        values = totals[best]
+        if len(best) > n > 0:
+            # Chỉ sort các ứng viên ≥ điểm thứ n (giữ cả các kết quả hòa điểm ở biên)
+            kth = np.partition(values, len(values) - n)[len(values) - n]
+            keep = values >= kth
+            best, values = best[keep], values[keep]
+        order = np.lexsort((self.item_ids[best], -values))[:n]
+        return [(self.docs[self.doc_ids[i]], float(totals[i])) for i in best[order]]
@@ -0,0 +1,58 @@
+from typing import Any, Dict, List, Optional, Set
+
+
+class PrefixTrie:
+    """
+    Trie tra cứu key chính xác và theo tiền tố, O(độ dài key).
+
+    Mỗi node giữ tập value của mọi key đi qua nó → biết ngay tiền tố có khớp duy nhất không.
+
+    Usage:
+        trie = PrefixTrie()
+        trie.add("paracetamol", "Paracetamol")
+        trie.get("paracetamol")      # "Paracetamol"
+        trie.complete("parac")       # {"Paracetamol"}
+    """
+
+    def __init__(self):
+        self._children: List[Dict[str, int]] = [{}]
+        self._values: List[Optional[Any]] = [None]
+        self._subtree: List[Set[Any]] = [set()]
+
+    def __len__(self) -> int:
+        return sum(1 for value in self._values if value is not None)
+
+    def add(self, key: str, value: Any):
+        if not key:
+            return
+        node = 0
+        self._subtree[0].add(value)
+        for char in key:
+            next_node = self._children[node].get(char)
+            if next_node is None:
+                next_node = len(self._children)
+                self._children[node][char] = next_node
+                self._children.append({})
+                self._values.append(None)
+                self._subtree.append(set())
+            node = next_node
+            self._subtree[node].add(value)
+        self._values[node] = value
+
+    def _walk(self, key: str) -> Optional[int]:
+        node = 0
+        for char in key:
+            node = self._children[node].get(char)
+            if node is None:
+                return None
+        return node
+
+    def get(self, key: str) -> Optional[Any]:
+        """Value của key chính xác"""
+        node = self._walk(key)
+        return self._values[node] if node is not None else None
+
+    def complete(self, prefix: str) -> Set[Any]:
+        """Các value có key bắt đầu bằng prefix"""
+        node = self._walk(prefix)
+        return set(self._subtree[node]) if node is not None else set()
@@ -0,0 +1,34 @@
+import unicodedata
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8192)
+def _fold_char(char: str) -> str:
+    """Một ký tự → một ký tự: bỏ dấu, lowercase, ký tự không phải chữ/số → khoảng trắng"""
+    if char in 'đĐ':
+        return 'd'
+    base = unicodedata.normalize('NFD', char)[0].lower()
+    if not base[:1].isalnum():
+        return ' '
+    return base[0]
+
+
+def nfc_lower(text: str) -> str:
+    """NFC + lowercase, giữ nguyên độ dài chuỗi"""
+    text = unicodedata.normalize('NFC', text)
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def fold_text(text: str) -> str:
+    """
+    Chuẩn hóa text không dấu để so khớp ("Tiêu chảy" → "tieu chay").
+
+    Độ dài giữ nguyên so với nfc_lower(text) nên vị trí match trên text đã fold
+    dùng được trực tiếp trên text gốc.
+    """
+    return ''.join(_fold_char(c) for c in unicodedata.normalize('NFC', text))
+
+
+def is_unaccented(text: str) -> bool:
+    """Text không có dấu (người dùng gõ không dấu)"""
+    return all(_fold_char(c) == c or not c.isalnum() for c in text)
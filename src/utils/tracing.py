@@ -0,0 +1,182 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# Trace của lượt chat hiện tại (thread / asyncio task kế thừa qua context)
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """
+    Các span (node LangGraph, LLM call, vector search) của một lượt chat.
+
+    Mỗi span: {"type", "name", "start_ms", "duration_ms", ...thuộc tính riêng}
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        return round((time.perf_counter() - (since or self._start)) * 1000, 2)
+
+    def add(self, span_type: str, name: str, started: float, **attrs) -> Dict[str, Any]:
+        span = {
+            "type": span_type,
+            "name": name,
+            "start_ms": round((started - self._start) * 1000, 2),
+            "duration_ms": self.elapsed_ms(started),
+            **attrs
+        }
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {"total_ms": self.elapsed_ms(), "spans": spans}
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace():
+    """Bật tracing cho code chạy trong block (route / aroute)"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(span_type: str, name: str, **attrs):
+    """Ghi một span nếu đang có trace, không thì không làm gì"""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    extra: Dict[str, Any] = {}
+    try:
+        yield extra
+    except asyncio.CancelledError:
+        extra["cancelled"] = True
+        raise
+    except Exception as e:
+        extra["error"] = str(e)
+        raise
+    finally:
+        if trace is not None:
+            trace.add(span_type, name, started, **attrs, **extra)
+
+
+def _result_count(result) -> Optional[int]:
+    return len(result) if isinstance(result, list) else None
+
+
+def traced_search(func):
+    """Decorator cho hàm vector search (sync hoặc async): ghi k, filter, latency, số kết quả"""
+    def attrs(kwargs):
+        return {"k": kwargs.get("k"), "filter": kwargs.get("filter_dict")}
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, query, *args, **kwargs):
+            with span("vector_search", func.__name__, **attrs(kwargs)) as extra:
+                result = await func(self, query, *args, **kwargs)
+                extra["results"] = _result_count(result)
+                return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, query, *args, **kwargs):
+        with span("vector_search", func.__name__, **attrs(kwargs)) as extra:
+            result = func(self, query, *args, **kwargs)
+            extra["results"] = _result_count(result)
+            return result
+    return wrapper
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain: mỗi LLM call → một span (tokens, latency, cache hit)"""
+
+    # Chạy ngay trong context của caller để đọc được trace hiện tại (kể cả ainvoke)
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[Any, tuple] = {}
+
+    def _start(self, run_id, serialized):
+        trace = _current_trace.get()
+        if trace is not None:
+            name = (serialized or {}).get("name") or "llm"
+            self._runs[run_id] = (trace, time.perf_counter(), name)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, serialized)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, serialized)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        trace, started, name = run
+
+        prompt_tokens = completion_tokens = 0
+        cache_kinds = set()
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                cache_kinds.add((generation.generation_info or {}).get("cache_hit"))
+
+        # Cache hit do LLMResponseCache đánh dấu trên generation; không đánh dấu mà có usage của API → miss,
+        # không có usage (streaming, provider không trả usage) → None = không rõ
+        cache_hit = None
+        if cache_kinds - {None}:
+            cache_hit = True
+        elif (response.llm_output or {}).get("token_usage") or prompt_tokens or completion_tokens:
+            cache_hit = False
+        trace.add("llm", name, started, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                  cache_hit=cache_hit, cache=next(iter(cache_kinds - {None}), None))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            trace, started, name = run
+            trace.add("llm", name, started, error=str(error))
+
+
+def write_trace_log(record: Dict[str, Any], path: Optional[str] = None):
+    """Ghi một lượt chat ra file JSON lines (TRACE_LOG_PATH, rỗng = tắt)"""
+    path = path if path is not None else os.getenv('TRACE_LOG_PATH', '')
+    if not path:
+        return
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    line = json.dumps({"timestamp": datetime.now().isoformat(), **record}, ensure_ascii=False)
+    with _log_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+
+DOCUMENTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "documents")
+
+
+@pytest.fixture(scope="session")
+def documents_path():
+    """data/documents của repo (không phụ thuộc thư mục chạy pytest)"""
+    return DOCUMENTS_PATH
+
+
+@pytest.fixture(scope="session")
+def entity_matcher(documents_path):
+    from src.knowledge.entity_matcher import MedicalEntityMatcher
+    return MedicalEntityMatcher.from_documents(documents_path)
+
+
+@pytest.fixture(scope="session")
+def medicine_index(documents_path, entity_matcher):
+    from src.knowledge import medicine_index as medicine_module
+    # from_documents lấy entity matcher dùng chung (đường dẫn tương đối) → dùng bản build từ repo
+    original = medicine_module.get_entity_matcher
+    medicine_module.get_entity_matcher = lambda: entity_matcher
+    try:
+        return medicine_module.MedicineIndex.from_documents(documents_path)
+    finally:
+        medicine_module.get_entity_matcher = original
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+
+from src.api.asgi import create_app
+
+
+class FakeService:
+    """ChatService tối thiểu: astart lỗi `fail_times` lần đầu"""
+
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.starts = 0
+        self.ready = False
+        self.warmup = None
+
+    async def astart(self):
+        self.starts += 1
+        if self.starts <= self.fail_times:
+            raise RuntimeError("azure down")
+        self.ready = True
+
+    def stats(self):
+        return {"ready": self.ready}
+
+    def clear_session(self, session_id):
+        return False
+
+
+def run(app, requests):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.request(method, path, **kwargs) for method, path, kwargs in requests]
+    return asyncio.run(main())
+
+
+def test_health_and_ready_do_not_build_service():
+    built = []
+    app = create_app(lambda: built.append(1) or FakeService())
+    health, ready = run(app, [("GET", "/health", {}), ("GET", "/ready", {})])
+    assert health.status_code == 200 and health.json()["startup"] == "starting"
+    assert ready.status_code == 503 and ready.json()["status"] == "starting"
+    assert built == []
+
+
+def test_factory_error_is_503_and_reported_on_ready():
+    def factory():
+        raise ValueError("thiếu AZURE_OPENAI_API_KEY")
+
+    chat, ready, health = run(create_app(factory), [
+        ("POST", "/chat", {"json": {"message": "xin chào"}}), ("GET", "/ready", {}), ("GET", "/health", {})
+    ])
+    assert chat.status_code == 503 and chat.headers["retry-after"] == "5"
+    assert ready.status_code == 503
+    assert ready.json()["status"] == "failed" and ready.json()["error"] == "thiếu AZURE_OPENAI_API_KEY"
+    assert health.status_code == 200 and health.json()["startup"] == "failed"
+
+
+def test_warmup_error_is_503_then_retried():
+    service = FakeService(fail_times=1)
+    app = create_app(lambda: service)
+    chat, ready = run(app, [("POST", "/chat", {"json": {"message": "xin chào"}}), ("GET", "/ready", {})])
+    assert chat.status_code == 503 and chat.json()["startup"]["error"] == "azure down"
+    assert ready.json()["status"] == "failed"
+
+    async def retry():
+        return await app.get_service()
+    assert asyncio.run(retry()) is service
+    assert service.starts == 2
+    assert app.startup_state() == {"status": "ready", "error": None}
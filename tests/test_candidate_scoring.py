@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.utils.candidate_scoring import CandidateBatch
+
+
+def doc(item, text):
+    return Document(page_content=text, metadata={"item_name": item})
+
+
+def item_of(document):
+    return document.metadata.get("item_name")
+
+
+def make_batch():
+    para = doc("Paracetamol", "Paracetamol giảm Sốt, đau đầu")
+    ibu = doc("Ibuprofen", "Ibuprofen giảm đau, hạ sốt")
+    return CandidateBatch.from_results([
+        ("sốt", [(para, 0.5), (ibu, 0.6)]),
+        ("đau đầu", [(para, 0.4), (doc(None, "không có tên"), 0.9)]),
+        ("sốt", [(ibu, 0.1)]),
+    ], item_of)
+
+
+def test_from_results_dedups_queries_docs_and_items():
+    batch = make_batch()
+    assert len(batch) == 4
+    assert batch.queries == ["sốt", "đau đầu"]
+    assert batch.items == ["Paracetamol", "Ibuprofen"]
+    assert batch.query_ids.tolist() == [0, 0, 1, 0]
+    assert batch.doc_ids.tolist() == [0, 1, 0, 1]
+
+
+def test_query_bonus_is_case_insensitive_per_query_doc_pair():
+    batch = make_batch()
+    bonus = batch.query_bonus(lambda d: d.page_content, 0.2)
+    assert np.allclose(bonus, [0.2, 0.2, 0.2, 0.2])
+
+
+def test_doc_bonus_counts_needles():
+    batch = make_batch()
+    bonus = batch.doc_bonus(["sốt", "Đau đầu", ""], lambda d: d.page_content, 0.1)
+    assert np.allclose(bonus, [0.2, 0.1, 0.2, 0.1])
+
+
+def test_top_keeps_best_result_per_item():
+    batch = make_batch()
+    ranked = batch.top(batch.scores, n=5)
+    assert [(item_of(d), total) for d, total in ranked] == [("Ibuprofen", 0.6), ("Paracetamol", 0.5)]
+    assert [item_of(d) for d, _ in batch.top(batch.scores, n=1)] == ["Ibuprofen"]
+
+
+def test_top_ties_keep_first_seen_item():
+    a, b, c = doc("A", "a"), doc("B", "b"), doc("C", "c")
+    batch = CandidateBatch.from_results([("q", [(a, 0.5), (b, 0.7), (c, 0.5)])], item_of)
+    assert [item_of(d) for d, _ in batch.top(batch.scores, n=2)] == ["B", "A"]
+
+
+def test_top_matches_naive_ranking():
+    rng = random.Random(7)
+    docs = [doc(f"item{i % 12}", f"text {i}") for i in range(40)]
+    results = [(f"q{q}", [(rng.choice(docs), round(rng.random(), 2)) for _ in range(15)]) for q in range(5)]
+    batch = CandidateBatch.from_results(results, item_of)
+
+    best = {}
+    for _, hits in results:
+        for d, score in hits:
+            if item_of(d) not in best or score > best[item_of(d)]:
+                best[item_of(d)] = score
+    expected = sorted(best.items(), key=lambda kv: (-kv[1], batch.items.index(kv[0])))[:5]
+    assert [(item_of(d), total) for d, total in batch.top(batch.scores, n=5)] == expected
+
+
+def test_empty_batch():
+    batch = CandidateBatch.from_results([("q", [])], item_of)
+    assert len(batch) == 0
+    assert batch.query_bonus(lambda d: d.page_content, 0.2).size == 0
+    assert batch.top(batch.scores, n=3) == []
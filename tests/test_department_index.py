@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.knowledge.department_index import DepartmentIndex
+
+
+@pytest.fixture(scope="module")
+def index(documents_path):
+    return DepartmentIndex(DepartmentIndex.load_departments(os.path.join(documents_path, "medical_personnel.json")))
+
+
+def names(results):
+    return [department["department_name"] for department, _ in results]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Tim mạch", ["Khoa Tim mạch"]),
+    ("khoa tim mạch", ["Khoa Tim mạch"]),
+    ("bác sĩ da liễu", ["Khoa Da liễu"]),
+    ("tai mui hong", ["Khoa Tai-Mũi-Họng"]),
+    ("nhãn khoa", ["Khoa Mắt"]),
+])
+def test_alias_lookup(index, query, expected):
+    results = index.lookup(query)
+    assert names(results) == expected
+    assert results[0][1] == 1.0
+
+
+def test_alias_inside_query_scores_lower(index):
+    results = index.lookup("tôi bị ngứa da")
+    assert names(results) == ["Khoa Da liễu"] and results[0][1] == 0.9
+
+
+@pytest.mark.parametrize("query", [
+    "tìm bác sĩ giỏi",      # "tìm" không phải "tim"
+    "bác sĩ Lê Văn An",     # "Lê" không phải nhóm "Chuyên khoa lẻ"
+])
+def test_accented_words_do_not_match_other_departments(index, query):
+    assert index.lookup(query) == []
+
+
+@pytest.mark.parametrize("query", ["đau dạ dày", "dau da day", "bac si da day"])
+def test_stomach_is_not_dermatology(index, query):
+    assert names(index.lookup(query)) == ["Khoa Tiêu hóa"]
+
+
+def test_short_alias_still_matches_on_its_own(index):
+    assert names(index.lookup("khám da")) == ["Khoa Da liễu"]
+    assert names(index.lookup("dau da day va ngua da"))[:2] == ["Khoa Tiêu hóa", "Khoa Da liễu"]
+
+
+def test_specific_department_ranks_before_group(index):
+    assert names(index.lookup("Tiêu hóa, Nội khoa"))[0] == "Khoa Tiêu hóa"
+
+
+def test_group_label_matches_only_as_whole_phrase(index):
+    assert names(index.lookup("Nội khoa")) == ["Khoa Tim mạch", "Khoa Tiêu hóa", "Khoa Nội tiết"]
+    assert all(score == 0.8 for _, score in index.lookup("Nội khoa"))
+
+
+class OneHotEmbeddings:
+    """Embedding giả: vector theo từ khóa có trong text"""
+
+    KEYWORDS = [("tim",), ("tiêu hóa",), ("nội tiết",), ("tai",), ("mắt", "thị lực"), ("da",)]
+
+    def _embed(self, text):
+        text = text.lower()
+        return [1.0 if any(k in text for k in keywords) else 0.0 for keywords in self.KEYWORDS]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def test_vector_fallback_and_index_cache(documents_path, tmp_path):
+    path = os.path.join(documents_path, "medical_personnel.json")
+    index_path = str(tmp_path / "department_index.json")
+    embeddings = OneHotEmbeddings()
+
+    index = DepartmentIndex.build(embeddings, path=path, index_path=index_path)
+    assert os.path.exists(index_path)
+    # Không có alias → cosine trên embedding tên khoa
+    assert names(index.lookup("thị lực giảm", min_score=0.5)) == ["Khoa Mắt"]
+
+    cached = DepartmentIndex.build(embeddings, path=path, index_path=index_path)
+    np.testing.assert_allclose(cached.vectors, index.vectors)
@@ -0,0 +1,64 @@
+import pytest
+
+
+@pytest.fixture
+def matcher(entity_matcher):
+    return entity_matcher
+
+
+def test_symptoms_with_and_without_accents(matcher):
+    assert matcher.symptoms("tôi bị sốt và đau đầu") == ["Sốt", "Đau đầu"]
+    assert matcher.symptoms("toi bi sot") == ["Sốt"]
+
+
+def test_typed_accents_must_match(matcher):
+    # "hộ" không phải "ho", "dạ dày" không phải "da"
+    assert matcher.symptoms("nhờ bác sĩ hộ tôi") == []
+
+
+def test_aliases_map_to_canonical_name(matcher):
+    assert matcher.symptoms("tôi bị nhức đầu") == ["Đau đầu"]
+    assert matcher.symptoms("bị ợ chua") == ["Ợ nóng, trào ngược"]
+
+
+def test_describes_symptoms(matcher):
+    assert matcher.describes_symptoms("tôi bị đau bụng")
+    assert not matcher.describes_symptoms("đau bụng là gì")
+
+
+@pytest.mark.parametrize("text, symptoms, negated", [
+    ("tôi không bị sốt, nên uống thuốc gì", [], ["Sốt"]),
+    ("khong bi sot", [], ["Sốt"]),
+    ("tôi không bị sốt hay ho", [], ["Sốt", "Ho"]),
+    ("hết sốt nhưng vẫn ho", ["Ho"], ["Sốt"]),
+    ("không sốt, ho nhiều", ["Ho"], ["Sốt"]),
+    ("đã khỏi ho rồi, giờ đau họng", ["Đau họng"], ["Ho"]),
+])
+def test_negated_symptoms_are_dropped(matcher, text, symptoms, negated):
+    assert matcher.symptoms(text) == symptoms
+    assert matcher.negated_symptoms(text) == negated
+    assert matcher.has_negation(text)
+    assert not matcher.describes_symptoms(text)
+
+
+def test_negated_symptom_gives_no_specialty(matcher):
+    assert matcher.specialties("tôi không bị ho") == []
+
+
+def test_question_particle_is_not_negation(matcher):
+    text = "tôi bị sốt có nên uống thuốc không?"
+    assert matcher.symptoms(text) == ["Sốt"]
+    assert not matcher.has_negation(text)
+    assert matcher.describes_symptoms(text)
+
+
+def test_negation_inside_entity_is_ignored(matcher):
+    # "chua" trong "ợ chua" không phải "chưa"
+    text = "tôi bị ợ chua và đau bụng"
+    assert matcher.symptoms(text) == ["Ợ nóng, trào ngược", "Đau bụng"]
+    assert not matcher.has_negation(text)
+
+
+def test_medicines_and_departments(matcher):
+    assert matcher.medicines("uống paracetamol được không") == ["Paracetamol"]
+    assert matcher.departments("khám ở khoa Tiêu hóa") != []
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.models.llm_cache import SQLiteStore
+from src.services import history_window
+from src.services.history_window import HistoryWindow, RollingSummarizer, count_tokens, truncate_to_tokens
+from src.services.session_manager import ChatSession, SessionManager
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    # Ước lượng theo ký tự (~3 ký tự / token): kết quả không phụ thuộc tiktoken
+    monkeypatch.setattr(history_window, "_encoding", lambda: None)
+
+
+class FakeLLM:
+    def __init__(self, reply="tóm tắt: bệnh nhân sốt"):
+        self.reply = reply
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=self.reply)
+
+
+def make_session(turns, summary=""):
+    session = ChatSession("s1")
+    for i in range(turns):
+        session.append(f"u{i}", [HumanMessage(f"u{i}"), AIMessage(f"a{i}")])
+    session.summary = summary
+    return session
+
+
+def test_count_and_truncate_fallback():
+    assert count_tokens("") == 0
+    assert count_tokens("a" * 30) == 11
+    assert truncate_to_tokens("a" * 30, 100) == "a" * 30
+    assert truncate_to_tokens("a" * 30, 5) == "a" * 15
+
+
+def test_recent_keeps_last_turns():
+    window = HistoryWindow(keep_turns=2, max_tokens=1000, summary_tokens=100)
+    messages = make_session(4).chat_history.messages
+    assert [msg.content for msg in window.recent(messages)] == ["u2", "a2", "u3", "a3"]
+
+
+def test_recent_truncates_oldest_message_over_budget():
+    window = HistoryWindow(keep_turns=2, max_tokens=60, summary_tokens=100)
+    messages = [HumanMessage("u" * 300), AIMessage("ngắn")]
+    recent = window.recent(messages)
+    assert [msg.type for msg in recent] == ["human", "ai"]
+    assert recent[0].content.endswith(" …")
+    assert len(recent[0].content) < 300
+    assert messages[0].content == "u" * 300
+
+
+def test_recent_drops_message_when_little_budget_left():
+    window = HistoryWindow(keep_turns=2, max_tokens=40, summary_tokens=100)
+    recent = window.recent([HumanMessage("u" * 300), AIMessage("a" * 60)])
+    assert [msg.type for msg in recent] == ["ai"]
+
+
+def test_messages_prepend_summary():
+    window = HistoryWindow(keep_turns=1, max_tokens=1000, summary_tokens=100)
+    history = window.messages(make_session(3, summary="đã sốt 2 ngày"))
+    assert history[0].type == "system" and "đã sốt 2 ngày" in history[0].content
+    assert [msg.content for msg in history[1:]] == ["u2", "a2"]
+    assert [msg.content for msg in window.messages(make_session(1))] == ["u0", "a0"]
+
+
+def test_for_prompt_skips_recent_turns_already_inlined():
+    window = HistoryWindow(keep_turns=2, max_tokens=1000, summary_tokens=100)
+    session = make_session(2, summary="tóm tắt")
+    context = window.conversation_context(session.chat_history.messages)
+    assert context == "Bệnh nhân: u0\nBác sĩ: a0\nBệnh nhân: u1\nBác sĩ: a1"
+    assert len(window.for_prompt(session, f"Lịch sử: {context}\nCâu hỏi", context)) == 1
+    assert len(window.for_prompt(session, "Câu hỏi", context)) == 5
+
+
+def test_summarizer_folds_old_turns(tmp_path):
+    backend = SessionManager(SQLiteStore(str(tmp_path / "spill.sqlite"), table="sessions"))
+    window = HistoryWindow(keep_turns=1, max_tokens=1000, summary_tokens=100)
+    llm = FakeLLM()
+    summarizer = RollingSummarizer(llm, window, fold_turns=2)
+
+    session = backend.load("s1")
+    backend.append_turn(session, "u0", [HumanMessage("u0"), AIMessage("a0")])
+    backend.append_turn(session, "u1", [HumanMessage("u1"), AIMessage("a1")])
+    assert summarizer.schedule(backend, session) is None
+
+    backend.append_turn(session, "u2", [HumanMessage("u2"), AIMessage("a2")])
+    summarizer.schedule(backend, session).result()
+    summarizer.close()
+
+    assert summarizer.folds == 1
+    assert "Bệnh nhân: u1" in llm.prompts[0] and "u2" not in llm.prompts[0]
+    session = backend.load("s1")
+    assert session.summary == "tóm tắt: bệnh nhân sốt"
+    assert [msg.content for msg in session.chat_history.messages] == ["u2", "a2"]
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.knowledge.indication_index import IndicationIndex
+
+
+class KeywordEmbeddings:
+    """Embedding giả: mỗi chiều là một nhóm từ khóa"""
+
+    GROUPS = [("đau", "nhức"), ("sốt", "nóng"), ("ho",), ("dạ dày", "ợ"), ("nhiễm khuẩn", "vi khuẩn")]
+
+    def _embed(self, text):
+        words = f" {text.lower()} "
+        vector = [1.0 if any(f" {k} " in words for k in group) else 0.0 for group in self.GROUPS]
+        return vector + [0.1]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+@pytest.fixture(scope="module")
+def index(documents_path, tmp_path_factory):
+    index_path = str(tmp_path_factory.mktemp("cache") / "indication_index.json")
+    return IndicationIndex.build(KeywordEmbeddings(), path=os.path.join(documents_path, "medicines.json"),
+                                 index_path=index_path, accept=0.95, reject=0.3)
+
+
+def verdicts(index, symptoms, medicines):
+    return dict(zip(medicines, index.prescreen(symptoms, medicines)))
+
+
+@pytest.mark.parametrize("symptom, medicine", [
+    ("ho", "Amoxicillin"),          # "hô hấp"
+    ("ho", "Berberin"),             # "Hỗ trợ"
+    ("đau bụng", "Ibuprofen"),      # "Đau bụng kinh"
+    ("da", "Omeprazole"),           # "Loét dạ dày"
+    ("tiêu chảy", "Loperamide"),    # "Tiêu chảy cấp"
+])
+def test_partial_word_match_is_never_accepted_locally(index, symptom, medicine):
+    verdict = verdicts(index, symptom, [medicine])[medicine]
+    assert verdict is None or verdict[0] is False
+
+
+@pytest.mark.parametrize("symptom, medicine", [
+    ("ho", "Amoxicillin"),
+    ("đau bụng", "Ibuprofen"),
+    ("tiêu chảy", "Loperamide"),
+])
+def test_partial_phrase_is_sent_to_llm(index, symptom, medicine):
+    score = index.scores([symptom], [], [medicine])[0]
+    assert score[3] is True
+    assert index.decide(score) is None
+
+
+@pytest.mark.parametrize("symptom, medicine", [
+    ("Đau đầu", "Ibuprofen"),
+    ("sốt", "Ibuprofen"),           # "Hạ sốt"
+    ("dau dau", "Ibuprofen"),       # gõ không dấu
+    ("Ợ nóng", "Omeprazole"),
+    ("ngứa", "Cetirizine"),
+    ("đau lưng", "Diclofenac"),
+])
+def test_whole_phrase_is_accepted_locally(index, symptom, medicine):
+    fit, reason = verdicts(index, symptom, [medicine])[medicine]
+    assert fit and "(1.00)" in reason
+
+
+def test_typed_accents_must_match_whole_phrase(index):
+    # "đàu đầu" không khớp nguyên văn "Đau đầu" → không accept bằng lexical
+    score = index.scores(["đàu đầu"], [], ["Ibuprofen"])[0]
+    assert score is None or score[0] < 1.0
+
+
+def test_medicine_without_indications_goes_to_llm(index):
+    assert verdicts(index, "sốt", ["Paracetamol"])["Paracetamol"] is None
+
+
+def test_cosine_reject(index):
+    # Không khớp nguyên văn, embedding khác hẳn → KHÔNG PHÙ HỢP
+    fit, _ = verdicts(index, "nhức mỏi", ["Loperamide"])["Loperamide"]
+    assert fit is False
+
+
+def test_index_cache_reused(documents_path, tmp_path):
+    class CountingEmbeddings(KeywordEmbeddings):
+        calls = 0
+
+        def embed_documents(self, texts):
+            CountingEmbeddings.calls += 1
+            return super().embed_documents(texts)
+
+    path = os.path.join(documents_path, "medicines.json")
+    index_path = str(tmp_path / "indication_index.json")
+    first = IndicationIndex.build(CountingEmbeddings(), path=path, index_path=index_path)
+    second = IndicationIndex.build(CountingEmbeddings(), path=path, index_path=index_path)
+    assert CountingEmbeddings.calls == 1
+    np.testing.assert_allclose(first.vectors, second.vectors)
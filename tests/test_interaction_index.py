@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from src.knowledge.interaction_index import InteractionIndex
+
+
+@pytest.fixture(scope="module")
+def example_path(documents_path):
+    return os.path.join(os.path.dirname(documents_path), "interactions", "drug_interactions.example.json")
+
+
+def make_index(medicine_index=None):
+    index = InteractionIndex(medicine_index)
+    index.add("Ibuprofen", "Warfarin", "major", "tăng nguy cơ chảy máu", "tránh dùng", "Nguồn A")
+    index.add("Acetaminophen", "Warfarin", "moderate", "tăng INR")
+    index.add("Acetaminophen", "Ibuprofen", "minor")
+    return index
+
+
+def test_pairs_are_symmetric():
+    index = make_index()
+    assert len(index) == 3
+    assert [i.severity for i in index.check(["Warfarin", "Ibuprofen"])] == ["major"]
+    assert [i.severity for i in index.check(["Ibuprofen", "Warfarin"])] == ["major"]
+
+
+def test_check_returns_all_pairs_most_severe_first():
+    index = make_index()
+    interactions = index.check(["Acetaminophen", "Ibuprofen", "Warfarin"])
+    assert [i.severity for i in interactions] == ["major", "moderate", "minor"]
+
+
+def test_same_drug_and_unknown_drug_are_ignored():
+    index = make_index()
+    index.add("Ibuprofen", "ibuprofen", "major")
+    assert len(index) == 3
+    assert index.check(["Ibuprofen", "IBUPROFEN"]) == []
+    assert index.check(["Ibuprofen", "Vitamin C"]) == []
+
+
+def test_brand_names_resolve_to_generic(medicine_index):
+    index = make_index(medicine_index)
+    interactions = index.check(["Panadol", "Warfarin"])
+    assert [(i.drug_a, i.drug_b, i.severity) for i in interactions] == [("Panadol", "Warfarin", "moderate")]
+
+
+def test_format_shows_source_only_when_present():
+    index = make_index()
+    text = index.format(index.check(["Ibuprofen", "Warfarin", "Acetaminophen"]))
+    assert text.count("Nguồn:") == 1
+    assert "Nguồn: Nguồn A" in text
+    assert index.format([]) is None
+
+
+def test_example_file_is_not_loaded_by_default(example_path):
+    assert len(InteractionIndex.load(example_path)) == 0
+    assert len(InteractionIndex.load(example_path, allow_example=True)) > 0
+
+
+def test_example_file_has_no_sources_or_urls(example_path):
+    with open(example_path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["example"] is True
+    for item in data["interactions"]:
+        assert "source" not in item
+        assert "reference_url" not in item
+
+
+def test_missing_dataset_gives_empty_index(tmp_path):
+    assert len(InteractionIndex.load(str(tmp_path / "missing.json"))) == 0
+
+
+def test_load_real_dataset(tmp_path):
+    path = tmp_path / "interactions.json"
+    path.write_text(json.dumps({"interactions": [
+        {"drugs": ["Omeprazole", "Clopidogrel"], "severity": "major", "source": "Nguồn B"},
+        {"drugs": ["Omeprazole"], "severity": "minor"}
+    ]}), encoding="utf-8")
+    index = InteractionIndex.load(str(path))
+    assert len(index) == 1
+    assert index.check(["clopidogrel", "omeprazole"])[0].source == "Nguồn B"
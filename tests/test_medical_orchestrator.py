@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.agents import response_templates, system_prompts
+from src.agents.patient_state import PatientState
+from src.orchestrator.medical_orchestrator import MedicalOrchestrator
+
+
+CONSULTATION, MEDICINE, DOCTOR = "medical_consultation", "medicine_inquiry", "doctor_recommendation"
+
+
+@pytest.fixture(scope="module")
+def orchestrator(entity_matcher):
+    # Chỉ cần phần router mà detect_intents / merge dùng tới
+    router = SimpleNamespace(
+        entity_matcher=entity_matcher,
+        _template_response=lambda state, template: response_templates.render_response(template)
+    )
+    return MedicalOrchestrator(router)
+
+
+def make_state(patient=None):
+    return {"user_message": "uống thuốc gì và khám khoa nào", "patient": patient, "specialty": None,
+            "extracted_symptoms": None, "medical_context": None, "doctor_context": None, "medicine_context": None}
+
+
+def make_branch(state, intent, key, direct_response=None, use_context=False):
+    branch = dict(state)
+    branch.update(intent=intent, response_key=key, system_prompt=system_prompts.SYSTEM_PROMPTS[key],
+                  prompt=f"prompt {intent}", direct_response=direct_response, use_context=use_context)
+    return branch
+
+
+def test_detect_intents_in_order(orchestrator):
+    assert orchestrator.detect_intents("tôi bị sốt, nên uống thuốc gì và khám khoa nào?") == [MEDICINE, DOCTOR]
+    assert orchestrator.detect_intents("xin chào") == []
+
+
+def test_branch_state_copies_patient(orchestrator):
+    patient = PatientState(symptoms=["Sốt"])
+    state = make_state(patient)
+    state["extracted_symptoms"] = ["Sốt"]
+    branch = orchestrator._branch_state(state, DOCTOR)
+    branch["patient"].specialty = "Nội khoa"
+    branch["patient"].symptoms.append("Ho")
+    branch["extracted_symptoms"].append("Ho")
+    assert patient.specialty is None
+    assert patient.symptoms == ["Sốt"]
+    assert state["extracted_symptoms"] == ["Sốt"]
+
+
+def test_merge_applies_branch_specialty_to_patient(orchestrator):
+    patient = PatientState(symptoms=["Sốt"])
+    state = make_state(patient)
+    doctor = orchestrator._branch_state(state, DOCTOR)
+    doctor["patient"].specialty = "Nội khoa"
+    doctor["specialty"] = "Nội khoa"
+    branches = [make_branch(orchestrator._branch_state(state, MEDICINE), MEDICINE, system_prompts.MEDICINE_CONTEXT),
+                make_branch(doctor, DOCTOR, system_prompts.DOCTOR_CONTEXT)]
+    merged = orchestrator.merge(state, branches)
+    assert patient.specialty == "Nội khoa"
+    assert merged["specialty"] == "Nội khoa"
+    assert "PHẦN 2 - GỢI Ý BÁC SĨ" in merged["prompt"]
+
+
+def test_merge_asks_for_symptoms_once(orchestrator):
+    state = make_state()
+    branches = [
+        make_branch(state, MEDICINE, system_prompts.MEDICINE_NO_SYMPTOMS, response_templates.NO_SYMPTOMS_MEDICINE),
+        make_branch(state, DOCTOR, system_prompts.DOCTOR_NO_SYMPTOMS, response_templates.NO_SYMPTOMS_DOCTOR),
+    ]
+    merged = orchestrator.merge(state, branches)
+    assert merged["direct_response"] == response_templates.NO_SYMPTOMS_MULTI
+    assert merged["response_key"] == system_prompts.MEDICINE_NO_SYMPTOMS
+    assert "PHẦN" not in merged["prompt"]
+    assert merged["prompt"].count("Bạn đang gặp triệu chứng gì?") == 1
+
+
+def test_merge_groups_symptom_requests_next_to_other_sections(orchestrator):
+    state = make_state()
+    branches = [
+        make_branch(state, CONSULTATION, system_prompts.MEDICAL_CONSULTATION_NO_CONTEXT),
+        make_branch(state, MEDICINE, system_prompts.MEDICINE_NO_SYMPTOMS, response_templates.NO_SYMPTOMS_MEDICINE),
+        make_branch(state, DOCTOR, system_prompts.DOCTOR_NO_SYMPTOMS, response_templates.NO_SYMPTOMS_DOCTOR),
+    ]
+    merged = orchestrator.merge(state, branches)
+    assert merged["response_key"] == system_prompts.MULTI_INTENT
+    assert "PHẦN 2 - TƯ VẤN THUỐC / GỢI Ý BÁC SĨ" in merged["prompt"]
+    assert "PHẦN 3" not in merged["prompt"]
+    assert merged["direct_response"] is None
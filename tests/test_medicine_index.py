@@ -0,0 +1,51 @@
+import pytest
+
+
+def medicines(index, symptom):
+    return [medicine for medicine, _, _ in index.lookup(symptom)]
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Paracetamol", "Paracetamol"),
+    ("PANADOL", "Paracetamol"),
+    ("acetaminophen", "Paracetamol"),
+    ("Brufen", "Ibuprofen"),
+    ("berberine", "Berberin"),
+    ("parac", "Paracetamol"),
+    ("ranit", "Ranitidine"),
+])
+def test_resolve_name(medicine_index, name, expected):
+    assert medicine_index.resolve_name(name) == expected
+
+
+@pytest.mark.parametrize("name", ["pa", "o", "xyz", ""])
+def test_resolve_name_rejects_short_ambiguous_or_unknown(medicine_index, name):
+    assert medicine_index.resolve_name(name) is None
+
+
+def test_find_names_in_sentence(medicine_index):
+    assert medicine_index.find_names("uống panad với ibupro được không") == ["Paracetamol", "Ibuprofen"]
+
+
+def test_lookup_accented_and_unaccented_agree(medicine_index):
+    assert "Ibuprofen" in medicines(medicine_index, "sốt")
+    assert medicines(medicine_index, "sốt") == medicines(medicine_index, "sot")
+
+
+def test_lookup_ranks_by_weight(medicine_index):
+    results = medicine_index.lookup("đau đầu")
+    assert [medicine for medicine, _, _ in results][:2] == ["Ibuprofen", "Paracetamol"]
+    assert results[0][1] >= results[1][1]
+
+
+@pytest.mark.parametrize("symptom, medicine", [
+    ("ho", "Amoxicillin"),      # "hô hấp"
+    ("ho", "Berberin"),         # "Hỗ trợ"
+])
+def test_lookup_requires_matching_accents(medicine_index, symptom, medicine):
+    assert medicine not in medicines(medicine_index, symptom)
+
+
+def test_lookup_unknown_symptom(medicine_index):
+    assert medicine_index.lookup("xyz") == []
+    assert medicine_index.lookup("  ") == []
@@ -0,0 +1,83 @@
+import pytest
+
+from src.agents.patient_state import PatientState
+
+
+def test_update_adds_described_symptoms_onset_and_severity(entity_matcher):
+    patient = PatientState()
+    added, removed = patient.update_from_message("tôi bị đau bụng dữ dội từ hôm qua", entity_matcher)
+    assert added == ["Đau bụng"] and removed == []
+    assert patient.onset == "từ hôm qua"
+    assert patient.severity == "nặng"
+
+
+def test_denied_symptom_is_not_added(entity_matcher):
+    patient = PatientState()
+    added, _ = patient.update_from_message("tôi không bị sốt, nên uống thuốc gì", entity_matcher)
+    assert added == [] and patient.symptoms == []
+
+
+@pytest.mark.parametrize("message, symptoms", [
+    ("tôi bị đau đầu 3 ngày nay, không sốt", ["Đau đầu"]),
+    ("tôi bị sốt, không ho", ["Sốt"]),
+])
+def test_first_message_mixing_affirmed_and_denied_symptoms(entity_matcher, message, symptoms):
+    patient = PatientState()
+    added, removed = patient.update_from_message(message, entity_matcher)
+    assert added == symptoms and removed == []
+    assert patient.symptoms == symptoms
+
+
+def test_mixed_message_sets_onset(entity_matcher):
+    patient = PatientState()
+    patient.update_from_message("tôi bị đau đầu 3 ngày nay, không sốt", entity_matcher)
+    assert patient.onset == "3 ngày nay"
+
+
+def test_negated_describing_cue_adds_nothing(entity_matcher):
+    assert not entity_matcher.affirms_symptoms("tôi không bị sốt, ho thì uống thuốc gì")
+    assert entity_matcher.affirms_symptoms("tôi đang ho, không sốt")
+
+
+def test_update_details_after_analysis():
+    patient = PatientState()
+    patient.update_details("đau bụng âm ỉ 2 ngày nay")
+    assert patient.onset is None
+    patient.add_symptoms(["Đau bụng"])
+    patient.update_details("đau bụng âm ỉ 2 ngày nay")
+    assert patient.onset == "2 ngày nay" and patient.severity == "nhẹ"
+
+
+def test_cleared_symptom_is_removed(entity_matcher):
+    patient = PatientState(symptoms=["Sốt", "Ho"], specialty="Tai-Mũi-Họng")
+    added, removed = patient.update_from_message("hết sốt rồi", entity_matcher)
+    assert removed == ["Sốt"] and added == []
+    assert patient.symptoms == ["Ho"]
+    # Chuyên khoa được xác định lại từ triệu chứng còn lại
+    assert patient.specialty is None
+
+
+def test_clear_and_add_in_one_message(entity_matcher):
+    patient = PatientState(symptoms=["sốt"])
+    added, removed = patient.update_from_message("hết sốt nhưng vẫn ho", entity_matcher)
+    assert removed == ["sốt"] and added == ["Ho"]
+    assert patient.symptoms == ["Ho"]
+
+
+def test_removing_last_symptom_resets_onset_and_severity(entity_matcher):
+    patient = PatientState(symptoms=["Đau đầu"], onset="2 ngày nay", severity="nhẹ")
+    patient.update_from_message("tôi không còn đau đầu nữa", entity_matcher)
+    assert not patient.has_symptoms
+    assert patient.onset is None and patient.severity is None
+
+
+def test_remove_symptoms_matches_parts_and_accents():
+    patient = PatientState(symptoms=["sổ mũi", "Đau đầu"])
+    assert patient.remove_symptoms(["Sổ mũi, nghẹt mũi"]) == ["sổ mũi"]
+    assert patient.remove_symptoms(["dau dau"]) == ["Đau đầu"]
+    assert patient.remove_symptoms(["Sốt"]) == []
+
+
+def test_round_trip_dict():
+    patient = PatientState(symptoms=["Sốt"], onset="hôm qua", severity="vừa", specialty="Nội khoa")
+    assert PatientState.from_dict(patient.to_dict()) == patient
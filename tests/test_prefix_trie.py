@@ -0,0 +1,39 @@
+from src.utils.prefix_trie import PrefixTrie
+
+
+def make_trie():
+    trie = PrefixTrie()
+    trie.add("paracetamol", "Paracetamol")
+    trie.add("panadol", "Paracetamol")
+    trie.add("omeprazole", "Omeprazole")
+    trie.add("ors", "Oresol (ORS)")
+    trie.add("oresol", "Oresol (ORS)")
+    return trie
+
+
+def test_exact_get():
+    trie = make_trie()
+    assert trie.get("panadol") == "Paracetamol"
+    assert trie.get("pana") is None
+    assert trie.get("paracetamolx") is None
+
+
+def test_complete_returns_values_under_prefix():
+    trie = make_trie()
+    assert trie.complete("parac") == {"Paracetamol"}
+    assert trie.complete("pa") == {"Paracetamol"}
+    assert trie.complete("o") == {"Omeprazole", "Oresol (ORS)"}
+    assert trie.complete("x") == set()
+
+
+def test_len_counts_keys_and_ignores_empty_key():
+    trie = make_trie()
+    trie.add("", "ignored")
+    assert len(trie) == 5
+    assert trie.complete("") == {"Paracetamol", "Omeprazole", "Oresol (ORS)"}
+
+
+def test_complete_returns_a_copy():
+    trie = make_trie()
+    trie.complete("o").clear()
+    assert trie.complete("o") == {"Omeprazole", "Oresol (ORS)"}
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.models.llm_cache import SQLiteStore
+from src.services.session_backend import RedisSessionBackend, SQLiteSessionBackend
+from src.services.session_manager import SessionManager
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def make_backend(kind, tmp_path, server=None, max_messages=6):
+    if kind == "memory":
+        return SessionManager(SQLiteStore(str(tmp_path / "spill.sqlite"), table="sessions"), max_messages=max_messages)
+    if kind == "sqlite":
+        return SQLiteSessionBackend(str(tmp_path / "sessions.sqlite"), max_messages=max_messages)
+    return RedisSessionBackend(fakeredis.FakeRedis(server=server), max_messages=max_messages)
+
+
+def add_turn(backend, session_id, i):
+    session = backend.load(session_id)
+    session.patient_state.add_symptoms([f"triệu chứng {i}"])
+    backend.append_turn(session, f"u{i}", [HumanMessage(f"u{i}"), AIMessage(f"a{i}")])
+    return session
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    backend = make_backend(request.param, tmp_path, fakeredis.FakeServer())
+    yield backend
+    backend.close()
+
+
+def contents(session):
+    return [msg.content for msg in session.chat_history.messages]
+
+
+def test_round_trip_load_append_clear(backend):
+    add_turn(backend, "s1", 0)
+    add_turn(backend, "s1", 1)
+    session = backend.load("s1")
+    assert contents(session) == ["u0", "a0", "u1", "a1"]
+    assert session.user_messages_only == ["u0", "u1"]
+    assert session.patient_state.symptoms == ["triệu chứng 0", "triệu chứng 1"]
+    assert all(msg.id for msg in session.chat_history.messages)
+
+    assert backend.clear("s1")
+    assert not backend.clear("s1")
+    assert contents(backend.load("s1")) == []
+
+
+def test_append_trims_to_max_messages(backend):
+    for i in range(5):
+        add_turn(backend, "s1", i)
+    session = backend.load("s1")
+    assert contents(session) == ["u2", "a2", "u3", "a3", "u4", "a4"]
+    assert session.user_messages_only[-1] == "u4"
+
+
+def test_save_summary_folds_through_message_id(backend):
+    add_turn(backend, "s1", 0)
+    add_turn(backend, "s1", 1)
+    through_id = backend.load("s1").chat_history.messages[1].id
+    # Lượt mới được ghi sau lúc load, trước khi ghi tóm tắt
+    add_turn(backend, "s1", 2)
+
+    assert backend.save_summary("s1", "tóm tắt", through_id)
+    session = backend.load("s1")
+    assert session.summary == "tóm tắt"
+    assert contents(session) == ["u1", "a1", "u2", "a2"]
+
+
+def test_save_summary_skips_when_message_is_gone(backend):
+    add_turn(backend, "s1", 0)
+    through_id = backend.load("s1").chat_history.messages[-1].id
+    for i in range(1, 4):
+        add_turn(backend, "s1", i)
+
+    assert not backend.save_summary("s1", "tóm tắt", through_id)
+    session = backend.load("s1")
+    assert session.summary == ""
+    assert contents(session) == ["u1", "a1", "u2", "a2", "u3", "a3"]
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "redis"])
+def test_concurrent_appends_from_two_instances(kind, tmp_path):
+    server = fakeredis.FakeServer()
+    backends = [make_backend(kind, tmp_path, server, max_messages=100) for _ in range(2)]
+
+    def worker(backend, start):
+        for i in range(start, start + 20):
+            session = backend.load("shared")
+            backend.append_turn(session, f"u{i}", [HumanMessage(f"u{i}"), AIMessage(f"a{i}")])
+
+    threads = [threading.Thread(target=worker, args=(backend, start)) for backend, start in zip(backends, (0, 100))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    session = backends[0].load("shared")
+    assert len(session.user_messages_only) == 40
+    messages = contents(session)
+    assert len(messages) == 80
+    # Mỗi lượt ghi nguyên tử: hỏi và đáp luôn liền nhau
+    assert all(messages[i][1:] == messages[i + 1][1:] for i in range(0, 80, 2))
+    for backend in backends:
+        backend.close()
@@ -0,0 +1,33 @@
+import itertools
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src.models.llm_cache import InMemoryLRUStore, LLMResponseCache
+from src.utils.tracing import TraceCallbackHandler, start_trace
+
+
+def make_llm(message: AIMessage, cache=None):
+    return GenericFakeChatModel(messages=itertools.cycle([message]), cache=cache,
+                                callbacks=[TraceCallbackHandler()])
+
+
+def llm_spans(llm, prompts):
+    with start_trace() as trace:
+        for prompt in prompts:
+            llm.invoke(prompt)
+    return [span for span in trace.to_dict()["spans"] if span["type"] == "llm"]
+
+
+def test_cache_hit_is_flagged_by_response_cache():
+    cache = LLMResponseCache(InMemoryLRUStore())
+    llm = make_llm(AIMessage("ok", usage_metadata={"input_tokens": 5, "output_tokens": 1, "total_tokens": 6}), cache)
+    first, second = llm_spans(llm, ["xin chào", "xin chào"])
+    assert first["cache_hit"] is False and first["prompt_tokens"] == 5
+    assert second["cache_hit"] is True and second["cache"] == "exact"
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_missing_usage_is_unknown_not_a_hit():
+    (span,) = llm_spans(make_llm(AIMessage("ok")), ["xin chào"])
+    assert span["cache_hit"] is None
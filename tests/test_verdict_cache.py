@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+from src.models.llm_cache import InMemoryLRUStore, SQLiteStore
+from src.services.verdict_cache import VerdictCache, corpus_version, normalize_symptoms
+
+
+def test_normalize_symptoms_folds_dedups_and_sorts():
+    assert normalize_symptoms(["Sốt", "sot", " Đau  đầu ", "x"]) == ["dau dau", "sot"]
+
+
+def test_get_set_ignores_accents_and_order():
+    cache = VerdictCache(InMemoryLRUStore(), "v1")
+    cache.set(["Sốt", "Đau đầu"], "Paracetamol", True, "hạ sốt, giảm đau")
+    assert cache.get(["dau dau", "sot"], "paracetamol") == (True, "hạ sốt, giảm đau")
+    assert cache.get(["Sốt"], "Paracetamol") is None
+
+
+def test_multi_symptom_verdict_inferred_from_singles():
+    cache = VerdictCache(InMemoryLRUStore(), "v1")
+    cache.set(["Ho"], "Amoxicillin", False, "kháng sinh, không trị ho")
+    assert cache.get(["Ho", "Sốt"], "Amoxicillin") is None
+
+    cache.set(["Sốt"], "Amoxicillin", False, "không hạ sốt")
+    assert cache.get(["Ho", "Sốt"], "Amoxicillin") == (False, "kháng sinh, không trị ho")
+
+    cache.set(["Sốt"], "Paracetamol", True, "hạ sốt")
+    cache.set(["Ho"], "Paracetamol", False, "không trị ho")
+    assert cache.get(["Ho", "Sốt"], "Paracetamol") == (True, "hạ sốt")
+
+
+def test_corpus_version_change_invalidates(tmp_path):
+    store = SQLiteStore(str(tmp_path / "verdict.sqlite"), table="verdict_cache")
+    VerdictCache(store, "v1").set(["Sốt"], "Paracetamol", True)
+    assert VerdictCache(store, "v1").get(["Sốt"], "Paracetamol") == (True, "")
+    assert VerdictCache(store, "v2").get(["Sốt"], "Paracetamol") is None
+
+
+def test_corpus_version_hashes_file(tmp_path):
+    path = tmp_path / "medicines.json"
+    path.write_text('{"medicines": []}', encoding="utf-8")
+    version = corpus_version(str(path))
+    path.write_text('{"medicines": [{}]}', encoding="utf-8")
+    assert corpus_version(str(path)) != version
+    assert corpus_version(str(tmp_path / "missing.json")) == "unknown"
+
+
+def test_corrupt_entry_is_a_miss():
+    store = InMemoryLRUStore()
+    cache = VerdictCache(store, "v1")
+    store.set(cache._key(["sot"], "Paracetamol"), "not json")
+    assert cache.get(["Sốt"], "Paracetamol") is None
+
+
+class ThreadRecordingStore(InMemoryLRUStore):
+    """Store ghi lại thread thực hiện get / set"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value):
+        self.threads.add(threading.get_ident())
+        super().set(key, value)
+
+
+def test_async_validation_reads_and_writes_cache_off_the_event_loop():
+    from langchain_core.documents import Document
+    from src.agents.medicine_agent import MedicineAgent
+
+    store = ThreadRecordingStore()
+    # Chỉ phần MedicineAgent mà avalidate_candidates dùng tới (không tạo LLM client)
+    agent = object.__new__(MedicineAgent)
+    agent.verdict_cache = VerdictCache(store, "v1")
+    agent.indication_index = None
+    agent.verdict_cache.set(["Sốt"], "Paracetamol", True, "hạ sốt")
+
+    async def fake_llm_verdicts(symptoms, candidates):
+        return [(False, "không hạ sốt")] * len(candidates)
+    agent._allm_verdicts = fake_llm_verdicts
+
+    candidates = [(Document("", metadata={"medicine_name": name, "item_name": name}), 0.9)
+                  for name in ("Paracetamol", "Amoxicillin")]
+
+    async def main():
+        store.threads.clear()
+        loop_thread = threading.get_ident()
+        fit = await agent.avalidate_candidates("Sốt", candidates)
+        return loop_thread, fit
+
+    loop_thread, fit = asyncio.run(main())
+    assert store.threads and loop_thread not in store.threads
+    assert [doc.metadata["medicine_name"] for doc, _ in fit] == ["Paracetamol"]
+    assert agent.verdict_cache.get(["Sốt"], "Amoxicillin") == (False, "không hạ sốt")
@@ -0,0 +1,104 @@
+"""
+Báo cáo latency từ trace log của router (p50/p95 theo intent, theo node / LLM / vector search)
+
+Bật log: TRACE_LOG_PATH=./logs/router_trace.jsonl trong .env
+
+Usage:
+    python trace_report.py
+    python trace_report.py --log logs/router_trace.jsonl --intent medicine_inquiry
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def load_records(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def percentiles(values):
+    return np.percentile(values, 50), np.percentile(values, 95)
+
+
+def print_intent_report(intent, records):
+    totals = [r["total_ms"] for r in records]
+    p50, p95 = percentiles(totals)
+    print(f"\n🎯 {intent}: {len(records)} lượt | total p50={p50:.0f} ms  p95={p95:.0f} ms")
+
+    # Tổng thời gian mỗi span (node / llm / vector_search) trong một lượt
+    per_span = defaultdict(list)
+    llm_calls, cache_hits, cache_known, prompt_tokens, completion_tokens = [], 0, 0, [], []
+    for record in records:
+        turn = defaultdict(float)
+        calls = 0
+        for span in record.get("spans", []):
+            turn[(span["type"], span["name"])] += span["duration_ms"]
+            if span["type"] == "llm":
+                calls += 1
+                # cache_hit None: không rõ (streaming / không có usage) → không tính vào tỷ lệ
+                if span.get("cache_hit") is not None:
+                    cache_known += 1
+                    cache_hits += 1 if span["cache_hit"] else 0
+        for key, duration in turn.items():
+            per_span[key].append(duration)
+        llm_calls.append(calls)
+        prompt_tokens.append(sum(s.get("prompt_tokens", 0) for s in record.get("spans", []) if s["type"] == "llm"))
+        completion_tokens.append(sum(s.get("completion_tokens", 0) for s in record.get("spans", []) if s["type"] == "llm"))
+
+    print(f"   {'span':48}{'lượt':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for (span_type, name), durations in sorted(per_span.items(), key=lambda x: -np.percentile(x[1], 95)):
+        p50, p95 = percentiles(durations)
+        print(f"   {span_type + ':' + name:48}{len(durations):>6}{p50:>10.1f}{p95:>10.1f}")
+
+    total_calls = sum(llm_calls)
+    hit_rate = cache_hits / cache_known if cache_known else 0.0
+    unknown = f" ({total_calls - cache_known} call không rõ)" if total_calls > cache_known else ""
+    print(f"   🤖 LLM calls/lượt: {np.mean(llm_calls):.2f} | cache hit: {hit_rate:.1%}{unknown} | "
+          f"tokens/lượt: prompt={np.mean(prompt_tokens):.0f} completion={np.mean(completion_tokens):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Router trace report")
+    parser.add_argument("--log", default=os.getenv('TRACE_LOG_PATH', './logs/router_trace.jsonl'))
+    parser.add_argument("--intent", default=None, help="Chỉ báo cáo một intent")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"❌ Không tìm thấy trace log: {args.log} (đặt TRACE_LOG_PATH trong .env)")
+        return
+
+    records = load_records(args.log)
+    by_intent = defaultdict(list)
+    for record in records:
+        by_intent[record.get("intent", "unknown")].append(record)
+
+    print("=" * 60)
+    print(f"⏱️ ROUTER TRACE REPORT - {args.log} ({len(records)} lượt)")
+    print("=" * 60)
+
+    for intent, intent_records in sorted(by_intent.items()):
+        if args.intent and intent != args.intent:
+            continue
+        print_intent_report(intent, intent_records)
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
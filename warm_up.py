@@ -0,0 +1,50 @@
+"""
+Warm-up lúc deploy / startup probe: build vector index nếu chưa có, mở kết nối tới Azure OpenAI,
+chạy câu hỏi mẫu qua embedding, search, LLM và router để điền các cache bền (index khoa, verdict cache,
+LLM cache khi LLM_CACHE_BACKEND=sqlite) - người dùng đầu tiên của app.py / server.py không phải trả giá cold start.
+
+Thời gian từng bước được in ra và ghi vào WARMUP_LOG_PATH (so sánh giữa các lần deploy).
+Exit code 1 nếu chưa sẵn sàng (không có vector store).
+
+Usage:
+    python warm_up.py
+    python warm_up.py --no-router --query "tôi bị sốt" --query "thuốc trị ho"
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.agents.router_graph import AgentRouterGraph
+from src.models.llm import get_llm
+from src.orchestrator import MedicalOrchestrator
+from src.services.vector_store import VectorStoreService
+from src.services.warmup import warm_up
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm-up index, connections and caches")
+    parser.add_argument("--documents", default=os.getenv('DOCUMENTS_PATH', './data/documents'))
+    parser.add_argument("--query", action="append", help="Câu hỏi mẫu (có thể lặp lại, mặc định WARMUP_QUERIES)")
+    parser.add_argument("--no-router", action="store_true", help="Bỏ bước router (không điền LLM / verdict cache)")
+    args = parser.parse_args()
+
+    vector_service = VectorStoreService()
+    router = None if args.no_router else MedicalOrchestrator(AgentRouterGraph(vector_service=vector_service))
+
+    print("=" * 60)
+    print("🔥 WARM-UP")
+    print("=" * 60)
+    report = warm_up(vector_service, router, get_llm(streaming=False), queries=args.query,
+                     folder_path=args.documents)
+    print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    print("=" * 60)
+    sys.exit(0 if report.ready else 1)
+
+
+if __name__ == "__main__":
+    main()